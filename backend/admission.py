@@ -0,0 +1,127 @@
+"""
+Admission control for websocket connections.
+
+Each worker enforces a hard connection cap, a per-IP cap and a token-bucket
+limit on the rate of new accepts. Part of the capacity is reserved for
+registered donors (a donor id plus that donor's access token): anonymous viewers
+are only admitted below ``max_connections - donor_reserve``. Rejected clients are
+refused during the handshake, with HTTP 503 and Retry-After where the server
+supports denial responses, otherwise by closing with code 1013 (Try Again Later)
+and a ``retry-after=<seconds>`` reason.
+"""
+
+import os
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+TRY_AGAIN_LATER = 1013
+
+
+class AdmissionController:
+    def __init__(self, max_connections: int = 10000, max_per_ip: int = 20, donor_reserve: int = 1000,
+                 accept_rate: float = 200.0, accept_burst: int = 400, retry_after: int = 5):
+        self.max_connections = max_connections
+        self.max_per_ip = max_per_ip
+        self.donor_reserve = min(donor_reserve, max_connections)
+        self.accept_rate = accept_rate
+        self.accept_burst = accept_burst
+        self.retry_after = retry_after
+
+        self._tokens = float(accept_burst)
+        self._refilled_at = time.monotonic()
+        self._per_ip: Dict[str, int] = defaultdict(int)
+        self.donors = 0
+        self.anonymous = 0
+        self.admitted_total = 0
+        self.rejected: Dict[str, int] = defaultdict(int)
+        self.shed_total = 0
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_connections=int(os.environ.get("WS_MAX_CONNECTIONS", "10000")),
+            max_per_ip=int(os.environ.get("WS_MAX_PER_IP", "20")),
+            donor_reserve=int(os.environ.get("WS_DONOR_RESERVE", "1000")),
+            accept_rate=float(os.environ.get("WS_ACCEPT_RATE", "200")),
+            accept_burst=int(os.environ.get("WS_ACCEPT_BURST", "400")),
+            retry_after=int(os.environ.get("WS_RETRY_AFTER", "5")),
+        )
+
+    @property
+    def total(self) -> int:
+        return self.donors + self.anonymous
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.accept_burst, self._tokens + (now - self._refilled_at) * self.accept_rate)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def check(self, ip: str, is_donor: bool) -> Optional[str]:
+        """Return None if the connection may be admitted, otherwise the rejection reason.
+
+        A donor arriving at the hard cap is reported as "shed_required": it is admitted
+        only if the caller frees a slot by closing an anonymous viewer.
+        """
+        if self._per_ip.get(ip, 0) >= self.max_per_ip:
+            return self._reject("per_ip")
+        if not self._take_token():
+            return self._reject("accept_rate")
+        if is_donor:
+            if self.total >= self.max_connections:
+                return "shed_required" if self.anonymous else self._reject("capacity")
+        elif self.total >= self.max_connections - self.donor_reserve:
+            return self._reject("capacity")
+        return None
+
+    def _reject(self, reason: str) -> str:
+        self.rejected[reason] += 1
+        return reason
+
+    def admit(self, ip: str, is_donor: bool):
+        self._per_ip[ip] += 1
+        if is_donor:
+            self.donors += 1
+        else:
+            self.anonymous += 1
+        self.admitted_total += 1
+
+    def shed(self):
+        """Account for an anonymous viewer closed to make room for a donor"""
+        self.shed_total += 1
+
+    def promote(self):
+        """An anonymous connection registered as a donor"""
+        if self.anonymous:
+            self.anonymous -= 1
+            self.donors += 1
+
+    def release(self, ip: str, is_donor: bool):
+        if self._per_ip.get(ip, 0) > 1:
+            self._per_ip[ip] -= 1
+        else:
+            self._per_ip.pop(ip, None)
+        if is_donor:
+            self.donors = max(0, self.donors - 1)
+        else:
+            self.anonymous = max(0, self.anonymous - 1)
+
+    def close_reason(self) -> str:
+        return f"retry-after={self.retry_after}"
+
+    def metrics(self) -> dict:
+        return {
+            "connections": self.total,
+            "donor_connections": self.donors,
+            "anonymous_connections": self.anonymous,
+            "max_connections": self.max_connections,
+            "donor_reserve": self.donor_reserve,
+            "distinct_ips": len(self._per_ip),
+            "admitted_total": self.admitted_total,
+            "rejected": dict(self.rejected),
+            "shed_total": self.shed_total,
+        }
@@ -0,0 +1,134 @@
+"""
+In-process alert bus shared by the websocket and Server-Sent Events transports.
+
+Every broadcast is published once: it gets a resumable event id, is encoded
+once per wire protocol, and the same pre-encoded frame is handed to every
+subscriber. A bounded history lets reconnecting clients resume from the last
+event id they saw. Transient events (stats deltas) are delivered the same way
+but get no id and are not kept in history; a resuming client gets a fresh
+snapshot instead.
+"""
+
+import asyncio
+import secrets
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import ws_protocol
+
+# Broadcast channels clients can filter on
+ALERTS_CHANNEL = "alerts"
+DONORS_CHANNEL = "donors"
+STATS_CHANNEL = "stats"
+CHANNELS = (ALERTS_CHANNEL, DONORS_CHANNEL, STATS_CHANNEL)
+# Stats deltas are opt-in so existing clients do not receive traffic they ignore
+DEFAULT_CHANNELS = (ALERTS_CHANNEL, DONORS_CHANNEL)
+
+
+def parse_channels(value: Optional[str]) -> Set[str]:
+    """Parse a comma separated channel filter; an empty filter means the default channels"""
+    if not value:
+        return set(DEFAULT_CHANNELS)
+    channels = {channel.strip() for channel in value.split(",") if channel.strip()}
+    unknown = channels - set(CHANNELS)
+    if unknown:
+        raise ValueError(f"Unknown channel(s): {', '.join(sorted(unknown))}")
+    return channels
+
+
+class Event:
+    """A published broadcast with its frames encoded once per wire protocol for all subscribers"""
+
+    __slots__ = ("id", "seq", "channel", "payload", "text", "_sse", "_frames")
+
+    def __init__(self, event_id: Optional[str], seq: int, channel: str, payload: dict):
+        self.id = event_id
+        self.seq = seq
+        self.channel = channel
+        self.payload = payload
+        self.text = ws_protocol.encode(payload, None)
+        self._sse: Optional[bytes] = None
+        self._frames: Dict[Optional[str], Union[str, bytes]] = {None: self.text}
+
+    def frame(self, protocol: Optional[str]) -> Union[str, bytes]:
+        if protocol not in self._frames:
+            self._frames[protocol] = ws_protocol.encode(self.payload, protocol)
+        return self._frames[protocol]
+
+    @property
+    def sse(self) -> bytes:
+        if self._sse is None:
+            id_line = f"id: {self.id}\n" if self.id else ""
+            self._sse = f"{id_line}event: {self.channel}\ndata: {self.text}\n\n".encode()
+        return self._sse
+
+
+class Subscription:
+    """A bounded queue of events for one streaming consumer"""
+
+    def __init__(self, channels: Set[str], max_queue: int):
+        self.channels = channels
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def offer(self, event: Event):
+        if self.overflowed or event.channel not in self.channels:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A consumer that cannot keep up is cut off and resumes from history on reconnect
+            self.overflowed = True
+
+
+class AlertBus:
+    def __init__(self, history_size: int = 1000, max_queue: int = 256):
+        # Event ids are "<epoch>-<seq>"; the epoch changes on every process start so a
+        # client resuming against a different process is told to resync instead of skipping events
+        self.epoch = secrets.token_hex(4)
+        self.max_queue = max_queue
+        self._seq = 0
+        self._history: Deque[Event] = deque(maxlen=history_size)
+        self._subscriptions: Set[Subscription] = set()
+
+    @property
+    def last_event_id(self) -> Optional[str]:
+        return self._history[-1].id if self._history else None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def publish(self, channel: str, payload: dict, retain: bool = True) -> Event:
+        if not retain:
+            event = Event(None, self._seq, channel, {**payload, "channel": channel})
+            for subscription in self._subscriptions:
+                subscription.offer(event)
+            return event
+        self._seq += 1
+        event_id = f"{self.epoch}-{self._seq}"
+        event = Event(event_id, self._seq, channel, {**payload, "event_id": event_id, "channel": channel})
+        self._history.append(event)
+        for subscription in self._subscriptions:
+            subscription.offer(event)
+        return event
+
+    def replay(self, last_event_id: Optional[str], channels: Iterable[str]) -> Tuple[List[Event], bool]:
+        """Return the events after last_event_id, and whether the replay is gap-free"""
+        if not last_event_id:
+            return [], True
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return [], False
+        seq = int(seq)
+        channels = set(channels)
+        complete = not self._history or self._history[0].seq <= seq + 1
+        return [event for event in self._history if event.seq > seq and event.channel in channels], complete
+
+    def subscribe(self, channels: Set[str]) -> Subscription:
+        subscription = Subscription(channels, self.max_queue)
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscriptions.discard(subscription)
@@ -0,0 +1,139 @@
+"""
+Hot/cold partitioning of blood requests and alerts.
+
+Requests that reached a terminal status (Fulfilled, Cancelled, Expired)
+more than ``request_retention`` ago, and alerts older than
+``alert_retention``, are moved to ``blood_requests_archive`` and
+``emergency_alerts_archive``. The hot collections, and the indexes every
+active-request query uses, then only hold the working set.
+
+Moves run every ``interval`` in batches of ``batch_size``, pausing
+``batch_pause`` seconds between batches so a large backlog does not
+saturate the database. Each batch is upserted into the archive by id and
+only then deleted from the hot collection, conditionally on the same
+filter. A batch interrupted between the two steps is simply repeated, and
+a row that stopped qualifying in between stays hot only.
+
+Readers that ask for historical states use ``HISTORICAL_STATUSES`` and
+``archive_name`` to also read the archive.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from pymongo import ReplaceOne
+
+from models import BloodRequestStatus
+
+logger = logging.getLogger(__name__)
+
+HISTORICAL_STATUSES = (
+    BloodRequestStatus.FULFILLED.value,
+    BloodRequestStatus.CANCELLED.value,
+    BloodRequestStatus.EXPIRED.value,
+)
+
+
+def archive_name(collection: str) -> str:
+    return f"{collection}_archive"
+
+
+class Archiver:
+    def __init__(self, db, request_retention: timedelta = timedelta(days=30), alert_retention: timedelta = timedelta(days=30),
+                 batch_size: int = 500, batch_pause: float = 1.0, interval: float = 3600.0):
+        self.db = db
+        self.request_retention = request_retention
+        self.alert_retention = alert_retention
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.requests_archived = 0
+        self.alerts_archived = 0
+        self.runs = 0
+        self.last_run: Optional[datetime] = None
+
+    @classmethod
+    def from_env(cls, db) -> "Archiver":
+        return cls(
+            db,
+            request_retention=timedelta(days=float(os.environ.get("ARCHIVE_REQUESTS_AFTER_DAYS", "30"))),
+            alert_retention=timedelta(days=float(os.environ.get("ARCHIVE_ALERTS_AFTER_DAYS", "30"))),
+            batch_size=int(os.environ.get("ARCHIVE_BATCH_SIZE", "500")),
+            batch_pause=float(os.environ.get("ARCHIVE_BATCH_PAUSE", "1.0")),
+            interval=float(os.environ.get("ARCHIVE_INTERVAL_MINUTES", "60")) * 60,
+        )
+
+    async def archive_requests(self, now: Optional[datetime] = None) -> int:
+        cutoff = (now or datetime.utcnow()) - self.request_retention
+        moved = await self._move("blood_requests", {"status": {"$in": list(HISTORICAL_STATUSES)}, "updated_at": {"$lt": cutoff}})
+        self.requests_archived += moved
+        return moved
+
+    async def archive_alerts(self, now: Optional[datetime] = None) -> int:
+        cutoff = (now or datetime.utcnow()) - self.alert_retention
+        moved = await self._move("emergency_alerts", {"created_at": {"$lt": cutoff}})
+        self.alerts_archived += moved
+        return moved
+
+    async def _move(self, collection: str, query: dict) -> int:
+        hot, cold = self.db[collection], self.db[archive_name(collection)]
+        moved = 0
+        while True:
+            documents = await hot.find(query).limit(self.batch_size).to_list(self.batch_size)
+            if not documents:
+                break
+            ids = [document["id"] for document in documents]
+            await cold.bulk_write(
+                [ReplaceOne({"id": document["id"]}, document, upsert=True) for document in documents], ordered=False
+            )
+            result = await hot.delete_many({**query, "id": {"$in": ids}})
+            if result.deleted_count != len(ids):
+                # Rows that stopped qualifying since they were copied (e.g. a status change) stay hot only
+                still_hot = await hot.find({"id": {"$in": ids}}, {"_id": 0, "id": 1}).to_list(len(ids))
+                if still_hot:
+                    await cold.delete_many({"id": {"$in": [document["id"] for document in still_hot]}})
+            moved += result.deleted_count
+            if len(documents) < self.batch_size:
+                break
+            await asyncio.sleep(self.batch_pause)
+        if moved:
+            logger.info(f"Archived {moved} documents from {collection}")
+        return moved
+
+    async def run_once(self):
+        now = datetime.utcnow()
+        await self.archive_requests(now)
+        await self.archive_alerts(now)
+        self.runs += 1
+        self.last_run = now
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Archive run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def metrics(self) -> dict:
+        return {
+            "requests_archived": self.requests_archived,
+            "alerts_archived": self.alerts_archived,
+            "runs": self.runs,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+        }
@@ -0,0 +1,127 @@
+"""
+Read-through cache for documents looked up by id.
+
+``DocumentCache`` keeps up to ``max_entries`` documents from ``donors``,
+``blood_requests`` and ``hospitals``, least recently used first out, each
+for at most ``ttl`` seconds. Concurrent misses for the same document share
+one Mongo read through ``SingleFlight``.
+
+Every write path in server.py that changes a cached collection calls
+``invalidate`` for the documents it touched. A load that was in flight
+when its key was invalidated is returned to its callers but not stored,
+so a write can never be overwritten by an older read. Invalidation is per
+process: other workers may serve a changed document until its TTL runs
+out, and so may counters written behind by the counter buffer
+(views_count, alerts_sent). Missing documents are not cached.
+"""
+
+import asyncio
+import functools
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers for the key await the same result.
+
+    The call runs in a task owned by the SingleFlight rather than in the first caller, so a
+    caller that is cancelled (e.g. its client disconnected) only stops waiting; the others
+    still get the result.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    def in_flight(self, key: Hashable) -> bool:
+        task = self._calls.get(key)
+        return task is not None and not task.done()
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(functools.partial(self._finished, key))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieved here so a failure every caller stopped waiting for is not logged as lost
+            task.exception()
+
+
+class DocumentCache:
+    def __init__(self, db, max_entries: int = 10000, ttl: float = 15.0):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, dict]]" = OrderedDict()
+        self._flight = SingleFlight()
+        self._invalidated_in_flight: set = set()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls, db) -> "DocumentCache":
+        return cls(
+            db,
+            max_entries=int(os.environ.get("CACHE_MAX_ENTRIES", "10000")),
+            ttl=float(os.environ.get("CACHE_TTL_SECONDS", "15")),
+        )
+
+    async def get(self, collection: str, document_id: str) -> Optional[dict]:
+        """The document with this id (a copy), from memory if fresh, otherwise from Mongo"""
+        key = (collection, document_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[1])
+            del self._entries[key]
+        self.misses += 1
+        document = await self._flight.do(key, lambda: self._load(key))
+        return dict(document) if document is not None else None
+
+    async def _load(self, key: Tuple[str, str]) -> Optional[dict]:
+        collection, document_id = key
+        self.loads += 1
+        try:
+            document = await self.db[collection].find_one({"id": document_id}, {"_id": 0})
+        finally:
+            invalidated = key in self._invalidated_in_flight
+            self._invalidated_in_flight.discard(key)
+        if not invalidated and document is not None and self.max_entries > 0:
+            self._entries[key] = (time.monotonic() + self.ttl, document)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return document
+
+    def invalidate(self, collection: str, *document_ids: str):
+        for document_id in document_ids:
+            key = (collection, document_id)
+            self._entries.pop(key, None)
+            if self._flight.in_flight(key):
+                self._invalidated_in_flight.add(key)
+            self.invalidations += 1
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
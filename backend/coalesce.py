@@ -0,0 +1,126 @@
+"""
+Request coalescing for read-only API handlers.
+
+``@coalesce()`` on a route handler (below ``@limiter.limit``) keys each
+call on the handler and its validated parameters, with enums reduced to
+their values and users to their ids. Identical concurrent calls share a
+single execution through ``SingleFlight``: the handler runs once, in its
+own task, and every caller awaits its result or exception. A caller whose
+client disconnects only stops waiting; the others are unaffected. With a
+``ttl``, a successful result is also reused for that many seconds after it
+completes, so a burst spread over a window still reaches the database once
+per window.
+
+Parameters that do not change the response (typically ``current_user`` on
+public lists) can be left out of the key with ``ignore``, so callers
+share across users. Responses are shallow-copied per caller: the body is
+shared, but the header list is not, because middleware appends to it while
+sending. Streaming responses cannot be replayed and must not be coalesced.
+"""
+
+import copy
+import functools
+import os
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Dict, Hashable, Iterable, Optional
+
+from starlette.responses import Response, StreamingResponse
+
+from cache import SingleFlight
+
+DEFAULT_TTL = float(os.environ.get("COALESCE_TTL_SECONDS", "0"))
+MAX_RESULTS = int(os.environ.get("COALESCE_MAX_RESULTS", "1024"))
+
+
+def _normalize(value) -> Hashable:
+    if isinstance(value, Enum):
+        return value.value
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if hasattr(value, "id"):
+        return ("id", value.id)
+    return repr(value)
+
+
+def _share(result):
+    if isinstance(result, Response):
+        result = copy.copy(result)
+        result.raw_headers = list(result.raw_headers)
+    return result
+
+
+class Coalescer:
+    def __init__(self, name: str, ttl: float = 0.0, ignore: Iterable[str] = (), max_results: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.ignore = {"request", *ignore}
+        self.max_results = max_results
+        self._flight = SingleFlight()
+        self._results: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.calls = 0
+        self.executions = 0
+        self.reused = 0
+
+    def key(self, kwargs: dict) -> Hashable:
+        return tuple(sorted((name, _normalize(value)) for name, value in kwargs.items() if name not in self.ignore))
+
+    async def call(self, handler, kwargs: dict):
+        self.calls += 1
+        key = self.key(kwargs)
+        if self.ttl > 0:
+            entry = self._results.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.reused += 1
+                    return _share(entry[1])
+                del self._results[key]
+        if self._flight.in_flight(key):
+            self.reused += 1
+        return _share(await self._flight.do(key, lambda: self._execute(handler, key, kwargs)))
+
+    async def _execute(self, handler, key: Hashable, kwargs: dict):
+        self.executions += 1
+        result = await handler(**kwargs)
+        if isinstance(result, StreamingResponse):
+            raise TypeError(f"{self.name} returns a streaming response, which cannot be coalesced")
+        if self.ttl > 0 and (not isinstance(result, Response) or result.status_code < 400):
+            self._results[key] = (time.monotonic() + self.ttl, result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return result
+
+    def metrics(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "reused": self.reused,
+            "results_held": len(self._results),
+        }
+
+
+coalescers: Dict[str, Coalescer] = {}
+
+
+def coalesce(ttl: Optional[float] = None, ignore: Iterable[str] = ()):
+    """Share one execution of the decorated handler among identical concurrent calls"""
+
+    def decorator(handler):
+        coalescer = Coalescer(
+            handler.__name__, DEFAULT_TTL if ttl is None else ttl, ignore, max_results=MAX_RESULTS
+        )
+        coalescers[handler.__name__] = coalescer
+
+        @functools.wraps(handler)
+        async def wrapper(**kwargs):
+            return await coalescer.call(handler, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def metrics() -> dict:
+    return {name: coalescer.metrics() for name, coalescer in coalescers.items()}
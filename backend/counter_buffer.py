@@ -0,0 +1,128 @@
+"""
+Write-behind buffer for hot, loss-tolerant counters (views_count, alerts_sent).
+
+Increments are accumulated in memory per (collection, document id) and
+written as one unordered bulk_write of $inc updates per collection every
+``flush_interval`` seconds, or sooner once ``max_pending`` documents are
+dirty. Repeated increments of the same document between flushes collapse
+into a single update.
+
+Loss window: a graceful shutdown flushes everything, and a failed flush is
+merged back and retried on the next cycle. If the process is killed hard,
+the increments buffered since the last successful flush are lost. That is
+at most ``flush_interval`` seconds of counts, bounded by ``max_pending``
+documents. Readers may see these counters lag by up to the same interval.
+Never route counters that must be exact through this buffer.
+"""
+
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    def __init__(self, db, flush_interval: float = 5.0, max_pending: int = 1000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.increments_buffered = 0
+        self.updates_written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    @classmethod
+    def from_env(cls, db) -> "CounterBuffer":
+        return cls(
+            db,
+            flush_interval=float(os.environ.get("COUNTER_FLUSH_INTERVAL", "5")),
+            max_pending=int(os.environ.get("COUNTER_MAX_PENDING", "1000")),
+        )
+
+    def increment(self, collection: str, document_id: str, field: str, amount: int = 1):
+        counters = self._pending.setdefault((collection, document_id), defaultdict(int))
+        counters[field] += amount
+        self.increments_buffered += 1
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    def pending(self, collection: str, document_id: str, field: str) -> int:
+        """Increments not yet written for one counter, for callers that want to show a current value"""
+        return self._pending.get((collection, document_id), {}).get(field, 0)
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            by_collection = defaultdict(list)
+            for (collection, document_id), counters in batch.items():
+                by_collection[collection].append(UpdateOne({"id": document_id}, {"$inc": dict(counters)}))
+            written = set()
+            try:
+                for collection, operations in by_collection.items():
+                    await self.db[collection].bulk_write(operations, ordered=False)
+                    written.add(collection)
+                    self.updates_written += len(operations)
+                self.flushes += 1
+            except BaseException as e:
+                # Merge the unwritten collections back, also on cancellation (shutdown), so the
+                # next flush retries them; a partially applied bulk write can double count a
+                # few documents, which these counters tolerate
+                self._merge_back(batch, written)
+                if not isinstance(e, Exception):
+                    raise
+                self.failed_flushes += 1
+                logger.error(f"Counter flush failed, retrying next cycle: {e}")
+
+    def _merge_back(self, batch: Dict[Tuple[str, str], Dict[str, int]], written: set):
+        for key, counters in batch.items():
+            if key[0] in written:
+                continue
+            merged = self._pending.setdefault(key, defaultdict(int))
+            for field, amount in counters.items():
+                merged[field] += amount
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write out everything still buffered"""
+        if self._task:
+            self._task.cancel()
+            try:
+                # An interrupted flush has merged its batch back by the time the task finishes
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def metrics(self) -> dict:
+        return {
+            "pending_documents": len(self._pending),
+            "increments_buffered": self.increments_buffered,
+            "updates_written": self.updates_written,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "flush_interval_seconds": self.flush_interval,
+        }
@@ -0,0 +1,255 @@
+"""
+Bulk donor import for blood drives.
+
+The upload (CSV with a header row, or NDJSON) is read from the request
+stream and parsed incrementally. Rows are validated with the same
+``DonorCreate`` rules as single registrations, in chunks of
+``chunk_size``, and each chunk is written with one unordered
+``insert_many``. A bad row or a duplicate email only fails that row: it is
+reported with its row number and the rest of the chunk is still inserted.
+Nothing is kept in memory beyond the current chunk and the (capped) error
+list. A line longer than ``max_line_length`` is discarded as it streams in
+and reported as a failed row.
+
+Chunks are committed as they are read, so an upload over ``max_rows`` is
+not rejected after the fact. The first ``max_rows`` rows are imported, the
+rest of the stream is not read, and the report is marked ``truncated``.
+"""
+
+import codecs
+import csv
+import json
+import logging
+import os
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Optional
+
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from models import Donor, DonorCreate
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+DUPLICATE_KEY = 11000
+
+
+class InvalidUpload(ValueError):
+    """The upload as a whole cannot be imported (unknown format, missing or unreadable header)"""
+
+
+class ImportReport:
+    def __init__(self, max_errors: int):
+        self.received = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self.max_errors = max_errors
+        self.truncated = False
+
+    def error(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"row": row, "error": message})
+
+    def dict(self) -> dict:
+        return {
+            "received": self.received,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+            "truncated": self.truncated,
+        }
+
+
+def detect_format(fmt: Optional[str], content_type: str) -> str:
+    if fmt:
+        if fmt not in FORMATS:
+            raise InvalidUpload(f"Unknown format. Choose one of: {', '.join(FORMATS)}")
+        return fmt
+    return "csv" if "csv" in content_type.lower() else "ndjson"
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'row'}: {detail['msg']}" for detail in error.errors()
+    )
+
+
+async def _lines(chunks: AsyncIterator[bytes], max_length: int) -> AsyncIterator[Optional[str]]:
+    """Lines of the upload; a line over max_length is dropped while it streams in and yielded as None"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    overlong = False
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        for line in complete:
+            if overlong or len(line) > max_length:
+                overlong = False
+                yield None
+            else:
+                yield line
+        if len(pending) > max_length:
+            overlong = True
+            pending = ""
+    pending += decoder.decode(b"", final=True)
+    if overlong or len(pending) > max_length:
+        yield None
+    elif pending:
+        yield pending
+
+
+async def _csv_records(chunks: AsyncIterator[bytes], max_length: int) -> AsyncIterator[Optional[str]]:
+    """Whole CSV records: a quoted field may span lines, so join lines until the quotes balance"""
+    record = ""
+    async for line in _lines(chunks, max_length):
+        if line is None:
+            record = ""
+            yield None
+            continue
+        record = f"{record}\n{line}" if record else line
+        if len(record) > max_length:
+            record = ""
+            yield None
+        elif record.count('"') % 2 == 0:
+            yield record
+            record = ""
+    if record:
+        yield record
+
+
+def _csv_rows(header: List[str], records: List[str]) -> Iterator[dict]:
+    for values in csv.reader(records):
+        # Empty cells fall back to the model defaults
+        yield {name: value for name, value in zip(header, values) if value.strip()}
+
+
+class DonorImporter:
+    def __init__(self, db, chunk_size: int = 1000, max_rows: int = 100000, max_errors: int = 1000,
+                 max_line_length: int = 65536):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.max_rows = max_rows
+        self.max_errors = max_errors
+        self.max_line_length = max_line_length
+
+    @classmethod
+    def from_env(cls, db) -> "DonorImporter":
+        return cls(
+            db,
+            chunk_size=int(os.environ.get("IMPORT_CHUNK_SIZE", "1000")),
+            max_rows=int(os.environ.get("IMPORT_MAX_ROWS", "100000")),
+            max_errors=int(os.environ.get("IMPORT_MAX_ERRORS", "1000")),
+            max_line_length=int(os.environ.get("IMPORT_MAX_LINE_LENGTH", "65536")),
+        )
+
+    async def run(self, chunks: AsyncIterator[bytes], fmt: str,
+                  on_inserted: Callable[[List[dict]], Awaitable[None]]) -> ImportReport:
+        """Import every row of the upload; on_inserted is awaited with each chunk's inserted documents"""
+        report = ImportReport(self.max_errors)
+        batch = []
+        async for row, fields in self._rows(chunks, fmt):
+            if report.received >= self.max_rows:
+                report.truncated = True
+                break
+            report.received += 1
+            if isinstance(fields, str):
+                report.error(row, fields)
+                continue
+            batch.append((row, fields))
+            if len(batch) >= self.chunk_size:
+                await self._import_chunk(batch, report, on_inserted)
+                batch = []
+        if batch:
+            await self._import_chunk(batch, report, on_inserted)
+        return report
+
+    async def _rows(self, chunks: AsyncIterator[bytes], fmt: str):
+        """(row number, raw fields) pairs, with an error message instead of fields for unparsable rows"""
+        row = 0
+        too_long = f"Row is longer than {self.max_line_length} characters"
+        if fmt == "ndjson":
+            async for line in _lines(chunks, self.max_line_length):
+                if line is None:
+                    row += 1
+                    yield row, too_long
+                    continue
+                if not line.strip():
+                    continue
+                row += 1
+                try:
+                    fields = json.loads(line)
+                except ValueError:
+                    yield row, "Invalid JSON"
+                    continue
+                yield row, fields if isinstance(fields, dict) else "Each line must be a JSON object"
+            return
+
+        header = None
+        pending: List[str] = []
+        async for record in _csv_records(chunks, self.max_line_length):
+            if record is None:
+                if header is None:
+                    raise InvalidUpload(f"CSV header is longer than {self.max_line_length} characters")
+                for fields in _csv_rows(header, pending):
+                    row += 1
+                    yield row, fields
+                pending = []
+                row += 1
+                yield row, too_long
+                continue
+            if not record.strip():
+                continue
+            if header is None:
+                header = [name.strip() for name in next(csv.reader([record]))]
+                missing = [name for name, field in DonorCreate.model_fields.items()
+                           if field.is_required() and name not in header]
+                if missing:
+                    raise InvalidUpload(f"CSV header is missing column(s): {', '.join(missing)}")
+                continue
+            pending.append(record)
+            if len(pending) >= self.chunk_size:
+                for fields in _csv_rows(header, pending):
+                    row += 1
+                    yield row, fields
+                pending = []
+        if header is None:
+            raise InvalidUpload("The upload is empty")
+        for fields in _csv_rows(header, pending):
+            row += 1
+            yield row, fields
+
+    async def _import_chunk(self, batch: List[tuple], report: ImportReport,
+                            on_inserted: Callable[[List[dict]], Awaitable[None]]):
+        rows, documents = [], []
+        for row, fields in batch:
+            try:
+                donor = Donor(**DonorCreate(**fields).dict())
+            except ValidationError as e:
+                report.error(row, _validation_message(e))
+                continue
+            rows.append(row)
+            documents.append(donor.dict())
+        if not documents:
+            return
+
+        failed = set()
+        try:
+            await self.db.donors.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                failed.add(write_error["index"])
+                if write_error.get("code") == DUPLICATE_KEY:
+                    report.error(rows[write_error["index"]], "Donor with this email already exists")
+                else:
+                    report.error(rows[write_error["index"]], write_error.get("errmsg", "Insert failed"))
+
+        inserted = [document for index, document in enumerate(documents) if index not in failed]
+        report.imported += len(inserted)
+        if inserted:
+            try:
+                await on_inserted(inserted)
+            except Exception as e:
+                logger.error(f"Post-import hook failed for {len(inserted)} donors: {e}")
@@ -0,0 +1,422 @@
+"""
+Pooled, batched SMTP delivery for emergency alert emails.
+
+Alert emails are identical for every donor matched to the same blood request,
+so recipients are batched per (template, request) and delivered as a single
+SMTP transaction with many envelope recipients. Transactions run over a small
+pool of persistent connections and use ESMTP PIPELINING (RFC 2920) when the
+server advertises it, so a batch costs one round trip for the envelope instead
+of one per recipient and no TCP/TLS handshake per message.
+"""
+
+import asyncio
+import base64
+import logging
+import os
+import re
+import ssl
+import time
+from email.message import EmailMessage
+from email.policy import SMTP as SMTP_POLICY
+from email.utils import formatdate, make_msgid
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPError(Exception):
+    """Raised when the SMTP server rejects a command or the connection fails"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+        self.message = message
+
+
+class SMTPConnection:
+    """A single persistent ESMTP connection built on asyncio streams"""
+
+    def __init__(self, host: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = False, starttls: bool = False, timeout: float = 10.0,
+                 local_hostname: str = "bloodconnect.local"):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.starttls = starttls
+        self.timeout = timeout
+        self.local_hostname = local_hostname
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.extensions: Dict[str, str] = {}
+        self.messages_sent = 0
+        self.last_used = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.writer is not None and not self.writer.is_closing()
+
+    @property
+    def supports_pipelining(self) -> bool:
+        return "pipelining" in self.extensions
+
+    async def open(self):
+        ssl_context = ssl.create_default_context() if self.use_tls else None
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_context),
+            timeout=self.timeout
+        )
+        await self._expect(220)
+        await self._ehlo()
+
+        if self.starttls and not self.use_tls:
+            if "starttls" not in self.extensions:
+                raise SMTPError(502, "Server does not support STARTTLS")
+            await self._command("STARTTLS", expect=220)
+            await self.writer.start_tls(ssl.create_default_context())
+            await self._ehlo()
+
+        if self.username:
+            credentials = f"\0{self.username}\0{self.password or ''}".encode()
+            await self._command(f"AUTH PLAIN {base64.b64encode(credentials).decode()}", expect=235)
+
+        self.last_used = time.monotonic()
+
+    async def _ehlo(self):
+        code, lines = await self._command(f"EHLO {self.local_hostname}", expect=250)
+        self.extensions = {}
+        for line in lines[1:]:
+            keyword, _, params = line.partition(" ")
+            self.extensions[keyword.lower()] = params
+
+    async def _read_reply(self) -> Tuple[int, List[str]]:
+        lines = []
+        while True:
+            raw = await asyncio.wait_for(self.reader.readline(), timeout=self.timeout)
+            if not raw:
+                raise SMTPError(421, "Connection closed by server")
+            line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+            lines.append(line[4:])
+            if len(line) < 4 or line[3] != "-":
+                return int(line[:3]), lines
+
+    async def _expect(self, expected: int) -> Tuple[int, List[str]]:
+        code, lines = await self._read_reply()
+        if code != expected:
+            raise SMTPError(code, " ".join(lines))
+        return code, lines
+
+    async def _command(self, line: str, expect: Optional[int] = None) -> Tuple[int, List[str]]:
+        self.writer.write(line.encode() + b"\r\n")
+        await self.writer.drain()
+        if expect is None:
+            return await self._read_reply()
+        return await self._expect(expect)
+
+    async def send(self, sender: str, recipients: List[str], data: bytes) -> List[str]:
+        """Send one message to many recipients. Returns the refused recipients."""
+        commands = [f"MAIL FROM:<{sender}>"] + [f"RCPT TO:<{rcpt}>" for rcpt in recipients] + ["DATA"]
+
+        if self.supports_pipelining:
+            # RFC 2920: the whole envelope goes out in one write, replies are read in order
+            self.writer.write("".join(f"{command}\r\n" for command in commands).encode())
+            await self.writer.drain()
+            replies = [await self._read_reply() for _ in commands]
+        else:
+            replies = []
+            for command in commands:
+                reply = await self._command(command)
+                replies.append(reply)
+                if command.startswith("MAIL") and reply[0] != 250:
+                    break
+
+        mail_code, mail_lines = replies[0]
+        if mail_code != 250:
+            await self._reset()
+            raise SMTPError(mail_code, " ".join(mail_lines))
+
+        refused = [rcpt for rcpt, (code, _) in zip(recipients, replies[1:-1]) if code not in (250, 251)]
+        data_code, data_lines = replies[-1] if len(replies) == len(commands) else (503, ["No DATA sent"])
+        if data_code != 354:
+            # Either every recipient was refused or the server rejected DATA outright
+            await self._reset()
+            if len(refused) == len(recipients):
+                return refused
+            raise SMTPError(data_code, " ".join(data_lines))
+
+        self.writer.write(_dot_stuff(data) + b"\r\n.\r\n")
+        await self.writer.drain()
+        await self._expect(250)
+
+        self.messages_sent += 1
+        self.last_used = time.monotonic()
+        return refused
+
+    async def _reset(self):
+        try:
+            await self._command("RSET", expect=250)
+        except Exception:
+            await self.close()
+
+    async def close(self):
+        if not self.writer:
+            return
+        try:
+            if self.is_open:
+                self.writer.write(b"QUIT\r\n")
+                await self.writer.drain()
+            self.writer.close()
+        except Exception:
+            pass
+        self.reader = None
+        self.writer = None
+
+
+def _dot_stuff(data: bytes) -> bytes:
+    """Normalize line endings to CRLF and escape leading dots (RFC 5321 4.5.2)"""
+    data = re.sub(rb"\r?\n", b"\r\n", data)
+    if data.endswith(b"\r\n"):
+        data = data[:-2]
+    return re.sub(rb"(?m)^\.", b"..", data)
+
+
+def _header_value(value: str) -> str:
+    """Request fields end up in headers, where CR/LF would be rejected (or inject headers)"""
+    return re.sub(r"[\r\n]+", " ", value)
+
+
+class SMTPConnectionPool:
+    """Bounded pool of persistent SMTP connections"""
+
+    def __init__(self, size: int = 4, idle_timeout: float = 60.0, max_messages_per_connection: int = 500,
+                 **connection_kwargs):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.max_messages_per_connection = max_messages_per_connection
+        self.connection_kwargs = connection_kwargs
+        self._idle: List[SMTPConnection] = []
+        self._slots = asyncio.Semaphore(size)
+        self.connections_opened = 0
+        self.connections_reused = 0
+
+    async def acquire(self) -> SMTPConnection:
+        await self._slots.acquire()
+        try:
+            while self._idle:
+                connection = self._idle.pop()
+                if connection.is_open and time.monotonic() - connection.last_used < self.idle_timeout:
+                    self.connections_reused += 1
+                    return connection
+                await connection.close()
+
+            connection = SMTPConnection(**self.connection_kwargs)
+            await connection.open()
+            self.connections_opened += 1
+            return connection
+        except Exception:
+            self._slots.release()
+            raise
+
+    async def release(self, connection: SMTPConnection, healthy: bool = True):
+        try:
+            if healthy and connection.is_open and connection.messages_sent < self.max_messages_per_connection:
+                self._idle.append(connection)
+            else:
+                await connection.close()
+        finally:
+            self._slots.release()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await connection.close()
+
+
+# Email templates keyed by name: (subject, plain-text body). Rendered with str.format_map.
+EMAIL_TEMPLATES = {
+    "emergency_alert": (
+        "{urgency} blood request: {blood_type_needed} needed at {hospital_name}",
+        "A {urgency} request for {units_needed} unit(s) of {blood_type_needed} blood was posted by "
+        "{hospital_name} in {city}, {state}.\n\n"
+        "Your blood type is compatible. If you are able to donate, please open BloodConnect to respond.\n\n"
+        "This system is for demonstration only. Not for actual medical emergencies.\n"
+    ),
+    # One consolidated email for a donor compatible with several requests of a batch
+    "emergency_alert_batch": (
+        "{count} blood requests need your blood type",
+        "{count} blood requests your blood type is compatible with were just posted:\n\n"
+        "{summary}\n\n"
+        "If you are able to donate, please open BloodConnect to respond.\n\n"
+        "This system is for demonstration only. Not for actual medical emergencies.\n"
+    ),
+}
+
+
+class EmailSender:
+    """Collects alert recipients per template and delivers them in pooled batches"""
+
+    def __init__(self, pool: Optional[SMTPConnectionPool], sender: str = "alerts@bloodconnect.app",
+                 batch_size: int = 50, flush_interval: float = 1.0):
+        self.pool = pool
+        self.sender = sender
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending: Dict[Tuple[str, str], Tuple[dict, List[str]]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._in_flight: set = set()
+
+        self.started_at = time.monotonic()
+        self.messages_sent = 0
+        self.recipients_accepted = 0
+        self.recipients_refused = 0
+        self.send_failures = 0
+        self.bytes_sent = 0
+        self.send_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.pool is not None
+
+    @classmethod
+    def from_env(cls) -> "EmailSender":
+        """Build a sender from SMTP_* environment variables; disabled when SMTP_HOST is unset"""
+        host = os.environ.get("SMTP_HOST")
+        pool = None
+        if host:
+            pool = SMTPConnectionPool(
+                size=int(os.environ.get("SMTP_POOL_SIZE", "4")),
+                idle_timeout=float(os.environ.get("SMTP_IDLE_TIMEOUT", "60")),
+                host=host,
+                port=int(os.environ.get("SMTP_PORT", "587")),
+                username=os.environ.get("SMTP_USERNAME"),
+                password=os.environ.get("SMTP_PASSWORD"),
+                use_tls=os.environ.get("SMTP_USE_TLS", "false").lower() == "true",
+                starttls=os.environ.get("SMTP_STARTTLS", "false").lower() == "true",
+            )
+        return cls(
+            pool,
+            sender=os.environ.get("SMTP_FROM", "alerts@bloodconnect.app"),
+            batch_size=int(os.environ.get("SMTP_BATCH_SIZE", "50")),
+            flush_interval=float(os.environ.get("SMTP_FLUSH_INTERVAL", "1.0")),
+        )
+
+    def start(self):
+        if self.enabled and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Deliver everything still pending and close pooled connections"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        if self.pool:
+            await self.pool.close()
+
+    def enqueue(self, template: str, batch_key: str, context: dict, recipients: List[str]):
+        """Queue recipients for a templated email; identical (template, batch_key) pairs share one message"""
+        if not self.enabled or not recipients:
+            return
+        key = (template, batch_key)
+        if key not in self._pending:
+            self._pending[key] = (context, [])
+        pending = self._pending[key][1]
+        pending.extend(recipients)
+        if len(pending) >= self.batch_size:
+            context, batch = self._pending.pop(key)
+            self._dispatch(template, context, batch)
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        for (template, _), (context, recipients) in pending.items():
+            self._dispatch(template, context, recipients)
+        if self._in_flight:
+            await asyncio.gather(*list(self._in_flight), return_exceptions=True)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Email flush failed: {e}")
+
+    def _dispatch(self, template: str, context: dict, recipients: List[str]):
+        try:
+            data = self.render(template, context)
+        except Exception as e:
+            # Only this batch is lost; the other templates and requests still go out
+            self.send_failures += 1
+            logger.error(f"Could not render {template} email for {len(recipients)} recipients: {e}")
+            return
+        for start in range(0, len(recipients), self.batch_size):
+            task = asyncio.create_task(self._send_batch(data, recipients[start:start + self.batch_size]))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    def render(self, template: str, context: dict) -> bytes:
+        subject, body = EMAIL_TEMPLATES[template]
+        context = {key: getattr(value, "value", value) for key, value in context.items()}
+        message = EmailMessage(policy=SMTP_POLICY)
+        message["From"] = self.sender
+        message["To"] = "undisclosed-recipients:;"
+        message["Subject"] = _header_value(subject.format_map(context))
+        message["Date"] = formatdate(localtime=False)
+        message["Message-ID"] = make_msgid(domain=self.sender.partition("@")[2] or None)
+        message.set_content(body.format_map(context))
+        return message.as_bytes()
+
+    async def _send_batch(self, data: bytes, recipients: List[str]):
+        started = time.monotonic()
+        for attempt in range(2):
+            connection = None
+            healthy = False
+            try:
+                connection = await self.pool.acquire()
+                refused = await connection.send(self.sender, recipients, data)
+                healthy = True
+                break
+            except (SMTPError, OSError, asyncio.TimeoutError) as e:
+                # Only a reused connection is retried: the server may have dropped it while idle. A fresh
+                # connection that fails (or cannot be opened) means the server itself is failing.
+                if attempt == 0 and connection is not None and connection.messages_sent > 0:
+                    continue
+                self.send_failures += 1
+                logger.error(f"Email batch of {len(recipients)} recipients failed: {e}")
+                return
+            except Exception as e:
+                # e.g. an address or body that cannot be encoded; retrying would fail the same way
+                self.send_failures += 1
+                logger.exception(f"Email batch of {len(recipients)} recipients failed: {e}")
+                return
+            finally:
+                # Whatever happened (cancellation included), the pool slot goes back; a connection in an
+                # unknown state is closed rather than reused
+                if connection is not None:
+                    await self.pool.release(connection, healthy=healthy)
+
+        self.messages_sent += 1
+        self.recipients_accepted += len(recipients) - len(refused)
+        self.recipients_refused += len(refused)
+        self.bytes_sent += len(data)
+        self.send_seconds += time.monotonic() - started
+
+    def metrics(self) -> dict:
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        return {
+            "enabled": self.enabled,
+            "messages_sent": self.messages_sent,
+            "recipients_accepted": self.recipients_accepted,
+            "recipients_refused": self.recipients_refused,
+            "send_failures": self.send_failures,
+            "bytes_sent": self.bytes_sent,
+            "pending_batches": len(self._pending),
+            "in_flight_batches": len(self._in_flight),
+            "avg_send_ms": round(self.send_seconds / self.messages_sent * 1000, 2) if self.messages_sent else 0.0,
+            "recipients_per_second": round(self.recipients_accepted / elapsed, 2),
+            "connections_opened": self.pool.connections_opened if self.pool else 0,
+            "connections_reused": self.pool.connections_reused if self.pool else 0,
+        }
@@ -0,0 +1,177 @@
+"""
+Expiry engine for blood requests.
+
+Active requests due to expire within ``lookahead`` are kept in an
+in-memory min-heap keyed by ``expires_at``. The heap is loaded at startup
+from the (status, expires_at) index, refilled every half lookahead, and
+fed by ``schedule`` as requests are created. The loop sleeps until the
+earliest expiry. It then flips due requests to Expired in batches of
+``batch_size`` with conditional updates that only match requests that are
+still Active and past ``expires_at``. A request fulfilled or cancelled in
+the meantime, or already expired by another worker, is left alone. A batch
+whose writes fail goes back on the heap and is retried on the next pass.
+
+Listeners are awaited with the documents each batch actually expired, so
+stats, rollups, caches and dashboards can react.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Set, Tuple
+
+from models import BloodRequestStatus, statuses_leading_to
+
+logger = logging.getLogger(__name__)
+
+# Fields listeners receive for each expired request
+EXPIRED_PROJECTION = {
+    "_id": 0, "id": 1, "blood_type_needed": 1, "urgency": 1, "state": 1, "hospital_id": 1, "expires_at": 1
+}
+
+
+class ExpiryScheduler:
+    def __init__(self, db, lookahead: timedelta = timedelta(hours=24), batch_size: int = 500):
+        self.db = db
+        self.lookahead = lookahead
+        self.batch_size = batch_size
+        self._heap: List[Tuple[datetime, str]] = []
+        self._scheduled: Set[str] = set()
+        self._horizon: Optional[datetime] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.listeners = []  # async callables awaited with each batch of expired request documents
+        self.expired_total = 0
+        self.loads = 0
+
+    @classmethod
+    def from_env(cls, db) -> "ExpiryScheduler":
+        return cls(
+            db,
+            lookahead=timedelta(hours=float(os.environ.get("EXPIRY_LOOKAHEAD_HOURS", "24"))),
+            batch_size=int(os.environ.get("EXPIRY_BATCH_SIZE", "500")),
+        )
+
+    def schedule(self, request_id: str, expires_at: Optional[datetime]):
+        """Track a new request; ones beyond the loaded horizon are picked up by the next load"""
+        if expires_at is None or request_id in self._scheduled:
+            return
+        if self._horizon is not None and expires_at > self._horizon:
+            return
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (expires_at, request_id))
+        self._scheduled.add(request_id)
+        if earliest is None or expires_at < earliest:
+            self._wakeup.set()
+
+    async def load(self, now: Optional[datetime] = None):
+        """Schedule every Active request expiring before now + lookahead, including overdue ones"""
+        now = now or datetime.utcnow()
+        horizon = now + self.lookahead
+        cursor = self.db.blood_requests.find(
+            {"status": BloodRequestStatus.ACTIVE.value, "expires_at": {"$lte": horizon}},
+            {"_id": 0, "id": 1, "expires_at": 1}
+        ).sort("expires_at", 1)
+        async for document in cursor:
+            if document["id"] not in self._scheduled:
+                heapq.heappush(self._heap, (document["expires_at"], document["id"]))
+                self._scheduled.add(document["id"])
+        self._horizon = horizon
+        self.loads += 1
+
+    async def expire_due(self, now: Optional[datetime] = None) -> int:
+        """Expire every scheduled request due by now; returns how many were flipped"""
+        now = now or datetime.utcnow()
+        # Mongo stores milliseconds; the updated_at stamp must read back exactly
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        expired = 0
+        while self._heap and self._heap[0][0] <= now:
+            entries = []
+            while self._heap and self._heap[0][0] <= now and len(entries) < self.batch_size:
+                entry = heapq.heappop(self._heap)
+                self._scheduled.discard(entry[1])
+                entries.append(entry)
+            try:
+                expired += await self._expire_batch([request_id for _, request_id in entries], now)
+            except Exception:
+                # Put the batch back so the loop's next pass retries it, rather than waiting for the next load
+                for expires_at, request_id in entries:
+                    if request_id not in self._scheduled:
+                        heapq.heappush(self._heap, (expires_at, request_id))
+                        self._scheduled.add(request_id)
+                raise
+        return expired
+
+    async def _expire_batch(self, request_ids: List[str], now: datetime) -> int:
+        due = {
+            "id": {"$in": request_ids},
+            "status": {"$in": statuses_leading_to(BloodRequestStatus.EXPIRED)},
+            "expires_at": {"$lte": now}
+        }
+        candidates = await self.db.blood_requests.find(due, EXPIRED_PROJECTION).to_list(len(request_ids))
+        if not candidates:
+            return 0
+        result = await self.db.blood_requests.update_many(
+            {**due, "id": {"$in": [document["id"] for document in candidates]}},
+            {"$set": {"status": BloodRequestStatus.EXPIRED.value, "updated_at": now}}
+        )
+        if result.modified_count != len(candidates):
+            # Some changed status between the read and the update; keep only the ones this update expired
+            flipped = await self.db.blood_requests.find(
+                {"id": {"$in": [document["id"] for document in candidates]},
+                 "status": BloodRequestStatus.EXPIRED.value, "updated_at": now},
+                {"id": 1, "_id": 0}
+            ).to_list(len(candidates))
+            flipped_ids = {document["id"] for document in flipped}
+            candidates = [document for document in candidates if document["id"] in flipped_ids]
+
+        self.expired_total += len(candidates)
+        for listener in self.listeners:
+            try:
+                await listener(candidates)
+            except Exception as e:
+                logger.error(f"Expiry listener failed: {e}")
+        return len(candidates)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                # Cleared before looking at the heap, so a schedule() during this pass still wakes the next wait
+                self._wakeup.clear()
+                now = datetime.utcnow()
+                if self._horizon is None or now >= self._horizon - self.lookahead / 2:
+                    await self.load(now)
+                await self.expire_due(now)
+
+                # Sleep until the earliest expiry or the next load, whichever is sooner
+                next_load = self._horizon - self.lookahead / 2
+                wake_at = min(self._heap[0][0], next_load) if self._heap else next_load
+                timeout = max((wake_at - datetime.utcnow()).total_seconds(), 0.0)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Expiry loop failed: {e}")
+                await asyncio.sleep(30)
+
+    def metrics(self) -> dict:
+        return {
+            "scheduled": len(self._heap),
+            "next_expiry": self._heap[0][0].isoformat() if self._heap else None,
+            "expired_total": self.expired_total,
+            "loads": self.loads,
+        }
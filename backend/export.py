@@ -0,0 +1,182 @@
+"""
+Streaming exports of whole collections as NDJSON or CSV.
+
+Documents are read from a Mongo cursor in batches of ``batch_size`` and
+each batch is encoded and sent before the next one is fetched, so memory
+stays constant however large the collection is. Filters are plain
+equality matches on an allow-list of fields per export, plus a
+``created_after`` / ``created_before`` range. Requests and alerts are
+read from the hot collection and then its archive.
+
+Compression happens here rather than in GZipMiddleware. The stream is
+gzipped with one compressor for the whole response and a sync flush after
+every batch, so the client receives compressed data as it is produced. The
+middleware leaves responses that already carry a Content-Encoding alone.
+"""
+
+import csv
+import io
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Mapping, Type
+
+from pydantic import BaseModel
+
+import trusted
+from archiver import archive_name
+from models import BloodRequest, BloodRequestStatus, Donor, EmergencyAlert
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Query parameters that are not field filters
+RESERVED_PARAMS = ("format", "created_after", "created_before")
+
+
+class ExportError(ValueError):
+    pass
+
+
+class ExportSpec:
+    def __init__(self, collection: str, model: Type[BaseModel], filters: List[str], archived: bool = False):
+        self.collection = collection
+        self.model = model
+        self.filters = filters
+        self.archived = archived
+        self.columns = list(model.model_fields)
+
+    def collections(self, query: dict) -> List[str]:
+        """The hot collection, plus its archive unless the export only asks for active requests"""
+        if self.archived and query.get("status") != BloodRequestStatus.ACTIVE.value:
+            return [self.collection, archive_name(self.collection)]
+        return [self.collection]
+
+
+EXPORTS: Dict[str, ExportSpec] = {
+    "donors": ExportSpec("donors", Donor, ["blood_type", "city", "state", "is_available", "is_online"]),
+    "blood-requests": ExportSpec(
+        "blood_requests", BloodRequest, ["status", "urgency", "blood_type_needed", "hospital_name", "city", "state"],
+        archived=True
+    ),
+    "alerts": ExportSpec("emergency_alerts", EmergencyAlert, ["blood_request_id", "alert_type"], archived=True),
+}
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    for coding in accept_encoding.lower().split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def _coerce(spec: ExportSpec, field: str, value: str):
+    if spec.model.model_fields[field].annotation is bool:
+        if value.lower() not in ("true", "false"):
+            raise ExportError(f"{field} must be true or false")
+        return value.lower() == "true"
+    return value
+
+
+def _parse_datetime(name: str, value: str) -> datetime:
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ExportError(f"{name} must be an ISO 8601 datetime")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+class Exporter:
+    def __init__(self, db, batch_size: int = 500):
+        self.db = db
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_env(cls, db) -> "Exporter":
+        return cls(db, batch_size=int(os.environ.get("EXPORT_BATCH_SIZE", "500")))
+
+    def query(self, spec: ExportSpec, params: Mapping[str, str]) -> dict:
+        """The Mongo filter for an export's query parameters; raises ExportError on anything unsupported"""
+        query = {}
+        for name, value in params.items():
+            if name in RESERVED_PARAMS:
+                continue
+            if name not in spec.filters:
+                raise ExportError(f"Cannot filter on {name}. Choose from: {', '.join(spec.filters + list(RESERVED_PARAMS[1:]))}")
+            query[name] = _coerce(spec, name, value)
+        created = {}
+        if params.get("created_after"):
+            created["$gte"] = _parse_datetime("created_after", params["created_after"])
+        if params.get("created_before"):
+            created["$lt"] = _parse_datetime("created_before", params["created_before"])
+        if created:
+            query["created_at"] = created
+        return query
+
+    async def stream(self, spec: ExportSpec, query: dict, fmt: str, compress: bool = False) -> AsyncIterator[bytes]:
+        encode = self._ndjson if fmt == "ndjson" else self._csv
+        compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16) if compress else None
+
+        def emit(data: bytes) -> bytes:
+            if compressor is None:
+                return data
+            return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        if fmt == "csv":
+            yield emit(self._csv_rows([spec.columns]))
+
+        for collection in spec.collections(query):
+            cursor = self.db[collection].find(query, {"_id": 0}, batch_size=self.batch_size)
+            batch = []
+            try:
+                async for document in cursor:
+                    batch.append(document)
+                    if len(batch) >= self.batch_size:
+                        yield emit(encode(spec, batch))
+                        batch = []
+                if batch:
+                    yield emit(encode(spec, batch))
+            finally:
+                await cursor.close()
+        if compressor is not None:
+            yield compressor.flush()
+
+    def _ndjson(self, spec: ExportSpec, documents: List[dict]) -> bytes:
+        return b"".join(
+            trusted.construct(spec.model, document).model_dump_json(warnings=False).encode() + b"\n"
+            for document in documents
+        )
+
+    def _csv(self, spec: ExportSpec, documents: List[dict]) -> bytes:
+        rows = []
+        for document in documents:
+            values = trusted.construct(spec.model, document).model_dump(mode="json", warnings=False)
+            rows.append([_csv_value(values.get(column)) for column in spec.columns])
+        return self._csv_rows(rows)
+
+    @staticmethod
+    def _csv_rows(rows: List[list]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+
+# Leading characters that make a spreadsheet read a cell as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # Donor names and cities are user input; quote them so opening the export cannot run them
+        return "'" + value
+    return value
@@ -0,0 +1,60 @@
+"""
+Opt-in fast JSON serialization for the /api router.
+
+With FAST_JSON=1 (and orjson installed) responses are rendered by orjson,
+which encodes datetimes, enums, UUIDs and nested dicts/lists natively and
+falls back to ``model_dump`` for pydantic models. Routes that return plain
+dicts still go through FastAPI's jsonable_encoder before rendering, so the
+hot endpoints (match-donors, projected list views) return ``json_response``
+directly to skip that pass as well. Without the flag everything renders
+through the stock JSONResponse exactly as before.
+"""
+
+import logging
+import os
+from typing import Any, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+FAST_JSON = os.environ.get("FAST_JSON", "0").lower() in ("1", "true", "yes")
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        # Constructed (trusted) models may hold stored enum strings; they serialize identically
+        return value.model_dump(mode="json", warnings=False)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _response_class():
+    if not FAST_JSON:
+        return JSONResponse
+    if orjson is None:
+        logger.warning("FAST_JSON is set but orjson is not installed; using the standard JSON encoder")
+        return JSONResponse
+    return FastJSONResponse
+
+
+# default_response_class for the /api router
+ResponseClass = _response_class()
+
+
+def json_response(content: Any, headers: Optional[dict] = None) -> JSONResponse:
+    """A response for content with the active serializer, skipping jsonable_encoder when it can"""
+    if ResponseClass is FastJSONResponse:
+        return FastJSONResponse(content, headers=headers)
+    return JSONResponse(jsonable_encoder(content), headers=headers)
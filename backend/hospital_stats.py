@@ -0,0 +1,80 @@
+"""
+Per-hospital performance counters.
+
+``total_requests``, ``successful_matches`` and a histogram of fulfillment
+times (minutes from request creation to Fulfilled) live on the hospital
+document and are maintained with atomic $inc updates on the write paths, so
+a hospital's stats are a single document read. Percentiles are estimated
+from the histogram buckets.
+"""
+
+from datetime import datetime
+from typing import Dict, Optional
+
+# Upper bounds (minutes) of the fulfillment time histogram buckets
+FULFILLMENT_BUCKETS = [5, 15, 30, 60, 120, 240, 480, 1440, 2880, 10080]
+OVERFLOW_BUCKET = f"gt_{FULFILLMENT_BUCKETS[-1]}"
+PERCENTILES = (50, 90, 99)
+
+STATS_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1, "total_requests": 1, "successful_matches": 1,
+    "total_fulfillment_minutes": 1, "fulfillment_histogram": 1,
+}
+
+
+def bucket_key(minutes: float) -> str:
+    for bound in FULFILLMENT_BUCKETS:
+        if minutes <= bound:
+            return f"le_{bound}"
+    return OVERFLOW_BUCKET
+
+
+async def record_request(db, hospital_id: str, count: int = 1):
+    await db.hospitals.update_one({"id": hospital_id}, {"$inc": {"total_requests": count}})
+
+
+async def record_fulfillment(db, hospital_id: str, created_at: datetime, fulfilled_at: Optional[datetime] = None):
+    minutes = max(0.0, ((fulfilled_at or datetime.utcnow()) - created_at).total_seconds() / 60)
+    await db.hospitals.update_one(
+        {"id": hospital_id},
+        {"$inc": {
+            "successful_matches": 1,
+            "total_fulfillment_minutes": minutes,
+            f"fulfillment_histogram.{bucket_key(minutes)}": 1,
+        }}
+    )
+
+
+def estimate_percentile(histogram: Dict[str, int], percentile: float) -> Optional[float]:
+    """Upper bound of the bucket containing the percentile; None past the last bound"""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = total * percentile / 100
+    seen = 0
+    for bound in FULFILLMENT_BUCKETS:
+        seen += histogram.get(f"le_{bound}", 0)
+        if seen >= rank:
+            return float(bound)
+    return None
+
+
+def summarize(hospital: dict) -> dict:
+    histogram = hospital.get("fulfillment_histogram") or {}
+    total_requests = hospital.get("total_requests", 0)
+    matches = hospital.get("successful_matches", 0)
+    return {
+        "hospital_id": hospital["id"],
+        "name": hospital.get("name"),
+        "total_requests": total_requests,
+        "successful_matches": matches,
+        "fulfillment_rate": round(matches / total_requests, 4) if total_requests else None,
+        "fulfillment_minutes": {
+            "mean": round(hospital.get("total_fulfillment_minutes", 0) / matches, 1) if matches else None,
+            **{f"p{percentile}": estimate_percentile(histogram, percentile) for percentile in PERCENTILES},
+        },
+        "fulfillment_histogram": {
+            **{f"le_{bound}": histogram.get(f"le_{bound}", 0) for bound in FULFILLMENT_BUCKETS},
+            OVERFLOW_BUCKET: histogram.get(OVERFLOW_BUCKET, 0),
+        },
+    }
@@ -0,0 +1,284 @@
+"""
+Index manifest for BloodConnect collections.
+
+``ensure_indexes`` applies the manifest idempotently at startup. An existing
+index with the same name or key pattern but different options (e.g. an old
+non-unique email index that is now unique) is dropped and rebuilt. A
+secondary index that fails to build is logged and skipped. A unique index
+that fails, usually because existing data has duplicates, raises
+``IndexBuildError`` once the rest of the manifest is applied. The register
+and update routes rely on those indexes alone to reject duplicates, so
+startup must not continue without them.
+
+Run as a script to verify query plans: every query shape the API routes and
+background services (expiry, archiver) issue is explained against the
+configured database, and the exit status is 1 if any of them would scan a
+whole collection. Exports are the exception: they stream a whole collection
+by design, so only their filters on indexed fields are listed (request
+status, an alert's blood request or created_at range). Donor exports and
+request exports by place or created_at range are full scans and not checked.
+
+    python indexes.py            # apply the manifest, then explain
+    python indexes.py --no-apply
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEX_OPTIONS_CONFLICT = 85
+INDEX_KEY_SPECS_CONFLICT = 86
+
+
+class IndexBuildError(RuntimeError):
+    """A unique index could not be built, so the uniqueness it enforces is not guaranteed"""
+
+
+class IndexSpec:
+    def __init__(self, keys: List[tuple], **options):
+        self.keys = keys
+        self.options = options
+
+    @property
+    def name(self) -> str:
+        return self.options.get("name") or "_".join(f"{field}_{direction}" for field, direction in self.keys)
+
+
+# Unique email / license_number indexes are what prevent duplicate registrations:
+# the register routes insert directly and map DuplicateKeyError to a 400
+INDEXES: Dict[str, List[IndexSpec]] = {
+    "users": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("email", ASCENDING)], unique=True),
+    ],
+    "donors": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("email", ASCENDING)], unique=True),
+        # Availability first: serves {is_available}, the compatible blood type $in and the stats $group
+        IndexSpec([("is_available", ASCENDING), ("blood_type", ASCENDING), ("is_online", ASCENDING)]),
+        IndexSpec([("is_available", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "hospitals": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("email", ASCENDING)], unique=True),
+        IndexSpec([("license_number", ASCENDING)], unique=True),
+        IndexSpec([("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("created_at", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "blood_requests": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("status", ASCENDING), ("priority_score", DESCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("status", ASCENDING), ("urgency", ASCENDING), ("priority_score", DESCENDING),
+                   ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("user_id", ASCENDING), ("priority_score", DESCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("status", ASCENDING), ("blood_type_needed", ASCENDING)]),
+        # Expiry scheduler: Active requests by expires_at
+        IndexSpec([("status", ASCENDING), ("expires_at", ASCENDING)]),
+        # Archiver: terminal requests by when they got there
+        IndexSpec([("status", ASCENDING), ("updated_at", ASCENDING)]),
+    ],
+    # Historical reads page through these alongside the hot collections
+    "blood_requests_archive": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("status", ASCENDING), ("priority_score", DESCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexSpec([("user_id", ASCENDING), ("priority_score", DESCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "emergency_alerts": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("created_at", DESCENDING)]),
+        IndexSpec([("blood_request_id", ASCENDING)]),
+    ],
+    "emergency_alerts_archive": [
+        IndexSpec([("id", ASCENDING)], unique=True),
+        IndexSpec([("created_at", DESCENDING)]),
+        IndexSpec([("blood_request_id", ASCENDING)]),
+    ],
+}
+
+# Indexes superseded by manifest entries, dropped by ensure_indexes if present
+OBSOLETE_INDEXES: Dict[str, List[str]] = {
+    "hospitals": ["status_1"],
+    "blood_requests": [
+        "status_1_priority_score_-1_created_at_-1",
+        "status_1_urgency_1_priority_score_-1_created_at_-1",
+        "user_id_1_priority_score_-1_created_at_-1",
+    ],
+}
+
+# List orderings; pagination appends id as the tie-breaker, which the indexes above include
+REQUEST_LIST_SORT = [("priority_score", DESCENDING), ("created_at", DESCENDING)]
+DONOR_LIST_SORT = [("created_at", DESCENDING)]
+HOSPITAL_LIST_SORT = [("created_at", DESCENDING)]
+REQUEST_PAGE_SORT = REQUEST_LIST_SORT + [("id", DESCENDING)]
+
+# Every find/update filter the routes and background services issue, with representative values
+QUERY_SHAPES = [
+    ("users by email", "users", {"email": "user@example.com"}, None),
+    ("users by id", "users", {"id": "user-id"}, None),
+    ("donors by id", "donors", {"id": "donor-id"}, None),
+    ("donors presence transition", "donors", {"id": "donor-id", "is_online": {"$ne": True}}, None),
+    ("available donors page", "donors", {"is_available": True}, DONOR_LIST_SORT + [("id", DESCENDING)]),
+    ("compatible donors", "donors", {"is_available": True, "blood_type": {"$in": ["O-", "O+"]}}, None),
+    ("hospitals by id", "hospitals", {"id": "hospital-id"}, None),
+    ("hospitals by status page", "hospitals", {"status": "verified"}, HOSPITAL_LIST_SORT + [("id", DESCENDING)]),
+    ("all hospitals page", "hospitals", {}, HOSPITAL_LIST_SORT + [("id", DESCENDING)]),
+    ("blood requests by id", "blood_requests", {"id": "request-id"}, None),
+    ("blood requests by status", "blood_requests", {"status": "Active"}, REQUEST_PAGE_SORT),
+    ("blood requests by status and urgency", "blood_requests", {"status": "Active", "urgency": "Critical"}, REQUEST_PAGE_SORT),
+    ("hospital's blood requests", "blood_requests",
+     {"$or": [{"status": "Active"}, {"user_id": "user-id"}]}, REQUEST_PAGE_SORT),
+    ("blood requests expiring", "blood_requests",
+     {"status": "Active", "expires_at": {"$lte": datetime(2030, 1, 1)}}, [("expires_at", ASCENDING)]),
+    ("archivable blood requests", "blood_requests",
+     {"status": {"$in": ["Fulfilled", "Cancelled", "Expired"]}, "updated_at": {"$lt": datetime(2030, 1, 1)}}, None),
+    ("archived blood requests by status", "blood_requests_archive", {"status": "Fulfilled"}, REQUEST_PAGE_SORT),
+    ("own blood requests", "blood_requests", {"user_id": "user-id"}, REQUEST_PAGE_SORT),
+    ("own archived blood requests", "blood_requests_archive", {"user_id": "user-id"}, REQUEST_PAGE_SORT),
+    ("own blood requests by status", "blood_requests", {"status": "Fulfilled", "user_id": "user-id"}, REQUEST_PAGE_SORT),
+    ("archived blood requests by id", "blood_requests_archive", {"id": "request-id"}, None),
+    ("archived blood requests by status and urgency", "blood_requests_archive",
+     {"status": "Fulfilled", "urgency": "Critical"}, REQUEST_PAGE_SORT),
+    ("hospital's archived blood requests", "blood_requests_archive",
+     {"$or": [{"status": "Fulfilled"}, {"user_id": "user-id"}]}, REQUEST_PAGE_SORT),
+    ("archiver moved requests check", "blood_requests", {"id": {"$in": ["request-id"]}}, None),
+    ("archiver rollback", "blood_requests_archive", {"id": {"$in": ["request-id"]}}, None),
+    ("export blood requests by status", "blood_requests", {"status": "Fulfilled"}, None),
+    ("export archived blood requests by status", "blood_requests_archive", {"status": "Fulfilled"}, None),
+    ("recent alerts", "emergency_alerts", {}, [("created_at", DESCENDING)]),
+    ("archiver moved alerts check", "emergency_alerts", {"id": {"$in": ["alert-id"]}}, None),
+    ("archiver alert rollback", "emergency_alerts_archive", {"id": {"$in": ["alert-id"]}}, None),
+    ("export alerts by blood request", "emergency_alerts", {"blood_request_id": "request-id"}, None),
+    ("export archived alerts by blood request", "emergency_alerts_archive", {"blood_request_id": "request-id"}, None),
+    ("export alerts by created range", "emergency_alerts",
+     {"created_at": {"$gte": datetime(2024, 1, 1), "$lt": datetime(2024, 2, 1)}}, None),
+    ("export archived alerts by created range", "emergency_alerts_archive",
+     {"created_at": {"$gte": datetime(2024, 1, 1), "$lt": datetime(2024, 2, 1)}}, None),
+    ("archivable alerts", "emergency_alerts", {"created_at": {"$lt": datetime(2030, 1, 1)}}, None),
+]
+
+
+async def ensure_indexes(db, collections: Optional[List[str]] = None):
+    """Create every manifest index, rebuilding ones whose options changed"""
+    failed_unique = []
+    for collection_name, specs in INDEXES.items():
+        if collections and collection_name not in collections:
+            continue
+        collection = db[collection_name]
+        for spec in specs:
+            try:
+                try:
+                    await collection.create_index(spec.keys, name=spec.name, **spec.options)
+                except OperationFailure as e:
+                    if e.code not in (INDEX_OPTIONS_CONFLICT, INDEX_KEY_SPECS_CONFLICT):
+                        raise
+                    await _rebuild(collection, spec)
+            except OperationFailure as e:
+                logger.error(f"Could not build index {collection_name}.{spec.name}: {e}")
+                if spec.options.get("unique"):
+                    failed_unique.append(f"{collection_name}.{spec.name}")
+        # Only once the replacements exist
+        await _drop_obsolete(collection, OBSOLETE_INDEXES.get(collection_name, []))
+    if failed_unique:
+        raise IndexBuildError(
+            f"Unique index(es) could not be built, remove the duplicates and restart: {', '.join(failed_unique)}"
+        )
+
+
+async def _drop_obsolete(collection, names: List[str]):
+    if not names:
+        return
+    existing = await collection.index_information()
+    for name in names:
+        if name in existing:
+            logger.info(f"Dropping superseded index {collection.name}.{name}")
+            await collection.drop_index(name)
+
+
+async def _rebuild(collection, spec: IndexSpec):
+    existing = await collection.index_information()
+    for name, info in existing.items():
+        if name == spec.name or list(info["key"]) == [(field, direction) for field, direction in spec.keys]:
+            logger.info(f"Rebuilding index {collection.name}.{name} with new options")
+            await collection.drop_index(name)
+    await collection.create_index(spec.keys, name=spec.name, **spec.options)
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def plan_stages(explanation: dict) -> List[str]:
+    """The stages of the winning plan, for find and aggregate explain output alike"""
+    if "queryPlanner" in explanation:
+        return [stage for stage in _stages(explanation["queryPlanner"]["winningPlan"]) if stage]
+    stages = []
+    for stage in explanation.get("stages", []):
+        if "$cursor" in stage:
+            stages.extend(plan_stages(stage["$cursor"]))
+    return stages
+
+
+async def explain_shapes(db) -> List[dict]:
+    from stats import DONOR_COUNTS_PIPELINE, REQUEST_COUNTS_PIPELINE
+
+    results = []
+    for name, collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        results.append({"name": name, "collection": collection, "stages": plan_stages(await cursor.explain())})
+    for name, collection, pipeline in [
+        ("stats donor counts", "donors", DONOR_COUNTS_PIPELINE),
+        ("stats request counts", "blood_requests", REQUEST_COUNTS_PIPELINE),
+    ]:
+        explanation = await db.command("aggregate", collection, pipeline=pipeline, explain=True)
+        results.append({"name": name, "collection": collection, "stages": plan_stages(explanation)})
+    return results
+
+
+async def main():
+    import argparse
+    import os
+    import sys
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / ".env")
+    parser = argparse.ArgumentParser(description="Apply the index manifest and verify query plans")
+    parser.add_argument("--no-apply", action="store_true", help="Only explain; do not create indexes first")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL"))
+    parser.add_argument("--db-name", default=os.environ.get("DB_NAME"))
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[args.db_name]
+    try:
+        if not args.no_apply:
+            await ensure_indexes(db)
+        results = await explain_shapes(db)
+    finally:
+        client.close()
+
+    scans = [result for result in results if "COLLSCAN" in result["stages"]]
+    for result in results:
+        marker = "❌" if result in scans else "✅"
+        print(f"{marker} {result['collection']:<17} {result['name']:<40} {' <- '.join(result['stages'])}")
+    print(f"\n{len(results) - len(scans)}/{len(results)} query shapes use an index")
+    sys.exit(1 if scans else 0)
+
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(main())
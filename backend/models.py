@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from enum import Enum
 import uuid
@@ -12,12 +12,19 @@ def generate_secure_id() -> str:
     """Generate a secure random ID"""
     return secrets.token_urlsafe(16)
 
+# Characters bleach escapes, strips or normalizes; text without any of them comes back unchanged
+BLEACH_SENSITIVE = re.compile(r"[&<>\x00-\x08\x0b-\x1f\x7f-\x9f]")
+
 def sanitize_input(text: str) -> str:
     """Sanitize user input to prevent XSS"""
     if not text:
         return ""
+    text = text.strip()
+    # Plain text (names, cities, phone numbers) skips the HTML parse
+    if not BLEACH_SENSITIVE.search(text):
+        return text[:500]
     # Remove HTML tags and normalize whitespace
-    cleaned = bleach.clean(text.strip(), tags=[], strip=True)
+    cleaned = bleach.clean(text, tags=[], strip=True)
     return cleaned[:500]  # Limit length
 
 def validate_phone(phone: str) -> bool:
@@ -63,6 +70,18 @@ class BloodRequestStatus(str, Enum):
     CANCELLED = "Cancelled"
     EXPIRED = "Expired"
 
+# Legal status changes; Fulfilled, Cancelled and Expired are terminal
+REQUEST_TRANSITIONS = {
+    BloodRequestStatus.ACTIVE: {BloodRequestStatus.FULFILLED, BloodRequestStatus.CANCELLED, BloodRequestStatus.EXPIRED},
+    BloodRequestStatus.FULFILLED: set(),
+    BloodRequestStatus.CANCELLED: set(),
+    BloodRequestStatus.EXPIRED: set(),
+}
+
+def statuses_leading_to(target: BloodRequestStatus) -> List[str]:
+    """Stored status values a request may move to `target` from, for conditional update filters"""
+    return [status.value for status, targets in REQUEST_TRANSITIONS.items() if target in targets]
+
 # Hospital Models
 class Hospital(BaseModel):
     id: str = Field(default_factory=generate_secure_id)
@@ -92,9 +111,11 @@ class Hospital(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     is_active: bool = True
     
-    # Statistics
+    # Statistics (maintained with $inc by hospital_stats)
     total_requests: int = 0
     successful_matches: int = 0
+    total_fulfillment_minutes: float = 0.0
+    fulfillment_histogram: Dict[str, int] = Field(default_factory=dict)
     
     @validator('name', 'address', 'city', 'state', 'contact_person_name', 'contact_person_title')
     def sanitize_text_fields(cls, v):
@@ -112,6 +133,22 @@ class Hospital(BaseModel):
             raise ValueError('Invalid email format')
         return sanitize_input(v.lower())
 
+# Compact list-view shapes (?view=summary): no validators, read through a projection
+class HospitalSummary(BaseModel):
+    id: str
+    name: str
+    license_number: str
+    phone: str
+    email: str
+    address: str
+    city: str
+    state: str
+    status: HospitalStatus
+    contact_person_name: str
+    contact_person_title: str
+    total_requests: int = 0
+    created_at: datetime
+
 class HospitalCreate(BaseModel):
     name: str = Field(min_length=2, max_length=200)
     license_number: str = Field(min_length=5, max_length=50)
@@ -185,6 +222,17 @@ class Donor(BaseModel):
             raise ValueError('Invalid blood type')
         return v
 
+class DonorSummary(BaseModel):
+    id: str
+    name: str
+    phone: str
+    email: str
+    blood_type: str
+    age: int
+    city: str
+    state: str
+    is_online: bool = False
+
 class DonorCreate(BaseModel):
     name: str = Field(min_length=2, max_length=100)
     phone: str = Field(min_length=10, max_length=20)
@@ -277,6 +325,23 @@ class BloodRequest(BaseModel):
             raise ValueError('Invalid blood type')
         return v
 
+class BloodRequestSummary(BaseModel):
+    id: str
+    requester_name: str
+    patient_name: str
+    phone: str
+    email: str
+    blood_type_needed: str
+    urgency: BloodRequestUrgency
+    units_needed: int
+    hospital_name: str
+    city: str
+    state: str
+    description: Optional[str] = None
+    status: BloodRequestStatus
+    priority_score: float = 0.0
+    created_at: datetime
+
 class BloodRequestCreate(BaseModel):
     requester_name: str = Field(min_length=2, max_length=100)
     patient_name: str = Field(min_length=2, max_length=100)
@@ -316,6 +381,10 @@ class BloodRequestCreate(BaseModel):
             raise ValueError('Invalid blood type')
         return v
 
+class BloodRequestBatch(BaseModel):
+    """Several requests submitted together, e.g. one per blood type in a mass-casualty event"""
+    requests: List[BloodRequestCreate] = Field(min_length=1, max_length=50)
+
 # Alert Models
 class EmergencyAlert(BaseModel):
     id: str = Field(default_factory=generate_secure_id)
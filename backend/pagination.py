@@ -0,0 +1,118 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Pages are ordered by the endpoint's sort keys with ``id`` appended as a
+unique tie-breaker, and every page after the first starts strictly after
+the last row of the previous one. Each page is a single index range scan
+of ``limit + 1`` rows however deep it is, unlike skip/limit. The next-page
+token is an opaque, URL-safe encoding of that last row's sort values;
+list endpoints return it in the ``X-Next-Cursor`` response header so the
+response body stays a plain list.
+
+``paginate_union`` pages through several collections of the same shape (a
+hot collection and its archive) as if they were one. The cursor holds only
+sort values, so the same keyset filter applies to each of them.
+"""
+
+import asyncio
+import base64
+import binascii
+import os
+from functools import cmp_to_key
+from typing import List, Optional, Tuple
+
+from bson import json_util
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+DEFAULT_PAGE_SIZE = int(os.environ.get("PAGE_SIZE_DEFAULT", "50"))
+MAX_PAGE_SIZE = int(os.environ.get("PAGE_SIZE_MAX", "200"))
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def with_tiebreaker(sort: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+    """Append id (in the direction of the last sort key) so the ordering is total"""
+    direction = sort[-1][1] if sort else -1
+    return list(sort) + [("id", direction)]
+
+
+def encode_cursor(document: dict, sort: List[Tuple[str, int]]) -> str:
+    values = [document.get(field) for field, _ in sort]
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: List[Tuple[str, int]]) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor("Invalid pagination cursor")
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise InvalidCursor("Invalid pagination cursor")
+    return values
+
+
+def after(sort: List[Tuple[str, int]], values: list) -> dict:
+    """Filter for rows strictly after `values` in `sort` order"""
+    branches = []
+    for position, (field, direction) in enumerate(sort):
+        branch = {sort[index][0]: values[index] for index in range(position)}
+        branch[field] = {"$lt" if direction < 0 else "$gt": values[position]}
+        branches.append(branch)
+    return {"$or": branches}
+
+
+def page_size(limit: Optional[int]) -> int:
+    if not limit or limit < 1:
+        return DEFAULT_PAGE_SIZE
+    return min(limit, MAX_PAGE_SIZE)
+
+
+async def paginate(collection, query: dict, sort: List[Tuple[str, int]], cursor: Optional[str] = None,
+                   limit: Optional[int] = None, projection: Optional[dict] = None) -> Tuple[list, Optional[str]]:
+    """Fetch one page; returns the documents and the cursor for the next page (None on the last)"""
+    sort = with_tiebreaker(sort)
+    size = page_size(limit)
+    if cursor:
+        keyset = after(sort, decode_cursor(cursor, sort))
+        query = {"$and": [query, keyset]} if query else keyset
+    documents = await collection.find(query, projection).sort(sort).limit(size + 1).to_list(size + 1)
+    if len(documents) <= size:
+        return documents, None
+    documents = documents[:size]
+    return documents, encode_cursor(documents[-1], sort)
+
+
+def _compare(sort: List[Tuple[str, int]]):
+    """Python ordering matching Mongo's for the sort; missing values sort lowest, as in Mongo"""
+    def compare(a: dict, b: dict) -> int:
+        for field, direction in sort:
+            x, y = a.get(field), b.get(field)
+            if x == y:
+                continue
+            if x is None or (y is not None and x < y):
+                return -direction
+            return direction
+        return 0
+    return cmp_to_key(compare)
+
+
+async def paginate_union(collections: list, query: dict, sort: List[Tuple[str, int]], cursor: Optional[str] = None,
+                         limit: Optional[int] = None, projection: Optional[dict] = None) -> Tuple[list, Optional[str]]:
+    """paginate() over several collections merged in sort order"""
+    sort = with_tiebreaker(sort)
+    size = page_size(limit)
+    if cursor:
+        keyset = after(sort, decode_cursor(cursor, sort))
+        query = {"$and": [query, keyset]} if query else keyset
+    pages = await asyncio.gather(*[
+        collection.find(query, projection).sort(sort).limit(size + 1).to_list(size + 1) for collection in collections
+    ])
+    documents = sorted((document for page in pages for document in page), key=_compare(sort))
+    if len(documents) <= size:
+        return documents, None
+    documents = documents[:size]
+    return documents, encode_cursor(documents[-1], sort)
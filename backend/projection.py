@@ -0,0 +1,53 @@
+"""
+Field selection for list and detail endpoints.
+
+``fields=name,city`` or ``view=summary`` turn into a Mongo projection, so
+only the requested fields are read from the database, validated and
+serialized. ``id`` is always returned. The sort keys a page is ordered by
+are also read, because the next-page cursor is built from them, but they
+are dropped from the rows unless requested.
+"""
+
+from enum import Enum
+from typing import Iterable, List, Optional, Tuple
+
+
+class UnknownField(ValueError):
+    pass
+
+
+class ListView(str, Enum):
+    FULL = "full"
+    SUMMARY = "summary"
+
+
+class FieldSelection:
+    """The fields a request asked for; raises UnknownField on names the model does not have"""
+
+    def __init__(self, model, summary_model=None, fields: Optional[str] = None, view: ListView = ListView.FULL):
+        self.summary_model = None
+        self.fields: Optional[List[str]] = None
+        if fields:
+            requested = [name.strip() for name in fields.split(",") if name.strip()]
+            unknown = [name for name in requested if name not in model.model_fields]
+            if unknown:
+                raise UnknownField(f"Unknown field(s): {', '.join(unknown)}")
+            self.fields = list(dict.fromkeys(["id"] + requested))
+        elif view == ListView.SUMMARY and summary_model is not None:
+            self.summary_model = summary_model
+            self.fields = list(summary_model.model_fields)
+
+    @property
+    def full(self) -> bool:
+        return self.fields is None
+
+    def projection(self, sort: Iterable[Tuple[str, int]] = ()) -> Optional[dict]:
+        if self.fields is None:
+            return None
+        return {"_id": 0, **{name: 1 for name in self.fields}, **{field: 1 for field, _ in sort}}
+
+    def rows(self, documents: List[dict]) -> list:
+        """Summary rows go through their (validator-free) model; explicit field lists are returned as stored"""
+        if self.summary_model is not None:
+            return [self.summary_model(**document) for document in documents]
+        return [{name: document[name] for name in self.fields if name in document} for document in documents]
@@ -0,0 +1,176 @@
+"""
+Pre-aggregated time-series rollups for historical analytics.
+
+Every counted event (a blood request created or changing status, an alert
+sent, a donor registering) increments one counter document per granularity:
+minute, hour and day buckets, keyed by metric, bucket start and the blood
+type / urgency / state dimensions. Range queries only read the rollup
+collection matching the requested granularity, never the raw
+``blood_requests`` or ``emergency_alerts`` collections. Minute and hour
+buckets expire through TTL indexes; day buckets are kept.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+REQUESTS_CREATED = "requests_created"
+ALERTS_SENT = "alerts_sent"
+DONOR_REGISTRATIONS = "donor_registrations"
+# Status transitions are counted as "requests_<status>", e.g. requests_fulfilled. Only terminal
+# statuses are reachable by a transition; a request is Active from creation (requests_created).
+REQUEST_STATUS_METRICS = ("requests_fulfilled", "requests_cancelled", "requests_expired")
+METRICS = (REQUESTS_CREATED, ALERTS_SENT, DONOR_REGISTRATIONS) + REQUEST_STATUS_METRICS
+
+DIMENSIONS = ("blood_type", "urgency", "state")
+
+GRANULARITIES = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+# Longest range served at each granularity when the caller does not choose one
+AUTO_GRANULARITY = [
+    (timedelta(hours=6), "minute"),
+    (timedelta(days=14), "hour"),
+]
+
+MAX_POINTS = 5000
+
+
+def status_metric(status) -> str:
+    return f"requests_{getattr(status, 'value', status).lower()}"
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return moment.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def choose_granularity(start: datetime, end: datetime) -> str:
+    for longest, granularity in AUTO_GRANULARITY:
+        if end - start <= longest:
+            return granularity
+    return "day"
+
+
+def _dimension(value) -> Optional[str]:
+    value = getattr(value, "value", value)
+    return value or None
+
+
+class RollupStore:
+    """Maintains and queries the rollups_minute / rollups_hour / rollups_day collections"""
+
+    def __init__(self, db, minute_retention_days: int = 2, hour_retention_days: int = 90):
+        self.db = db
+        self.retention = {
+            "minute": timedelta(days=minute_retention_days),
+            "hour": timedelta(days=hour_retention_days),
+        }
+
+    @classmethod
+    def from_env(cls, db) -> "RollupStore":
+        return cls(
+            db,
+            minute_retention_days=int(os.environ.get("ROLLUP_MINUTE_RETENTION_DAYS", "2")),
+            hour_retention_days=int(os.environ.get("ROLLUP_HOUR_RETENTION_DAYS", "90")),
+        )
+
+    def collection(self, granularity: str):
+        return self.db[f"rollups_{granularity}"]
+
+    async def ensure_indexes(self):
+        for granularity in GRANULARITIES:
+            collection = self.collection(granularity)
+            await collection.create_index([("metric", 1), ("bucket", 1)])
+            if granularity in self.retention:
+                await collection.create_index(
+                    "expires_at", expireAfterSeconds=0, name="expires_at_ttl"
+                )
+
+    async def record(self, metric: str, at: Optional[datetime] = None, count: int = 1,
+                     blood_type: Optional[str] = None, urgency=None, state: Optional[str] = None):
+        """Count an event in its minute, hour and day buckets"""
+        at = at or datetime.utcnow()
+        dimensions = {
+            "blood_type": _dimension(blood_type),
+            "urgency": _dimension(urgency),
+            "state": _dimension(state),
+        }
+        try:
+            await asyncio.gather(*[
+                self._increment(granularity, metric, bucket_start(at, granularity), dimensions, count)
+                for granularity in GRANULARITIES
+            ])
+        except Exception as e:
+            logger.error(f"Failed to record {metric} rollup: {e}")
+
+    async def _increment(self, granularity: str, metric: str, bucket: datetime, dimensions: dict, count: int):
+        key = "|".join([metric, bucket.isoformat()] + [dimensions[name] or "" for name in DIMENSIONS])
+        on_insert = {"metric": metric, "bucket": bucket, **dimensions}
+        if granularity in self.retention:
+            on_insert["expires_at"] = bucket + self.retention[granularity]
+        await self.collection(granularity).update_one(
+            {"_id": key},
+            {"$inc": {"count": count}, "$setOnInsert": on_insert},
+            upsert=True
+        )
+
+    async def timeseries(self, metric: str, start: datetime, end: datetime, granularity: Optional[str] = None,
+                         filters: Optional[dict] = None, group_by: Optional[str] = None) -> dict:
+        """Counts per bucket in [start, end), zero-filled, optionally split by one dimension"""
+        granularity = granularity or choose_granularity(start, end)
+        step = GRANULARITIES[granularity]
+        first = bucket_start(start, granularity)
+        if (end - first) / step > MAX_POINTS:
+            raise ValueError(f"Range spans more than {MAX_POINTS} {granularity} buckets; use a coarser granularity")
+
+        match = {"metric": metric, "bucket": {"$gte": first, "$lt": end}}
+        for name, value in (filters or {}).items():
+            if value:
+                match[name] = value
+        group_key = {"bucket": "$bucket"}
+        if group_by:
+            group_key["group"] = f"${group_by}"
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": group_key, "count": {"$sum": "$count"}}},
+        ]
+        groups = await self.collection(granularity).aggregate(pipeline).to_list(None)
+
+        counts = {}
+        for group in groups:
+            series = counts.setdefault(group["_id"].get("group"), {})
+            series[group["_id"]["bucket"]] = group["count"]
+
+        buckets: List[datetime] = []
+        moment = first
+        while moment < end:
+            buckets.append(moment)
+            moment += step
+
+        def points(series: dict) -> list:
+            return [{"bucket": bucket, "count": series.get(bucket, 0)} for bucket in buckets]
+
+        result = {
+            "metric": metric,
+            "granularity": granularity,
+            "start": first,
+            "end": end,
+            "total": sum(group["count"] for group in groups),
+        }
+        if group_by:
+            result["group_by"] = group_by
+            result["series"] = {str(key): points(series) for key, series in counts.items()}
+        else:
+            result["points"] = points(counts.get(None, {}))
+        return result
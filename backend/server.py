@@ -2,6 +2,7 @@ from fastapi import FastAPI, APIRouter, HTTPException, WebSocket, WebSocketDisco
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
@@ -15,7 +16,7 @@ from pathlib import Path
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import json
 import asyncio
 import re
@@ -27,12 +28,36 @@ import secrets
 from auth import (
     UserRole, get_current_user, get_current_user_optional, require_role, require_roles,
     create_access_token, create_refresh_token, verify_password, get_password_hash,
-    validate_password, Token, UserLogin, create_demo_token, User
+    validate_password, Token, UserLogin, create_demo_token, User, verify_token
 )
 from models import (
     Donor, DonorCreate, BloodRequest, BloodRequestCreate, Hospital, HospitalCreate,
-    EmergencyAlert, UserDB, UserCreate, HospitalStatus, BloodRequestStatus, BloodRequestUrgency
+    DonorSummary, BloodRequestSummary, HospitalSummary, BloodRequestBatch, EmergencyAlert, statuses_leading_to, UserDB, UserCreate, HospitalStatus, BloodRequestStatus, BloodRequestUrgency
 )
+from email_sender import EmailSender
+from alert_bus import AlertBus, Event, ALERTS_CHANNEL, DONORS_CHANNEL, STATS_CHANNEL, CHANNELS, DEFAULT_CHANNELS, parse_channels
+import ws_protocol
+from admission import AdmissionController, TRY_AGAIN_LATER
+from stats import StatsMaterializer, StatsBroadcaster
+from indexes import ensure_indexes, REQUEST_LIST_SORT, DONOR_LIST_SORT, HOSPITAL_LIST_SORT
+from pagination import paginate, paginate_union, InvalidCursor, NEXT_CURSOR_HEADER
+from projection import FieldSelection, ListView, UnknownField
+import trusted
+import fast_json
+from expiry import ExpiryScheduler
+from archiver import Archiver, HISTORICAL_STATUSES, archive_name
+from cache import DocumentCache
+from coalesce import coalesce, metrics as coalesce_metrics
+from donor_import import DonorImporter, InvalidUpload, detect_format
+from export import Exporter, ExportError, EXPORTS, FORMATS as EXPORT_FORMATS, accepts_gzip
+import hospital_stats
+from counter_buffer import CounterBuffer
+from rollups import (
+    RollupStore, METRICS, DIMENSIONS, GRANULARITIES, REQUESTS_CREATED, ALERTS_SENT,
+    DONOR_REGISTRATIONS, status_metric
+)
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 
 ROOT_DIR = Path(__file__).parent
@@ -43,6 +68,43 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Broadcast bus shared by the websocket and SSE transports
+alert_bus = AlertBus(
+    history_size=int(os.environ.get("ALERT_HISTORY_SIZE", "1000")),
+    max_queue=int(os.environ.get("SSE_MAX_QUEUE", "256"))
+)
+
+# Materialized /api/stats counters, updated by the write paths below
+stats_materializer = StatsMaterializer.from_env(db)
+
+# Minute/hour/day counters behind /api/analytics/timeseries
+rollups = RollupStore.from_env(db)
+
+# Write-behind buffer for views_count / alerts_sent increments
+counter_buffer = CounterBuffer.from_env(db)
+
+# Batched cursor streaming behind /api/export
+exporter = Exporter.from_env(db)
+
+# Chunked validation and unordered inserts behind /api/donors/import
+donor_importer = DonorImporter.from_env(db)
+
+# Flips Active requests to Expired at their expires_at
+expiry_scheduler = ExpiryScheduler.from_env(db)
+
+# Moves old terminal requests and alerts to the *_archive collections
+archiver = Archiver.from_env(db)
+
+# Read-through LRU of donors, requests and hospitals by id; write paths below invalidate it
+document_cache = DocumentCache.from_env(db)
+
+# Websocket admission control (per-worker caps and accept rate)
+admission = AdmissionController.from_env()
+TRUST_FORWARDED_FOR = os.environ.get("WS_TRUST_FORWARDED_FOR", "false").lower() == "true"
+
+# Alert email delivery (disabled unless SMTP_HOST is configured)
+email_sender = EmailSender.from_env()
+
 # Security configuration
 security = HTTPBearer(auto_error=False)
 limiter = Limiter(key_func=get_remote_address)
@@ -64,7 +126,7 @@ app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", default_response_class=fast_json.ResponseClass)
 
 # Blood type compatibility mapping
 BLOOD_COMPATIBILITY = {
@@ -113,61 +175,152 @@ def generate_secure_id() -> str:
 # WebSocket connection manager for real-time alerts
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: dict = {}  # websocket: client ip, in connection order
         self.donor_connections: dict = {}  # donor_id: websocket
+        self.connection_donors: dict = {}  # websocket: donor_id
+        self.priority_connections: set = set()  # websockets of verified donors (admission priority, never shed)
         self.connection_tokens: dict = {}  # websocket: token for basic security
+        self.channel_filters: dict = {}  # websocket: set of subscribed broadcast channels
+        self.protocols: dict = {}  # websocket: negotiated wire protocol (None for plain JSON)
 
-    async def connect(self, websocket: WebSocket, donor_id: str = None):
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket, donor_id: str = None) -> bool:
+        """Accept the socket if admission control allows it; rejected clients are refused during the handshake.
+
+        donor_id must already be verified (see verified_donor_id): it is what grants admission priority.
+        """
+        ip = client_ip(websocket)
+        verdict = admission.check(ip, is_donor=bool(donor_id))
+        if verdict == "shed_required":
+            await self.shed_anonymous()
+        elif verdict:
+            await self.refuse(websocket)
+            return False
+        admission.admit(ip, is_donor=bool(donor_id))
+        
+        protocol = ws_protocol.negotiate(websocket.scope.get("subprotocols", []))
+        try:
+            await websocket.accept(subprotocol=protocol)
+        except Exception:
+            admission.release(ip, is_donor=bool(donor_id))
+            raise
+        self.protocols[websocket] = protocol
         # Generate a simple token for this connection
         connection_token = secrets.token_urlsafe(16)
         self.connection_tokens[websocket] = connection_token
-        self.active_connections.append(websocket)
+        self.active_connections[websocket] = ip
+        self.channel_filters[websocket] = set(DEFAULT_CHANNELS)
         if donor_id:
-            self.donor_connections[donor_id] = websocket
-        print(f"WebSocket connected. Total connections: {len(self.active_connections)}")
-
-    def disconnect(self, websocket: WebSocket, donor_id: str = None):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        if websocket in self.connection_tokens:
-            del self.connection_tokens[websocket]
-        if donor_id and donor_id in self.donor_connections:
+            self.priority_connections.add(websocket)
+            self.register_donor(websocket, donor_id)
+        stats_broadcaster.notify()
+        return True
+
+    async def refuse(self, websocket: WebSocket):
+        """Reject before accepting, so a refused client costs no completed handshake"""
+        if "websocket.http.response" in websocket.scope.get("extensions", {}):
+            await websocket.send_denial_response(JSONResponse(
+                {"detail": "Too many connections"}, status_code=503,
+                headers={"Retry-After": str(admission.retry_after)}
+            ))
+        else:
+            # Closing before accept is answered with HTTP 403 by the server
+            await websocket.close(code=TRY_AGAIN_LATER, reason=admission.close_reason())
+
+    def register_donor(self, websocket: WebSocket, donor_id: str, verified: bool = False):
+        """Route donor_id's alerts to this socket; only a verified donor also gets admission priority"""
+        if verified and websocket not in self.priority_connections:
+            self.priority_connections.add(websocket)
+            admission.promote()
+        previous = self.connection_donors.get(websocket)
+        if previous is not None and previous != donor_id and self.donor_connections.get(previous) is websocket:
+            # The socket now belongs to another donor; stop routing the old donor's alerts to it
+            del self.donor_connections[previous]
+        self.donor_connections[donor_id] = websocket
+        self.connection_donors[websocket] = donor_id
+
+    async def shed_anonymous(self):
+        """Close the oldest anonymous viewer to make room for a registered donor"""
+        for connection in self.active_connections:
+            if connection not in self.priority_connections:
+                admission.shed()
+                self.disconnect(connection)
+                try:
+                    await connection.close(code=TRY_AGAIN_LATER, reason=admission.close_reason())
+                except Exception:
+                    pass
+                return
+
+    def disconnect(self, websocket: WebSocket) -> Optional[str]:
+        """Forget a connection and return the donor id it was registered for, if any"""
+        ip = self.active_connections.pop(websocket, None)
+        donor_id = self.connection_donors.pop(websocket, None)
+        if ip is not None:
+            admission.release(ip, is_donor=websocket in self.priority_connections)
+            stats_broadcaster.notify()
+        self.priority_connections.discard(websocket)
+        self.connection_tokens.pop(websocket, None)
+        self.channel_filters.pop(websocket, None)
+        self.protocols.pop(websocket, None)
+        if donor_id and self.donor_connections.get(donor_id) is websocket:
             del self.donor_connections[donor_id]
-        print(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
+        return donor_id
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
+    async def send_frame(self, frame, websocket: WebSocket):
+        if isinstance(frame, bytes):
+            await websocket.send_bytes(frame)
+        else:
+            await websocket.send_text(frame)
+
+    async def send_personal_message(self, message: dict, websocket: WebSocket):
         try:
-            await websocket.send_text(message)
+            await self.send_frame(ws_protocol.encode(message, self.protocols.get(websocket)), websocket)
         except Exception as e:
             print(f"Error sending personal message: {e}")
 
-    async def send_to_donor(self, message: str, donor_id: str):
+    async def send_to_donor(self, message: dict, donor_id: str):
         if donor_id in self.donor_connections:
+            websocket = self.donor_connections[donor_id]
             try:
-                await self.donor_connections[donor_id].send_text(message)
+                await self.send_frame(ws_protocol.encode(message, self.protocols.get(websocket)), websocket)
             except Exception as e:
                 print(f"Error sending to donor {donor_id}: {e}")
 
-    async def broadcast_alert(self, message: str):
+    async def broadcast_alert(self, alert: dict, channel: str = ALERTS_CHANNEL, retain: bool = True):
+        # Publish once so SSE subscribers and websockets share the same encoded frame
+        event = alert_bus.publish(channel, alert, retain=retain)
         disconnected = []
-        for connection in self.active_connections:
+        for connection in list(self.active_connections):
+            if channel not in self.channel_filters.get(connection, ()):
+                continue
             try:
-                await connection.send_text(message)
+                await self.send_frame(event.frame(self.protocols.get(connection)), connection)
             except Exception as e:
                 print(f"Error broadcasting to connection: {e}")
                 disconnected.append(connection)
         
         # Remove disconnected connections
         for conn in disconnected:
-            if conn in self.active_connections:
-                self.active_connections.remove(conn)
+            self.disconnect(conn)
+
+    async def subscribe(self, websocket: WebSocket, channels: set, last_event_id: Optional[str] = None):
+        """Set a connection's channel filter and replay anything it missed since last_event_id"""
+        self.channel_filters[websocket] = channels
+        events, complete = alert_bus.replay(last_event_id, channels)
+        if not complete:
+            await self.send_personal_message({"type": "resync"}, websocket)
+        for event in events:
+            await self.send_frame(event.frame(self.protocols.get(websocket)), websocket)
+        if STATS_CHANNEL in channels:
+            await self.send_personal_message(await stats_snapshot(), websocket)
 
     async def notify_compatible_donors(self, blood_request: dict):
         """Send emergency alerts to compatible donors"""
         try:
-            # Find compatible donors
-            all_donors = await db.donors.find({"is_available": True}).to_list(1000)
+            # Find compatible donors; the blood type filter is resolved by the donors index
+            all_donors = await db.donors.find({
+                "is_available": True,
+                "blood_type": {"$in": compatible_donor_types(blood_request["blood_type_needed"])}
+            }).to_list(1000)
             compatible_donors = []
             
             for donor_data in all_donors:
@@ -206,26 +359,127 @@ class ConnectionManager:
                         "location_priority": match["location_match"],
                         "compatibility": "Direct" if match["donor"]["blood_type"] == blood_request["blood_type_needed"] else "Compatible"
                     }
-                    await self.send_to_donor(json.dumps(donor_alert), donor_id)
+                    await self.send_to_donor(donor_alert, donor_id)
                     alert_count += 1
             
+            # Queue one batched email for every compatible donor who opted in
+            email_recipients = []
+            for match in compatible_donors:
+                preferences = match["donor"].get("notification_preferences") or {}
+                if not preferences.get("email", True):
+                    continue
+                if preferences.get("critical_only") and blood_request["urgency"] != BloodRequestUrgency.CRITICAL.value:
+                    continue
+                email_recipients.append(match["donor"]["email"])
+            email_sender.enqueue("emergency_alert", blood_request["id"], blood_request, email_recipients)
+            
             # Also broadcast general alert to all connections
             general_alert = {
                 "type": "general_alert",
                 "message": f"🚨 {blood_request['urgency']} Blood Request: {blood_request['blood_type_needed']} needed at {blood_request['hospital_name']}, {blood_request['city']}",
                 "urgency": blood_request["urgency"],
+                "blood_type_needed": blood_request["blood_type_needed"],
+                "hospital_name": blood_request["hospital_name"],
+                "city": blood_request["city"],
                 "compatible_donors_alerted": alert_count,
                 "total_compatible_donors": len(compatible_donors),
                 "timestamp": datetime.utcnow().isoformat()
             }
             
-            await self.broadcast_alert(json.dumps(general_alert))
+            await self.broadcast_alert(general_alert)
             
             print(f"Emergency alert sent! {alert_count} connected donors notified out of {len(compatible_donors)} compatible donors")
             
         except Exception as e:
             print(f"Error sending emergency alerts: {e}")
 
+    async def notify_compatible_donors_batch(self, blood_requests: List[dict]):
+        """Alert for several requests at once: one donor query, one alert and at most one email per donor"""
+        try:
+            blood_requests = sorted(
+                ({**r, "urgency": getattr(r["urgency"], "value", r["urgency"])} for r in blood_requests),
+                key=lambda r: r["priority_score"],
+                reverse=True
+            )
+            donor_types = set()
+            for blood_request in blood_requests:
+                donor_types.update(compatible_donor_types(blood_request["blood_type_needed"]))
+            all_donors = await db.donors.find({
+                "is_available": True,
+                "blood_type": {"$in": sorted(donor_types)}
+            }).to_list(1000)
+            
+            alert_count = 0
+            compatible_count = 0
+            email_groups = {}
+            for donor_data in all_donors:
+                # Most urgent first, so the primary request of the alert is the one to act on
+                matches = [
+                    blood_request for blood_request in blood_requests
+                    if self.calculate_compatibility(donor_data["blood_type"], blood_request["blood_type_needed"])
+                ]
+                if not matches:
+                    continue
+                compatible_count += 1
+                primary = matches[0]
+                
+                if donor_data["id"] in self.donor_connections:
+                    location_match = 0
+                    if donor_data["city"].lower() == primary["city"].lower():
+                        location_match = 2
+                    elif donor_data["state"].lower() == primary["state"].lower():
+                        location_match = 1
+                    await self.send_to_donor({
+                        "type": "emergency_alert",
+                        "urgency": primary["urgency"],
+                        "blood_request": primary,
+                        "blood_requests": matches,
+                        "total_compatible_donors": len(all_donors),
+                        "timestamp": datetime.utcnow().isoformat(),
+                        "alert_id": generate_secure_id(),
+                        "location_priority": location_match,
+                        "compatibility": "Direct" if donor_data["blood_type"] == primary["blood_type_needed"] else "Compatible"
+                    }, donor_data["id"])
+                    alert_count += 1
+                
+                preferences = donor_data.get("notification_preferences") or {}
+                if not preferences.get("email", True):
+                    continue
+                if preferences.get("critical_only"):
+                    matches = [m for m in matches if m["urgency"] == BloodRequestUrgency.CRITICAL.value]
+                if matches:
+                    email_groups.setdefault(tuple(m["id"] for m in matches), (matches, []))[1].append(donor_data["email"])
+            
+            # Donors compatible with the same set of requests share one email
+            for request_ids, (matches, recipients) in email_groups.items():
+                if len(matches) == 1:
+                    email_sender.enqueue("emergency_alert", matches[0]["id"], matches[0], recipients)
+                    continue
+                summary = "\n".join(
+                    f"- {m['urgency']}: {m['units_needed']} unit(s) of {m['blood_type_needed']} at {m['hospital_name']}, {m['city']}"
+                    for m in matches
+                )
+                email_sender.enqueue("emergency_alert_batch", "|".join(request_ids), {"count": len(matches), "summary": summary}, recipients)
+            
+            primary = blood_requests[0]
+            blood_types = ", ".join(dict.fromkeys(r["blood_type_needed"] for r in blood_requests))
+            await self.broadcast_alert({
+                "type": "general_alert",
+                "message": f"🚨 {len(blood_requests)} blood requests: {blood_types} needed at {primary['hospital_name']}, {primary['city']}",
+                "urgency": primary["urgency"],
+                "blood_type_needed": blood_types,
+                "hospital_name": primary["hospital_name"],
+                "city": primary["city"],
+                "compatible_donors_alerted": alert_count,
+                "total_compatible_donors": compatible_count,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+            
+            print(f"Batch emergency alert sent! {len(blood_requests)} requests, {alert_count} connected donors notified out of {compatible_count} compatible donors")
+            
+        except Exception as e:
+            print(f"Error sending batch emergency alerts: {e}")
+
     def calculate_compatibility(self, donor_blood_type: str, requested_blood_type: str) -> bool:
         """Check if donor can donate to the requested blood type"""
         BLOOD_COMPATIBILITY = {
@@ -243,57 +497,135 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+async def current_stats() -> dict:
+    counts = await stats_materializer.get()
+    return {**counts, "active_alert_connections": len(manager.active_connections)}
+
+async def stats_snapshot() -> dict:
+    return {
+        "type": "stats_snapshot",
+        "channel": STATS_CHANNEL,
+        "stats": await current_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+async def publish_stats_delta(delta: dict):
+    await manager.broadcast_alert(delta, STATS_CHANNEL, retain=False)
+
+# Coalesced stats deltas for live dashboards on the "stats" channel
+stats_broadcaster = StatsBroadcaster.from_env(current_stats, publish_stats_delta)
+stats_materializer.listeners.append(stats_broadcaster.notify)
+
+def client_ip(websocket: WebSocket) -> str:
+    if TRUST_FORWARDED_FOR:
+        forwarded = websocket.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return websocket.client.host if websocket.client else "unknown"
+
 # Helper functions
 def calculate_compatibility(donor_blood_type: str, requested_blood_type: str) -> bool:
     """Check if donor can donate to the requested blood type"""
     compatible_recipients = BLOOD_COMPATIBILITY.get(donor_blood_type, [])
     return requested_blood_type in compatible_recipients
 
+def compatible_donor_types(requested_blood_type: str) -> List[str]:
+    """Donor blood types that can give to the requested blood type"""
+    return [donor_type for donor_type, recipients in BLOOD_COMPATIBILITY.items() if requested_blood_type in recipients]
+
+async def set_donor_presence(donor_id: str, online: bool):
+    """Flip a donor's online flag and feed the transition into the stats counters"""
+    before = await db.donors.find_one_and_update(
+        {"id": donor_id, "is_online": {"$ne": online}},
+        {"$set": {"is_online": online, "last_seen": datetime.utcnow()}},
+        projection={"_id": 0, "blood_type": 1, "is_available": 1, "is_online": 1}
+    )
+    if before:
+        document_cache.invalidate("donors", donor_id)
+        await stats_materializer.donor_changed(before, {**before, "is_online": online})
+
+async def verified_donor_id(donor_id: Optional[str], token: Optional[str]) -> Optional[str]:
+    """donor_id, if token is an access token of the donor user who owns it; otherwise None"""
+    token_data = verify_token(token) if donor_id and token else None
+    if token_data is None or token_data.role != UserRole.DONOR or not token_data.user_id:
+        return None
+    user = await db.users.find_one({"id": token_data.user_id}, {"_id": 0, "donor_id": 1})
+    return donor_id if user and user.get("donor_id") == donor_id else None
+
 # WebSocket endpoint with basic security
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    from models import sanitize_input
+    # Donors may identify themselves up front (/ws?donor_id=...&token=...); a donor_id without its
+    # owner's token is registered for alerts but gets no admission priority
+    registered_donor = sanitize_input(websocket.query_params.get("donor_id", "")) or None
+    verified = await verified_donor_id(registered_donor, websocket.query_params.get("token"))
+    if not await manager.connect(websocket, verified):
+        return
     try:
+        if registered_donor:
+            if websocket not in manager.connection_donors:
+                manager.register_donor(websocket, registered_donor)
+            await set_donor_presence(registered_donor, True)
+        
         # Send welcome message with disclaimer
         welcome_msg = {
             "type": "welcome",
             "message": "Connected to BloodConnect Emergency Alerts v2.0 - FOR DEMONSTRATION PURPOSES ONLY",
             "disclaimer": "This system is for demonstration only. Not for actual medical emergencies.",
+            "channels": list(CHANNELS),
+            "last_event_id": alert_bus.last_event_id,
             "timestamp": datetime.utcnow().isoformat()
         }
-        await manager.send_personal_message(json.dumps(welcome_msg), websocket)
+        if manager.protocols.get(websocket) == ws_protocol.MSGPACK_PROTOCOL:
+            welcome_msg["schemas"] = ws_protocol.schema_table()
+        await manager.send_personal_message(welcome_msg, websocket)
         
         while True:
-            # Keep connection alive and handle incoming messages
+            # Block until the client sends something or disconnects; no per-socket polling timer
             try:
-                data = await asyncio.wait_for(websocket.receive_text(), timeout=1.0)
-                message = json.loads(data)
+                data = await websocket.receive()
+                if data["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(data.get("code", 1000))
+                message = ws_protocol.decode(data)
                 
                 # Handle donor registration for targeted alerts
                 if message.get("type") == "register_donor":
-                    from models import sanitize_input
                     donor_id = sanitize_input(message.get("donor_id", ""))
                     if donor_id and len(donor_id) > 0:
-                        manager.donor_connections[donor_id] = websocket
+                        verified = await verified_donor_id(donor_id, message.get("token"))
+                        manager.register_donor(websocket, donor_id, verified=verified is not None)
+                        if registered_donor and registered_donor != donor_id and registered_donor not in manager.donor_connections:
+                            await set_donor_presence(registered_donor, False)
+                        registered_donor = donor_id
                         # Update donor online status
-                        await db.donors.update_one(
-                            {"id": donor_id},
-                            {"$set": {"is_online": True}}
-                        )
+                        await set_donor_presence(donor_id, True)
                         response = {
                             "type": "registration_success",
                             "message": f"Registered for emergency alerts - DEMO MODE v2.0",
                             "donor_id": donor_id
                         }
-                        await manager.send_personal_message(json.dumps(response), websocket)
+                        await manager.send_personal_message(response, websocket)
+                
+                # Handle channel filters and resume after reconnect
+                elif message.get("type") == "subscribe":
+                    try:
+                        channels = parse_channels(",".join(message.get("channels") or []))
+                    except ValueError as e:
+                        await manager.send_personal_message({"type": "error", "message": str(e)}, websocket)
+                        continue
+                    await manager.subscribe(websocket, channels, message.get("last_event_id"))
+                    await manager.send_personal_message(
+                        {"type": "subscribed", "channels": sorted(channels)},
+                        websocket
+                    )
                         
-            except asyncio.TimeoutError:
-                # Keep connection alive
-                continue
-            except json.JSONDecodeError:
-                # Handle non-JSON messages
+            except WebSocketDisconnect:
+                raise
+            except ValueError:
+                # Handle undecodable messages (bad JSON or MessagePack)
                 await manager.send_personal_message(
-                    json.dumps({"type": "error", "message": "Invalid message format"}), 
+                    {"type": "error", "message": "Invalid message format"}, 
                     websocket
                 )
             except Exception as e:
@@ -301,23 +633,22 @@ async def websocket_endpoint(websocket: WebSocket):
                 break
                 
     except WebSocketDisconnect:
-        # Find and remove donor from online status
-        disconnected_donor = None
-        for donor_id, conn in manager.donor_connections.items():
-            if conn == websocket:
-                disconnected_donor = donor_id
-                break
-                
-        if disconnected_donor:
-            await db.donors.update_one(
-                {"id": disconnected_donor},
-                {"$set": {"is_online": False}}
-            )
-            
-        manager.disconnect(websocket, disconnected_donor)
+        pass
+    finally:
+        manager.disconnect(websocket)
+        # Clear online status unless the donor has already reconnected on another socket
+        if registered_donor and registered_donor not in manager.donor_connections:
+            await set_donor_presence(registered_donor, False)
 
 # Routes with rate limiting and authentication
 
+def cursor_headers(next_cursor: Optional[str]) -> Optional[dict]:
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+
+def projected_response(rows: list, next_cursor: Optional[str] = None) -> JSONResponse:
+    """Rows limited to selected fields skip response_model, which expects every field"""
+    return fast_json.json_response(rows, headers=cursor_headers(next_cursor))
+
 # Authentication routes
 @api_router.post("/auth/register", response_model=Token)
 @limiter.limit("3/minute")
@@ -331,11 +662,6 @@ async def register_user(request: Request, user_data: UserCreate):
                 detail="Password must be at least 8 characters with uppercase, lowercase, and number"
             )
         
-        # Check if user already exists
-        existing_user = await db.users.find_one({"email": user_data.email})
-        if existing_user:
-            raise HTTPException(status_code=400, detail="User with this email already exists")
-        
         # Create user account
         hashed_password = get_password_hash(user_data.password)
         user = UserDB(
@@ -346,7 +672,11 @@ async def register_user(request: Request, user_data: UserCreate):
             hospital_id=user_data.hospital_id
         )
         
-        await db.users.insert_one(user.dict())
+        # The unique email index rejects duplicates, including concurrent ones
+        try:
+            await db.users.insert_one(user.dict())
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="User with this email already exists")
         
         # Create tokens
         token_data = {"sub": user.email, "role": user.role.value, "user_id": user.id}
@@ -371,6 +701,8 @@ async def register_user(request: Request, user_data: UserCreate):
             user=response_user
         )
         
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -447,18 +779,12 @@ async def get_current_user_info(request: Request, current_user: User = Depends(g
 async def register_hospital(request: Request, hospital_data: HospitalCreate, current_user: User = Depends(require_roles([UserRole.HOSPITAL, UserRole.ADMIN]))):
     """Register a new hospital"""
     try:
-        # Check if hospital already exists
-        existing_hospital = await db.hospitals.find_one({
-            "$or": [
-                {"email": hospital_data.email},
-                {"license_number": hospital_data.license_number}
-            ]
-        })
-        if existing_hospital:
-            raise HTTPException(status_code=400, detail="Hospital with this email or license number already exists")
-        
         hospital = Hospital(**hospital_data.dict())
-        await db.hospitals.insert_one(hospital.dict())
+        # Unique email and license_number indexes reject duplicates, including concurrent ones
+        try:
+            await db.hospitals.insert_one(hospital.dict())
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Hospital with this email or license number already exists")
         
         # Link to user account if hospital role
         if current_user.role == UserRole.HOSPITAL:
@@ -469,6 +795,8 @@ async def register_hospital(request: Request, hospital_data: HospitalCreate, cur
         
         return hospital
         
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -476,9 +804,10 @@ async def register_hospital(request: Request, hospital_data: HospitalCreate, cur
 
 @api_router.get("/hospitals", response_model=List[Hospital])
 @limiter.limit("20/minute")
-async def get_hospitals(request: Request, status: Optional[HospitalStatus] = None, current_user: User = Depends(get_current_user_optional)):
-    """Get list of hospitals"""
+async def get_hospitals(request: Request, status: Optional[HospitalStatus] = None, cursor: Optional[str] = None, limit: Optional[int] = None, fields: Optional[str] = None, view: ListView = ListView.FULL, current_user: User = Depends(get_current_user_optional)):
+    """Get one page of hospitals; the next page's cursor is in the X-Next-Cursor header"""
     try:
+        selection = FieldSelection(Hospital, HospitalSummary, fields, view)
         query = {}
         if status:
             query["status"] = status.value
@@ -487,9 +816,15 @@ async def get_hospitals(request: Request, status: Optional[HospitalStatus] = Non
             if not current_user or current_user.role != UserRole.ADMIN:
                 query["status"] = HospitalStatus.VERIFIED.value
         
-        hospitals = await db.hospitals.find(query).to_list(1000)
-        return [Hospital(**hospital) for hospital in hospitals]
+        hospitals, next_cursor = await paginate(
+            db.hospitals, query, HOSPITAL_LIST_SORT, cursor, limit, selection.projection(HOSPITAL_LIST_SORT)
+        )
+        if not selection.full:
+            return projected_response(selection.rows(hospitals), next_cursor)
+        return trusted.json_response(Hospital, hospitals, cursor_headers(next_cursor))
         
+    except (InvalidCursor, UnknownField) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
@@ -510,6 +845,7 @@ async def verify_hospital(request: Request, hospital_id: str, status: HospitalSt
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Hospital not found")
+        document_cache.invalidate("hospitals", hospital_id)
         
         return {"message": f"Hospital status updated to {status.value}"}
         
@@ -518,6 +854,26 @@ async def verify_hospital(request: Request, hospital_id: str, status: HospitalSt
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@api_router.get("/hospitals/{hospital_id}/stats")
+@limiter.limit("30/minute")
+async def get_hospital_stats(request: Request, hospital_id: str, current_user: User = Depends(require_roles([UserRole.HOSPITAL, UserRole.ADMIN]))):
+    """Request volume, fulfillment rate and fulfillment time percentiles (own hospital or admin)"""
+    try:
+        hospital_id = sanitize_input(hospital_id)
+        if current_user.role == UserRole.HOSPITAL and current_user.hospital_id != hospital_id:
+            raise HTTPException(status_code=403, detail="Access denied. You can only view your own hospital's stats.")
+        
+        hospital = await db.hospitals.find_one({"id": hospital_id}, hospital_stats.STATS_PROJECTION)
+        if not hospital:
+            raise HTTPException(status_code=404, detail="Hospital not found")
+        
+        return hospital_stats.summarize(hospital)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @api_router.get("/")
 @limiter.limit("10/minute")
 async def root(request: Request):
@@ -533,23 +889,26 @@ async def root(request: Request):
 @limiter.limit("5/minute")
 async def register_donor(request: Request, donor_data: DonorCreate, current_user: User = Depends(get_current_user_optional)):
     try:
-        # Check if donor already exists
-        existing_donor = await db.donors.find_one({"email": donor_data.email})
-        if existing_donor:
-            raise HTTPException(status_code=400, detail="Donor with this email already exists")
-        
         donor = Donor(**donor_data.dict())
+        linked_user = current_user and current_user.role in [UserRole.DONOR, UserRole.ADMIN]
+        if linked_user:
+            donor.user_id = current_user.id
+        
+        # The unique email index rejects duplicates, including concurrent ones
+        try:
+            await db.donors.insert_one(donor.dict())
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Donor with this email already exists")
         
         # Link to user account if authenticated
-        if current_user and current_user.role in [UserRole.DONOR, UserRole.ADMIN]:
-            donor.user_id = current_user.id
-            # Update user account to link to donor
+        if linked_user:
             await db.users.update_one(
                 {"id": current_user.id},
                 {"$set": {"donor_id": donor.id}}
             )
         
-        await db.donors.insert_one(donor.dict())
+        await stats_materializer.donor_added(donor.dict())
+        await rollups.record(DONOR_REGISTRATIONS, blood_type=donor.blood_type, state=donor.state)
         
         # Broadcast new donor registration (temporarily disabled for testing)
         try:
@@ -560,36 +919,94 @@ async def register_donor(request: Request, donor_data: DonorCreate, current_user
                 "location": f"{donor.city}, {donor.state}",
                 "timestamp": datetime.utcnow().isoformat()
             }
-            await manager.broadcast_alert(json.dumps(alert))
+            await manager.broadcast_alert(alert, DONORS_CHANNEL)
         except Exception as e:
             print(f"WebSocket broadcast error (non-critical): {e}")
         
         return donor
         
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
+async def record_imported_donors(donors: List[dict]):
+    """Stats and rollups for one imported chunk, grouped instead of per donor"""
+    await stats_materializer.donors_added(donors)
+    groups = {}
+    for donor in donors:
+        key = (donor["blood_type"], donor["state"])
+        groups[key] = groups.get(key, 0) + 1
+    await asyncio.gather(*[
+        rollups.record(DONOR_REGISTRATIONS, count=count, blood_type=blood_type, state=state)
+        for (blood_type, state), count in groups.items()
+    ])
+
+@api_router.post("/donors/import")
+@limiter.limit("5/minute")
+async def import_donors(
+    request: Request,
+    format: Optional[str] = None,
+    current_user: User = Depends(require_roles([UserRole.HOSPITAL, UserRole.ADMIN]))
+):
+    """Register a blood drive's donors from a streamed CSV or NDJSON upload (hospital or admin only)"""
+    try:
+        fmt = detect_format(format, request.headers.get("content-type", ""))
+        report = await donor_importer.run(request.stream(), fmt, record_imported_donors)
+    except InvalidUpload as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Donor import failed: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+    
+    # One summary broadcast instead of one per donor
+    if report.imported:
+        try:
+            await manager.broadcast_alert({
+                "type": "donors_imported",
+                "message": f"🩸 {report.imported} new donors registered at a blood drive",
+                "count": report.imported,
+                "timestamp": datetime.utcnow().isoformat()
+            }, DONORS_CHANNEL)
+        except Exception as e:
+            print(f"WebSocket broadcast error (non-critical): {e}")
+    return report.dict()
+
 @api_router.get("/donors", response_model=List[Donor])
 @limiter.limit("20/minute")
-async def get_donors(request: Request, current_user: User = Depends(get_current_user_optional)):
+@coalesce(ignore=["current_user"])
+async def get_donors(request: Request, cursor: Optional[str] = None, limit: Optional[int] = None, fields: Optional[str] = None, view: ListView = ListView.FULL, current_user: User = Depends(get_current_user_optional)):
+    """One page of available donors; the next page's cursor is in the X-Next-Cursor header"""
     try:
-        donors = await db.donors.find({"is_available": True}).to_list(1000)
-        return [Donor(**donor) for donor in donors]
+        selection = FieldSelection(Donor, DonorSummary, fields, view)
+        donors, next_cursor = await paginate(
+            db.donors, {"is_available": True}, DONOR_LIST_SORT, cursor, limit, selection.projection(DONOR_LIST_SORT)
+        )
+        if not selection.full:
+            return projected_response(selection.rows(donors), next_cursor)
+        return trusted.json_response(Donor, donors, cursor_headers(next_cursor))
+    except (InvalidCursor, UnknownField) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @api_router.get("/donors/{donor_id}", response_model=Donor)
 @limiter.limit("30/minute")
-async def get_donor(request: Request, donor_id: str, current_user: User = Depends(get_current_user_optional)):
+async def get_donor(request: Request, donor_id: str, fields: Optional[str] = None, current_user: User = Depends(get_current_user_optional)):
     try:
         from models import sanitize_input
         donor_id = sanitize_input(donor_id)
-        donor = await db.donors.find_one({"id": donor_id})
+        selection = FieldSelection(Donor, fields=fields)
+        donor = await document_cache.get("donors", donor_id)
         if not donor:
             raise HTTPException(status_code=404, detail="Donor not found")
-        return Donor(**donor)
+        if not selection.full:
+            return projected_response(selection.rows([donor])[0])
+        return trusted.json_object_response(Donor, donor)
+    except UnknownField as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         if isinstance(e, HTTPException):
             raise
@@ -610,13 +1027,22 @@ async def update_donor(request: Request, donor_id: str, donor_data: DonorCreate,
         updated_data = donor_data.dict()
         updated_data["updated_at"] = datetime.utcnow()
         
-        result = await db.donors.update_one(
-            {"id": donor_id},
-            {"$set": updated_data}
-        )
+        # The unique email index rejects taking another donor's email
+        try:
+            before = await db.donors.find_one_and_update(
+                {"id": donor_id},
+                {"$set": updated_data},
+                projection={"_id": 0, "blood_type": 1, "is_available": 1, "is_online": 1},
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Donor with this email already exists")
         
-        if result.matched_count == 0:
+        if before is None:
             raise HTTPException(status_code=404, detail="Donor not found")
+        document_cache.invalidate("donors", donor_id)
+        
+        await stats_materializer.donor_changed(before, {**before, "blood_type": updated_data["blood_type"]})
         
         return {"message": "Donor information updated successfully"}
         
@@ -626,39 +1052,60 @@ async def update_donor(request: Request, donor_id: str, donor_data: DonorCreate,
         raise HTTPException(status_code=500, detail="Internal server error")
 
 # Blood Request routes (enhanced with hospital integration)
+# Lifetime and priority boost of a new request, by urgency
+URGENCY_EXPIRY = {
+    BloodRequestUrgency.CRITICAL: (timedelta(hours=6), 5.0),
+    BloodRequestUrgency.URGENT: (timedelta(hours=24), 2.0),
+    BloodRequestUrgency.NORMAL: (timedelta(days=7), 0.0),
+}
+ALERTING_URGENCIES = [BloodRequestUrgency.CRITICAL, BloodRequestUrgency.URGENT]
+
+async def requesting_hospital(current_user: Optional[User]) -> Optional[dict]:
+    """The caller's hospital, if it is verified (its requests are linked and prioritized)"""
+    if not current_user or current_user.role != UserRole.HOSPITAL or not current_user.hospital_id:
+        return None
+    hospital = await document_cache.get("hospitals", current_user.hospital_id)
+    if hospital and hospital.get("status") == HospitalStatus.VERIFIED.value:
+        return hospital
+    return None
+
+def prepare_blood_request(request_data: BloodRequestCreate, current_user: Optional[User], hospital: Optional[dict], now: datetime) -> BloodRequest:
+    """Owner, hospital link, priority and expiry for a new request"""
+    blood_request = BloodRequest(**request_data.dict())
+    if current_user:
+        blood_request.user_id = current_user.id
+    if hospital:
+        blood_request.hospital_id = hospital["id"]
+        blood_request.hospital_name = hospital.get("name", blood_request.hospital_name)
+        # Increase priority for verified hospitals
+        blood_request.priority_score += 2.0
+    lifetime, boost = URGENCY_EXPIRY[blood_request.urgency]
+    blood_request.expires_at = now + lifetime
+    blood_request.priority_score += boost
+    return blood_request
+
 @api_router.post("/blood-requests", response_model=BloodRequest)
 @limiter.limit("10/minute")
 async def create_blood_request(request: Request, request_data: BloodRequestCreate, current_user: User = Depends(get_current_user_optional)):
     try:
-        blood_request = BloodRequest(**request_data.dict())
-        
-        # Enhanced processing for hospital users
-        if current_user:
-            blood_request.user_id = current_user.id
-            
-            # If user is hospital, verify and link to hospital
-            if current_user.role == UserRole.HOSPITAL and current_user.hospital_id:
-                hospital = await db.hospitals.find_one({"id": current_user.hospital_id})
-                if hospital and hospital.get("status") == HospitalStatus.VERIFIED.value:
-                    blood_request.hospital_id = current_user.hospital_id
-                    blood_request.hospital_name = hospital.get("name", blood_request.hospital_name)
-                    # Increase priority for verified hospitals
-                    blood_request.priority_score += 2.0
-        
-        # Set expiration based on urgency
-        if blood_request.urgency == BloodRequestUrgency.CRITICAL:
-            blood_request.expires_at = datetime.utcnow() + timedelta(hours=6)
-            blood_request.priority_score += 5.0
-        elif blood_request.urgency == BloodRequestUrgency.URGENT:
-            blood_request.expires_at = datetime.utcnow() + timedelta(hours=24)
-            blood_request.priority_score += 2.0
-        else:
-            blood_request.expires_at = datetime.utcnow() + timedelta(days=7)
+        hospital = await requesting_hospital(current_user)
+        blood_request = prepare_blood_request(request_data, current_user, hospital, datetime.utcnow())
         
         await db.blood_requests.insert_one(blood_request.dict())
+        expiry_scheduler.schedule(blood_request.id, blood_request.expires_at)
+        await stats_materializer.request_added(blood_request.dict())
+        if blood_request.hospital_id:
+            await hospital_stats.record_request(db, blood_request.hospital_id)
+            document_cache.invalidate("hospitals", blood_request.hospital_id)
+        dimensions = {
+            "blood_type": blood_request.blood_type_needed,
+            "urgency": blood_request.urgency,
+            "state": blood_request.state
+        }
+        await rollups.record(REQUESTS_CREATED, **dimensions)
         
         # Send emergency alerts for Critical and Urgent requests
-        if blood_request.urgency in [BloodRequestUrgency.CRITICAL, BloodRequestUrgency.URGENT]:
+        if blood_request.urgency in ALERTING_URGENCIES:
             asyncio.create_task(manager.notify_compatible_donors(blood_request.dict()))
             
             # Save alert record
@@ -669,6 +1116,7 @@ async def create_blood_request(request: Request, request_data: BloodRequestCreat
                 hospitals_notified=1 if current_user and current_user.role == UserRole.HOSPITAL else 0
             )
             await db.emergency_alerts.insert_one(alert.dict())
+            await rollups.record(ALERTS_SENT, **dimensions)
         
         return blood_request
         
@@ -677,24 +1125,90 @@ async def create_blood_request(request: Request, request_data: BloodRequestCreat
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@api_router.post("/blood-requests/batch", response_model=List[BloodRequest])
+@limiter.limit("5/minute")
+async def create_blood_requests_batch(
+    request: Request,
+    batch: BloodRequestBatch,
+    current_user: User = Depends(require_roles([UserRole.HOSPITAL, UserRole.ADMIN]))
+):
+    """Submit many requests at once with one insert and one merged donor alerting pass (hospital or admin only)"""
+    try:
+        hospital = await requesting_hospital(current_user)
+        now = datetime.utcnow()
+        blood_requests = [prepare_blood_request(item, current_user, hospital, now) for item in batch.requests]
+        documents = [blood_request.dict() for blood_request in blood_requests]
+        await db.blood_requests.insert_many(documents)
+        
+        for document in documents:
+            expiry_scheduler.schedule(document["id"], document["expires_at"])
+        await stats_materializer.requests_added(documents)
+        if hospital:
+            await hospital_stats.record_request(db, hospital["id"], count=len(documents))
+            document_cache.invalidate("hospitals", hospital["id"])
+        
+        alerting = [blood_request for blood_request in blood_requests if blood_request.urgency in ALERTING_URGENCIES]
+        created, alerted = {}, {}
+        for blood_request in blood_requests:
+            key = (blood_request.blood_type_needed, blood_request.urgency, blood_request.state)
+            created[key] = created.get(key, 0) + 1
+            if blood_request.urgency in ALERTING_URGENCIES:
+                alerted[key] = alerted.get(key, 0) + 1
+        await asyncio.gather(
+            *[rollups.record(REQUESTS_CREATED, count=count, blood_type=blood_type, urgency=urgency, state=state)
+              for (blood_type, urgency, state), count in created.items()],
+            *[rollups.record(ALERTS_SENT, count=count, blood_type=blood_type, urgency=urgency, state=state)
+              for (blood_type, urgency, state), count in alerted.items()]
+        )
+        
+        if alerting:
+            # One matching pass for the whole batch: each donor gets at most one consolidated alert
+            asyncio.create_task(manager.notify_compatible_donors_batch([blood_request.dict() for blood_request in alerting]))
+            await db.emergency_alerts.insert_many([
+                EmergencyAlert(
+                    blood_request_id=blood_request.id,
+                    alert_type=blood_request.urgency.value.lower(),
+                    donors_notified=len(manager.active_connections),
+                    hospitals_notified=1 if current_user.role == UserRole.HOSPITAL else 0
+                ).dict()
+                for blood_request in alerting
+            ])
+        
+        return blood_requests
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @api_router.get("/blood-requests", response_model=List[BloodRequest])
 @limiter.limit("20/minute")
-async def get_blood_requests(request: Request, status: Optional[BloodRequestStatus] = None, urgency: Optional[BloodRequestUrgency] = None, current_user: User = Depends(get_current_user_optional)):
+@coalesce()
+async def get_blood_requests(request: Request, status: Optional[BloodRequestStatus] = None, urgency: Optional[BloodRequestUrgency] = None, mine: bool = False, cursor: Optional[str] = None, limit: Optional[int] = None, fields: Optional[str] = None, view: ListView = ListView.FULL, current_user: User = Depends(get_current_user_optional)):
+    """One page of blood requests by priority; the next page's cursor is in the X-Next-Cursor header.
+
+    mine=true lists only the caller's own requests, in every status unless one is given.
+    """
     try:
+        if mine and not current_user:
+            raise HTTPException(status_code=401, detail="Authentication required to list your own requests")
+        selection = FieldSelection(BloodRequest, BloodRequestSummary, fields, view)
         query = {}
         
         # Filter by status if provided
         if status:
             query["status"] = status.value
-        else:
+        elif not mine:
             query["status"] = BloodRequestStatus.ACTIVE.value
         
         # Filter by urgency if provided
         if urgency:
             query["urgency"] = urgency.value
         
+        if mine:
+            query["user_id"] = current_user.id
         # Hospital users can see their own requests plus all active ones
-        if current_user and current_user.role == UserRole.HOSPITAL:
+        elif current_user and current_user.role == UserRole.HOSPITAL:
             query = {
                 "$or": [
                     query,
@@ -702,33 +1216,78 @@ async def get_blood_requests(request: Request, status: Optional[BloodRequestStat
                 ]
             }
         
-        requests = await db.blood_requests.find(query).sort("priority_score", -1).sort("created_at", -1).to_list(1000)
-        return [BloodRequest(**req) for req in requests]
+        if (status and status.value in HISTORICAL_STATUSES) or (mine and not status):
+            # Older terminal requests live in the archive; page through both as one list
+            requests, next_cursor = await paginate_union(
+                [db.blood_requests, db[archive_name("blood_requests")]],
+                query, REQUEST_LIST_SORT, cursor, limit, selection.projection(REQUEST_LIST_SORT)
+            )
+        else:
+            requests, next_cursor = await paginate(
+                db.blood_requests, query, REQUEST_LIST_SORT, cursor, limit, selection.projection(REQUEST_LIST_SORT)
+            )
+        if not selection.full:
+            return projected_response(selection.rows(requests), next_cursor)
+        return trusted.json_response(BloodRequest, requests, cursor_headers(next_cursor))
+    except (InvalidCursor, UnknownField) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @api_router.get("/blood-requests/{request_id}", response_model=BloodRequest)
 @limiter.limit("30/minute")
-async def get_blood_request(request: Request, request_id: str, current_user: User = Depends(get_current_user_optional)):
+async def get_blood_request(request: Request, request_id: str, fields: Optional[str] = None, current_user: User = Depends(get_current_user_optional)):
     try:
         from models import sanitize_input
         request_id = sanitize_input(request_id)
-        blood_req = await db.blood_requests.find_one({"id": request_id})
+        selection = FieldSelection(BloodRequest, fields=fields)
+        collection = "blood_requests"
+        blood_req = await document_cache.get(collection, request_id)
+        if not blood_req:
+            collection = archive_name("blood_requests")
+            blood_req = await db[collection].find_one({"id": request_id}, selection.projection())
         if not blood_req:
             raise HTTPException(status_code=404, detail="Blood request not found")
         
-        # Increment views count
-        await db.blood_requests.update_one(
-            {"id": request_id},
-            {"$inc": {"views_count": 1}}
-        )
+        # Increment views count (buffered, written in periodic bulk flushes)
+        counter_buffer.increment(collection, request_id, "views_count")
         
-        return BloodRequest(**blood_req)
+        if not selection.full:
+            return projected_response(selection.rows([blood_req])[0])
+        return trusted.json_object_response(BloodRequest, blood_req)
+    except UnknownField as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         if isinstance(e, HTTPException):
             raise
         raise HTTPException(status_code=500, detail="Internal server error")
 
+async def handle_expired_requests(expired: List[dict]):
+    """Stats, rollups and one dashboard event for each batch the expiry scheduler flips"""
+    document_cache.invalidate("blood_requests", *[blood_request["id"] for blood_request in expired])
+    groups = {}
+    for blood_request in expired:
+        await stats_materializer.request_status_changed(
+            blood_request["blood_type_needed"], BloodRequestStatus.ACTIVE, BloodRequestStatus.EXPIRED
+        )
+        key = (blood_request["blood_type_needed"], blood_request.get("urgency"), blood_request.get("state"))
+        groups[key] = groups.get(key, 0) + 1
+    await asyncio.gather(*[
+        rollups.record(status_metric(BloodRequestStatus.EXPIRED), count=count,
+                       blood_type=blood_type, urgency=urgency, state=state)
+        for (blood_type, urgency, state), count in groups.items()
+    ])
+    await manager.broadcast_alert({
+        "type": "requests_expired",
+        "request_ids": [blood_request["id"] for blood_request in expired],
+        "count": len(expired),
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+expiry_scheduler.listeners.append(handle_expired_requests)
+
 @api_router.put("/blood-requests/{request_id}/status")
 @limiter.limit("10/minute")
 async def update_request_status(request: Request, request_id: str, status: BloodRequestStatus, current_user: User = Depends(require_roles([UserRole.HOSPITAL, UserRole.ADMIN]))):
@@ -737,22 +1296,49 @@ async def update_request_status(request: Request, request_id: str, status: Blood
         from models import sanitize_input
         request_id = sanitize_input(request_id)
         
-        # Check if user owns this request (for hospitals) or is admin
+        # Ownership and the legal source states are part of the filter, so the
+        # check and the update are one atomic round trip
+        conditions = {"id": request_id, "status": {"$in": statuses_leading_to(status)}}
         if current_user.role == UserRole.HOSPITAL:
-            blood_req = await db.blood_requests.find_one({"id": request_id})
-            if not blood_req or blood_req.get("user_id") != current_user.id:
-                raise HTTPException(status_code=403, detail="Access denied. You can only update your own requests.")
-        
-        result = await db.blood_requests.update_one(
-            {"id": request_id},
+            conditions["user_id"] = current_user.id
+        before = await db.blood_requests.find_one_and_update(
+            conditions,
             {"$set": {
                 "status": status.value,
                 "updated_at": datetime.utcnow()
-            }}
+            }},
+            projection={
+                "_id": 0, "status": 1, "blood_type_needed": 1, "urgency": 1, "state": 1,
+                "hospital_id": 1, "created_at": 1
+            },
+            return_document=ReturnDocument.BEFORE
         )
         
-        if result.matched_count == 0:
-            raise HTTPException(status_code=404, detail="Blood request not found")
+        if before is None:
+            # Nothing matched; one more read (failures only) to say why
+            existing = await db.blood_requests.find_one({"id": request_id}, {"_id": 0, "status": 1, "user_id": 1})
+            if existing is None:
+                existing = await db[archive_name("blood_requests")].find_one({"id": request_id}, {"_id": 0, "status": 1, "user_id": 1})
+            if existing is None:
+                raise HTTPException(status_code=404, detail="Blood request not found")
+            if current_user.role == UserRole.HOSPITAL and existing.get("user_id") != current_user.id:
+                raise HTTPException(status_code=403, detail="Access denied. You can only update your own requests.")
+            raise HTTPException(
+                status_code=409,
+                detail=f"Cannot change request status from {getattr(existing['status'], 'value', existing['status'])} to {status.value}"
+            )
+        document_cache.invalidate("blood_requests", request_id)
+        
+        await stats_materializer.request_status_changed(before["blood_type_needed"], before["status"], status)
+        await rollups.record(
+            status_metric(status),
+            blood_type=before["blood_type_needed"],
+            urgency=before.get("urgency"),
+            state=before.get("state")
+        )
+        if status == BloodRequestStatus.FULFILLED and before.get("hospital_id"):
+            await hospital_stats.record_fulfillment(db, before["hospital_id"], before["created_at"])
+            document_cache.invalidate("hospitals", before["hospital_id"])
         
         return {"message": f"Request status updated to {status.value}"}
         
@@ -768,18 +1354,21 @@ async def match_donors(request: Request, request_id: str):
     try:
         request_id = sanitize_input(request_id)
         # Get the blood request
-        blood_req = await db.blood_requests.find_one({"id": request_id})
+        blood_req = await document_cache.get("blood_requests", request_id)
         if not blood_req:
             raise HTTPException(status_code=404, detail="Blood request not found")
         
-        blood_request = BloodRequest(**blood_req)
+        blood_request = trusted.construct(BloodRequest, blood_req)
         
         # Find compatible donors
-        all_donors = await db.donors.find({"is_available": True}).to_list(1000)
+        all_donors = await db.donors.find({
+            "is_available": True,
+            "blood_type": {"$in": compatible_donor_types(blood_request.blood_type_needed)}
+        }).to_list(1000)
         compatible_donors = []
         
         for donor_data in all_donors:
-            donor = Donor(**donor_data)
+            donor = trusted.construct(Donor, donor_data)
             if calculate_compatibility(donor.blood_type, blood_request.blood_type_needed):
                 # Prioritize donors in same city/state
                 location_match = 0
@@ -789,7 +1378,7 @@ async def match_donors(request: Request, request_id: str):
                     location_match = 1
                 
                 compatible_donors.append({
-                    "donor": donor.dict(),
+                    "donor": trusted.dump(donor),
                     "location_match": location_match,
                     "compatibility": "Direct" if donor.blood_type == blood_request.blood_type_needed else "Compatible",
                     "is_online": donor.is_online
@@ -798,12 +1387,12 @@ async def match_donors(request: Request, request_id: str):
         # Sort by online status, then location match and blood type compatibility
         compatible_donors.sort(key=lambda x: (x["is_online"], x["location_match"], x["compatibility"] == "Direct"), reverse=True)
         
-        return {
-            "request": blood_request.dict(),
+        return fast_json.json_response({
+            "request": trusted.dump(blood_request),
             "compatible_donors": compatible_donors,
             "total_matches": len(compatible_donors),
             "online_donors": len([d for d in compatible_donors if d["is_online"]])
-        }
+        })
         
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -816,7 +1405,7 @@ async def match_donors(request: Request, request_id: str):
 async def get_recent_alerts(request: Request):
     try:
         alerts = await db.emergency_alerts.find().sort("created_at", -1).limit(50).to_list(50)
-        return [EmergencyAlert(**alert) for alert in alerts]
+        return trusted.json_response(EmergencyAlert, alerts)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
@@ -825,19 +1414,22 @@ async def get_recent_alerts(request: Request):
 async def send_reminder_alert(request: Request, request_id: str):
     try:
         request_id = sanitize_input(request_id)
-        blood_req = await db.blood_requests.find_one({"id": request_id})
+        blood_req = await document_cache.get("blood_requests", request_id)
         if not blood_req:
             raise HTTPException(status_code=404, detail="Blood request not found")
         
-        blood_request = BloodRequest(**blood_req)
+        blood_request = trusted.construct(BloodRequest, blood_req)
         
         # Send reminder alert
-        await manager.notify_compatible_donors(blood_request.dict())
-        
-        # Update alerts sent count
-        await db.blood_requests.update_one(
-            {"id": request_id},
-            {"$inc": {"alerts_sent": 1}}
+        await manager.notify_compatible_donors(trusted.dump(blood_request))
+        
+        # Update alerts sent count (buffered, written in periodic bulk flushes)
+        counter_buffer.increment("blood_requests", request_id, "alerts_sent")
+        await rollups.record(
+            ALERTS_SENT,
+            blood_type=blood_request.blood_type_needed,
+            urgency=blood_request.urgency,
+            state=blood_request.state
         )
         
         return {"message": "Reminder alert sent successfully - DEMO MODE"}
@@ -850,31 +1442,11 @@ async def send_reminder_alert(request: Request, request_id: str):
 # Statistics with real-time data
 @api_router.get("/stats")
 @limiter.limit("30/minute")
+@coalesce()
 async def get_stats(request: Request):
     try:
-        total_donors = await db.donors.count_documents({"is_available": True})
-        online_donors = await db.donors.count_documents({"is_available": True, "is_online": True})
-        total_requests = await db.blood_requests.count_documents({"status": "Active"})
-        total_alerts_sent = len(manager.active_connections)
-        
-        # Count by blood type
-        blood_type_stats = {}
-        for blood_type in ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]:
-            donor_count = await db.donors.count_documents({"blood_type": blood_type, "is_available": True})
-            online_count = await db.donors.count_documents({"blood_type": blood_type, "is_available": True, "is_online": True})
-            request_count = await db.blood_requests.count_documents({"blood_type_needed": blood_type, "status": "Active"})
-            blood_type_stats[blood_type] = {
-                "donors": donor_count,
-                "online_donors": online_count,
-                "requests": request_count
-            }
-        
         return {
-            "total_donors": total_donors,
-            "online_donors": online_donors,
-            "total_active_requests": total_requests,
-            "active_alert_connections": total_alerts_sent,
-            "blood_type_breakdown": blood_type_stats,
+            **await current_stats(),
             "system_status": "demo_mode",
             "disclaimer": "Demo system - not for actual medical use"
         }
@@ -882,6 +1454,160 @@ async def get_stats(request: Request):
     except Exception as e:
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Historical analytics served from pre-aggregated rollups
+def as_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+@api_router.get("/analytics/timeseries")
+@limiter.limit("30/minute")
+async def get_timeseries(
+    request: Request,
+    metric: str,
+    start: datetime,
+    end: Optional[datetime] = None,
+    granularity: Optional[str] = None,
+    blood_type: Optional[str] = None,
+    urgency: Optional[BloodRequestUrgency] = None,
+    state: Optional[str] = None,
+    group_by: Optional[str] = None,
+    current_user: User = Depends(require_roles([UserRole.HOSPITAL, UserRole.ADMIN]))
+):
+    """Event counts per minute/hour/day bucket over any range (hospital or admin only)"""
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"Unknown metric. Choose one of: {', '.join(METRICS)}")
+    if granularity and granularity not in GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown granularity. Choose one of: {', '.join(GRANULARITIES)}")
+    if group_by and group_by not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"Cannot group by {group_by}. Choose one of: {', '.join(DIMENSIONS)}")
+    start = as_utc(start)
+    end = as_utc(end) if end else datetime.utcnow()
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    try:
+        return await rollups.timeseries(
+            metric,
+            start,
+            end,
+            granularity=granularity,
+            filters={"blood_type": blood_type, "urgency": urgency.value if urgency else None, "state": state},
+            group_by=group_by
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+# Streaming exports
+@api_router.get("/export/{name}")
+@limiter.limit("5/minute")
+async def export_collection(
+    request: Request,
+    name: str,
+    format: str = "ndjson",
+    current_user: User = Depends(require_roles([UserRole.HOSPITAL, UserRole.ADMIN]))
+):
+    """Stream a whole collection as NDJSON or CSV; other query parameters filter it (hospital or admin only)"""
+    if name not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export. Choose one of: {', '.join(EXPORTS)}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format. Choose one of: {', '.join(EXPORT_FORMATS)}")
+    spec = EXPORTS[name]
+    try:
+        query = exporter.query(spec, request.query_params)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    compress = accepts_gzip(request.headers.get("accept-encoding", ""))
+    headers = {"Content-Disposition": f'attachment; filename="{name}-{datetime.utcnow():%Y%m%d}.{format}"'}
+    if compress:
+        # Already compressed per batch; GZipMiddleware passes responses with a Content-Encoding through
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(
+        exporter.stream(spec, query, format, compress),
+        media_type=EXPORT_FORMATS[format],
+        headers=headers
+    )
+
+# Server-Sent Events stream for read-only viewers
+SSE_HEARTBEAT_SECONDS = 15.0
+
+@api_router.get("/stream")
+@limiter.limit("20/minute")
+async def stream_alerts(request: Request, channels: Optional[str] = None, last_event_id: Optional[str] = None):
+    """One-way alert stream with the same channels and resume semantics as /ws"""
+    try:
+        selected = parse_channels(channels)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # EventSource sends Last-Event-ID on reconnect; the query parameter serves polyfills
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    
+    async def event_stream():
+        # Subscribed here rather than in the handler: the finally below only runs once the body
+        # starts, so a client that disconnects before that must not leave a subscription behind.
+        # Subscribe and replay run without an await in between, so nothing falls between them.
+        subscription = alert_bus.subscribe(selected)
+        try:
+            events, complete = alert_bus.replay(resume_from, selected)
+            replayed_through = events[-1].seq if events else 0
+            yield b"retry: 3000\n\n"
+            if not complete:
+                yield b"event: resync\ndata: {}\n\n"
+            for event in events:
+                yield event.sse
+            if STATS_CHANNEL in selected:
+                yield Event(None, 0, STATS_CHANNEL, await stats_snapshot()).sse
+            
+            while not subscription.overflowed:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                    if event.id and event.seq <= replayed_through:
+                        continue  # already sent by the replay
+                    yield event.sse
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": keepalive\n\n"
+        finally:
+            alert_bus.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            # Marks the body as already encoded so GZipMiddleware passes frames through unbuffered
+            "Content-Encoding": "identity"
+        }
+    )
+
+# Operational metrics
+@api_router.get("/metrics")
+@limiter.limit("30/minute")
+async def get_metrics(request: Request, current_user: User = Depends(require_role(UserRole.ADMIN))):
+    """Runtime metrics for background delivery services (Admin only)"""
+    return {
+        "email": email_sender.metrics(),
+        "counter_buffer": counter_buffer.metrics(),
+        "expiry": expiry_scheduler.metrics(),
+        "archive": archiver.metrics(),
+        "cache": document_cache.metrics(),
+        "coalesce": coalesce_metrics(),
+        "alert_bus": {
+            "last_event_id": alert_bus.last_event_id,
+            "sse_subscribers": alert_bus.subscriber_count,
+            "websocket_connections": len(manager.active_connections),
+            "stats_deltas_published": stats_broadcaster.deltas_published
+        },
+        "websocket_admission": admission.metrics()
+    }
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -891,6 +1617,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Configure logging
@@ -900,6 +1627,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_background_services():
+    await ensure_indexes(db)
+    await rollups.ensure_indexes()
+    stats_materializer.start()
+    stats_broadcaster.start()
+    counter_buffer.start()
+    expiry_scheduler.start()
+    archiver.start()
+    email_sender.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await email_sender.stop()
+    await archiver.stop()
+    await expiry_scheduler.stop()
+    await counter_buffer.stop()
+    await stats_broadcaster.stop()
+    await stats_materializer.stop()
     client.close()
\ No newline at end of file
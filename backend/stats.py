@@ -0,0 +1,305 @@
+"""
+Donor and blood request counters behind /api/stats.
+
+The counters are materialized: every write path that can change them applies
+a small $inc delta to a single document in the ``stats`` collection, and the
+document is cached in memory, so serving /api/stats costs at most one small
+document read per cache TTL. A periodic reconciliation recomputes the counts
+with one $group aggregation per collection and overwrites the document to
+correct any drift (crashes between a write and its delta, concurrent
+reconciles, manual edits).
+
+Live dashboards do not poll: StatsBroadcaster pushes the fields that changed
+since its last push, at most once per interval, so the read load stays the
+same however many viewers are subscribed.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+BLOOD_TYPES = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+
+# Both pipelines are planned against indexes in the indexes.py manifest:
+# donors (is_available, blood_type, is_online) and blood_requests (status, blood_type_needed)
+DONOR_COUNTS_PIPELINE = [
+    {"$match": {"is_available": True}},
+    {"$group": {
+        "_id": "$blood_type",
+        "donors": {"$sum": 1},
+        "online_donors": {"$sum": {"$cond": [{"$eq": ["$is_online", True]}, 1, 0]}}
+    }}
+]
+
+REQUEST_COUNTS_PIPELINE = [
+    {"$match": {"status": "Active"}},
+    {"$group": {"_id": "$blood_type_needed", "requests": {"$sum": 1}}}
+]
+
+
+async def aggregate_stats(db) -> dict:
+    """Compute donor/online/request counts overall and per blood type in two round trips"""
+    donor_groups, request_groups = await asyncio.gather(
+        db.donors.aggregate(DONOR_COUNTS_PIPELINE).to_list(None),
+        db.blood_requests.aggregate(REQUEST_COUNTS_PIPELINE).to_list(None)
+    )
+
+    breakdown = {blood_type: {"donors": 0, "online_donors": 0, "requests": 0} for blood_type in BLOOD_TYPES}
+    totals = {"total_donors": 0, "online_donors": 0, "total_active_requests": 0}
+
+    for group in donor_groups:
+        totals["total_donors"] += group["donors"]
+        totals["online_donors"] += group["online_donors"]
+        if group["_id"] in breakdown:
+            breakdown[group["_id"]]["donors"] = group["donors"]
+            breakdown[group["_id"]]["online_donors"] = group["online_donors"]
+
+    for group in request_groups:
+        totals["total_active_requests"] += group["requests"]
+        if group["_id"] in breakdown:
+            breakdown[group["_id"]]["requests"] = group["requests"]
+
+    return {**totals, "blood_type_breakdown": breakdown}
+
+
+def _donor_contribution(donor: Optional[dict]) -> dict:
+    """The counter increments a donor document accounts for"""
+    if not donor or not donor.get("is_available"):
+        return {}
+    blood_type = donor.get("blood_type")
+    contribution = {"total_donors": 1}
+    if blood_type in BLOOD_TYPES:
+        contribution[f"blood_type_breakdown.{blood_type}.donors"] = 1
+    if donor.get("is_online"):
+        contribution["online_donors"] = 1
+        if blood_type in BLOOD_TYPES:
+            contribution[f"blood_type_breakdown.{blood_type}.online_donors"] = 1
+    return contribution
+
+
+def _request_contribution(blood_request: Optional[dict]) -> dict:
+    """The counter increments a blood request document accounts for"""
+    if not blood_request or blood_request.get("status") != "Active":
+        return {}
+    blood_type = blood_request.get("blood_type_needed")
+    contribution = {"total_active_requests": 1}
+    if blood_type in BLOOD_TYPES:
+        contribution[f"blood_type_breakdown.{blood_type}.requests"] = 1
+    return contribution
+
+
+def _difference(before: dict, after: dict) -> dict:
+    deltas = {}
+    for field in set(before) | set(after):
+        delta = after.get(field, 0) - before.get(field, 0)
+        if delta:
+            deltas[field] = delta
+    return deltas
+
+
+def _combined(contributions) -> dict:
+    """One delta summing several documents' contributions, for a single $inc"""
+    deltas = {}
+    for contribution in contributions:
+        for field, delta in contribution.items():
+            deltas[field] = deltas.get(field, 0) + delta
+    return deltas
+
+
+def _as_value(value):
+    return getattr(value, "value", value)
+
+
+class StatsMaterializer:
+    """Keeps the /api/stats counters in one document, updated by deltas from the write paths"""
+
+    DOCUMENT_ID = "global"
+
+    def __init__(self, db, cache_ttl: float = 1.0, reconcile_interval: float = 300.0):
+        self.db = db
+        self.cache_ttl = cache_ttl
+        self.reconcile_interval = reconcile_interval
+        self._cached: Optional[dict] = None
+        self._cached_at = 0.0
+        self._reconcile_task: Optional[asyncio.Task] = None
+        self.listeners = []  # callables invoked with the fresh counters after every change
+
+    @classmethod
+    def from_env(cls, db) -> "StatsMaterializer":
+        return cls(
+            db,
+            cache_ttl=float(os.environ.get("STATS_CACHE_TTL", "1.0")),
+            reconcile_interval=float(os.environ.get("STATS_RECONCILE_INTERVAL", "300")),
+        )
+
+    def _store(self, document: dict) -> dict:
+        counters = {key: value for key, value in document.items() if key != "_id"}
+        self._cached = counters
+        self._cached_at = time.monotonic()
+        for listener in self.listeners:
+            listener(counters)
+        return counters
+
+    async def get(self) -> dict:
+        """Current counters; served from memory while the cache is fresh"""
+        if self._cached is not None and time.monotonic() - self._cached_at < self.cache_ttl:
+            return self._cached
+        document = await self.db.stats.find_one({"_id": self.DOCUMENT_ID})
+        if document is None:
+            return await self.reconcile()
+        self._cached = {key: value for key, value in document.items() if key != "_id"}
+        self._cached_at = time.monotonic()
+        return self._cached
+
+    async def apply(self, deltas: dict):
+        if not deltas:
+            return
+        try:
+            document = await self.db.stats.find_one_and_update(
+                {"_id": self.DOCUMENT_ID},
+                {"$inc": deltas},
+                return_document=ReturnDocument.AFTER
+            )
+            # Without a stats document yet the next reconciliation builds it from scratch
+            if document is not None:
+                self._store(document)
+        except Exception as e:
+            # A lost delta is corrected by the next reconciliation
+            logger.error(f"Failed to apply stats delta {deltas}: {e}")
+
+    async def reconcile(self) -> dict:
+        """Recompute every counter from the collections and overwrite the stats document"""
+        counts = await aggregate_stats(self.db)
+        await self.db.stats.replace_one({"_id": self.DOCUMENT_ID}, counts, upsert=True)
+        return self._store(counts)
+
+    # Write-path hooks
+
+    async def donor_added(self, donor: dict):
+        await self.apply(_donor_contribution(donor))
+
+    async def donors_added(self, donors: list):
+        await self.apply(_combined(_donor_contribution(donor) for donor in donors))
+
+    async def donor_changed(self, before: Optional[dict], after: Optional[dict]):
+        await self.apply(_difference(_donor_contribution(before), _donor_contribution(after)))
+
+    async def request_added(self, blood_request: dict):
+        await self.requests_added([blood_request])
+
+    async def requests_added(self, blood_requests: list):
+        await self.apply(_combined(
+            _request_contribution({**blood_request, "status": _as_value(blood_request.get("status"))})
+            for blood_request in blood_requests
+        ))
+
+    async def request_status_changed(self, blood_type: str, old_status, new_status):
+        before = {"blood_type_needed": blood_type, "status": _as_value(old_status)}
+        after = {"blood_type_needed": blood_type, "status": _as_value(new_status)}
+        await self.apply(_difference(_request_contribution(before), _request_contribution(after)))
+
+    # Periodic drift correction
+
+    def start(self):
+        if self._reconcile_task is None:
+            self._reconcile_task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self):
+        if self._reconcile_task:
+            self._reconcile_task.cancel()
+            self._reconcile_task = None
+
+    async def _reconcile_loop(self):
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Stats reconciliation failed: {e}")
+            await asyncio.sleep(self.reconcile_interval)
+
+
+def changed_fields(old: Optional[dict], new: dict) -> dict:
+    """The fields of new (recursing into nested dicts) whose values differ from old"""
+    if not old:
+        return new
+    changes = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            nested = changed_fields(previous, value)
+            if nested:
+                changes[key] = nested
+        elif value != previous:
+            changes[key] = value
+    return changes
+
+
+class StatsBroadcaster:
+    """Publishes coalesced stats deltas to live viewers.
+
+    notify() marks the counters dirty; the loop publishes the changed fields
+    (new absolute values, so a missed delta never corrupts a client's view) at
+    most once per interval. Changes made by other workers only reach this one
+    through the stats document, so it is also re-read every poll_interval.
+    """
+
+    def __init__(self, read, publish, interval: float = 2.0, poll_interval: float = 15.0):
+        self.read = read  # async callable returning the current stats
+        self.publish = publish  # async callable taking the delta message
+        self.interval = interval
+        self.poll_interval = poll_interval
+        self._published: Optional[dict] = None
+        self._dirty = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.deltas_published = 0
+
+    @classmethod
+    def from_env(cls, read, publish) -> "StatsBroadcaster":
+        return cls(
+            read,
+            publish,
+            interval=float(os.environ.get("STATS_PUSH_INTERVAL", "2.0")),
+            poll_interval=float(os.environ.get("STATS_POLL_INTERVAL", "15")),
+        )
+
+    def notify(self, *_):
+        self._dirty.set()
+
+    async def publish_changes(self):
+        current = await self.read()
+        changes = changed_fields(self._published, current)
+        first = self._published is None
+        self._published = current
+        # Subscribers start from a snapshot, so the first read only sets the baseline
+        if changes and not first:
+            await self.publish({"type": "stats_delta", "changes": changes, "timestamp": datetime.utcnow().isoformat()})
+            self.deltas_published += 1
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._dirty.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._dirty.clear()
+            try:
+                await self.publish_changes()
+            except Exception as e:
+                logger.error(f"Failed to publish stats delta: {e}")
+            await asyncio.sleep(self.interval)
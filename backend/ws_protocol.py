@@ -0,0 +1,131 @@
+"""
+Websocket wire protocols.
+
+Clients that do not request a subprotocol keep the original JSON text frames.
+Clients that offer ``bloodconnect.v2.msgpack`` in Sec-WebSocket-Protocol get
+binary MessagePack frames where each known message type is a positional array
+``[schema_id, value, value, ...]`` instead of a map with repeated keys. The
+schema table is sent once in the welcome frame, which is itself a plain
+``[0, {...}]`` map so a new client can read it without a table. Verbose fields
+that the client can render itself (the human-readable ``message`` strings) are
+dropped. ``unpack`` is the reference decoder for compact frames.
+
+permessage-deflate is negotiated by the ASGI server's websocket layer (uvicorn
+enables it by default); it applies to both protocols.
+"""
+
+import json
+from datetime import datetime
+from enum import Enum
+from typing import Any, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is optional, JSON clients keep working
+    msgpack = None
+
+JSON_PROTOCOL = "bloodconnect.json"
+MSGPACK_PROTOCOL = "bloodconnect.v2.msgpack"
+
+# Schema id 0 is reserved for frames without a schema: [0, {...}]
+RAW_SCHEMA_ID = 0
+
+# Id 1 was the welcome frame, which now always goes out unpacked; ids are never reused
+SCHEMAS = {
+    2: ("emergency_alert", ("type", "urgency", "blood_request", "total_compatible_donors", "timestamp",
+                            "alert_id", "location_priority", "compatibility")),
+    3: ("general_alert", ("type", "urgency", "blood_type_needed", "hospital_name", "city",
+                          "compatible_donors_alerted", "total_compatible_donors", "timestamp",
+                          "event_id", "channel")),
+    4: ("new_donor", ("type", "donor_blood_type", "location", "timestamp", "event_id", "channel")),
+    5: ("blood_request", ("id", "requester_name", "patient_name", "phone", "email", "blood_type_needed",
+                          "urgency", "units_needed", "hospital_id", "hospital_name", "city", "state",
+                          "description", "status", "created_at", "updated_at", "expires_at", "alerts_sent",
+                          "views_count", "responses_count", "user_id", "priority_score")),
+}
+SCHEMA_IDS = {name: schema_id for schema_id, (name, _) in SCHEMAS.items()}
+
+# Nested maps that are encoded with their own schema, keyed by the field that holds them
+NESTED_SCHEMAS = {"blood_request": SCHEMA_IDS["blood_request"]}
+
+# Fields compact clients render locally
+OMITTED_FIELDS = {"message", "disclaimer"}
+
+
+def negotiate(requested: list) -> Optional[str]:
+    """Pick the subprotocol to accept from the client's Sec-WebSocket-Protocol offer"""
+    if MSGPACK_PROTOCOL in requested and msgpack is not None:
+        return MSGPACK_PROTOCOL
+    if JSON_PROTOCOL in requested:
+        return JSON_PROTOCOL
+    return None
+
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def _pack(schema_id: int, payload: dict) -> list:
+    fields = SCHEMAS[schema_id][1]
+    values = [schema_id]
+    for field in fields:
+        value = payload.get(field)
+        if field in NESTED_SCHEMAS and isinstance(value, dict):
+            value = _pack(NESTED_SCHEMAS[field], value)
+        values.append(value)
+    extras = {key: value for key, value in payload.items() if key not in fields and key not in OMITTED_FIELDS}
+    if extras:
+        values.append(extras)
+    return values
+
+
+def encode(payload: dict, protocol: Optional[str]) -> Union[str, bytes]:
+    """Encode a message for a connection speaking the given protocol"""
+    if protocol == MSGPACK_PROTOCOL:
+        schema_id = SCHEMA_IDS.get(payload.get("type"))
+        frame = _pack(schema_id, payload) if schema_id else [RAW_SCHEMA_ID, payload]
+        return msgpack.packb(frame, default=_default)
+    return json.dumps(payload, default=_default)
+
+
+def decode(message: dict) -> dict:
+    """Decode an incoming ASGI websocket.receive message into a dict"""
+    if message.get("bytes") is not None:
+        if msgpack is None:
+            raise ValueError("Binary frames are not supported")
+        data = msgpack.unpackb(message["bytes"])
+    else:
+        data = json.loads(message.get("text") or "")
+    if not isinstance(data, dict):
+        raise ValueError("Messages must be objects")
+    return data
+
+
+def _unpack(values: list, schemas: dict) -> dict:
+    name, fields = schemas[str(values[0])]
+    payload = dict(zip(fields, values[1:]))
+    if len(values) > len(fields) + 1:
+        payload.update(values[len(fields) + 1])
+    for field in NESTED_SCHEMAS:
+        if isinstance(payload.get(field), list):
+            payload[field] = _unpack(payload[field], schemas)
+    return payload
+
+
+def unpack(frame: bytes, schemas: Optional[dict] = None) -> dict:
+    """Decode a compact frame sent to a client; schemas is the table from the welcome frame"""
+    values = msgpack.unpackb(frame)
+    if values[0] == RAW_SCHEMA_ID:
+        return values[1]
+    if schemas is None:
+        raise ValueError("Compact frames need the schema table from the welcome frame")
+    return _unpack(values, schemas)
+
+
+def schema_table() -> dict:
+    """The schema table advertised to compact clients in the welcome frame"""
+    return {str(schema_id): [name, list(fields)] for schema_id, (name, fields) in SCHEMAS.items()}
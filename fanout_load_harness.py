@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Websocket Fan-out Load Harness for BloodConnect
+Opens N simulated donor sockets that register via register_donor, fires Critical
+blood requests and reports fan-out latency percentiles, memory per connection
+and event-loop lag.
+
+Runs the backend in-process by default (uvicorn on a local port, same event loop),
+or against an already running local server with --url.
+
+    python fanout_load_harness.py --donors 5000 --requests 3
+    python fanout_load_harness.py --url http://127.0.0.1:8001 --server-pid 12345
+
+When targeting an external server, start it with admission limits that allow
+every simulated socket from one IP, e.g. WS_MAX_PER_IP=20000 WS_DONOR_RESERVE=0
+WS_ACCEPT_RATE=5000. Refused connections (HTTP 503 with Retry-After) are retried.
+
+Each simulated donor gets a donor user and an access token signed with
+JWT_SECRET_KEY from backend/.env, and connects as a verified donor, so it is
+admitted with donor priority and never shed. Against an external server that
+uses a different secret, the tokens do not verify and every socket counts as
+an anonymous viewer; "donor_priority_sockets" in the results shows how many
+sockets the server counted as donors.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import requests
+import websockets
+from websockets.exceptions import InvalidStatus
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+import ws_protocol  # noqa: E402
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    # Rank ceil(p/100 * N), 1-based, clamped so p=0 and p=100 stay in range
+    rank = math.ceil(pct / 100.0 * len(ordered))
+    return ordered[max(1, min(len(ordered), rank)) - 1]
+
+
+def rss_bytes(pid="self"):
+    """Resident set size of a process from /proc (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def raise_fd_limit(needed):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+        soft = target
+    if soft < needed:
+        print(f"⚠️  File descriptor limit {soft} is below the ~{needed} this run needs")
+
+
+class FanoutLoadHarness:
+    def __init__(self, args):
+        self.args = args
+        self.run_id = f"loadtest-{uuid.uuid4().hex[:8]}"
+        self.base_url = args.url.rstrip("/") if args.url else f"http://{args.host}:{args.port}"
+        self.ws_url = self.base_url.replace("http", "ws", 1) + "/ws"
+        self.subprotocols = ["bloodconnect.v2.msgpack"] if args.protocol == "msgpack" else None
+        self.donor_ids = []
+        self.tokens = {}  # donor id: access token of its donor user
+        self.schemas = None  # compact schema table from the welcome frame
+        self.request_ids = []
+        self.sockets = []
+        self.sent_at = {}  # blood request id: perf_counter when the POST was issued
+        self.received_at = {}  # blood request id: [perf_counter per delivered alert]
+        self.general_alerts = 0
+        self.rejected = 0
+        self.donor_priority_sockets = None  # connections the server admitted as verified donors
+        self.loop_lag = []
+        self.server = None
+        self.db = None
+
+    # --- setup -----------------------------------------------------------------
+
+    async def start_server(self):
+        """Start the FastAPI app in-process on a local uvicorn server"""
+        import uvicorn
+
+        # Every simulated client comes from 127.0.0.1, so lift the per-IP cap and accept rate
+        os.environ.setdefault("WS_MAX_PER_IP", str(self.args.donors + 100))
+        os.environ.setdefault("WS_MAX_CONNECTIONS", str(self.args.donors + 100))
+        os.environ.setdefault("WS_DONOR_RESERVE", "0")
+        os.environ.setdefault("WS_ACCEPT_RATE", "100000")
+        os.environ.setdefault("WS_ACCEPT_BURST", "100000")
+        import server as backend
+
+        config = uvicorn.Config(backend.app, host=self.args.host, port=self.args.port,
+                                log_level="warning", ws_per_message_deflate=not self.args.no_deflate)
+        self.server = uvicorn.Server(config)
+        self.server_task = asyncio.create_task(self.server.serve())
+        while not self.server.started:
+            await asyncio.sleep(0.05)
+        print(f"🚀 In-process backend listening on {self.base_url}")
+
+    async def seed_donors(self):
+        """Insert simulated available donors so notify_compatible_donors can match them"""
+        from dotenv import load_dotenv
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        load_dotenv(BACKEND_DIR / ".env")
+        from auth import create_access_token  # reads JWT_SECRET_KEY on import
+        client = AsyncIOMotorClient(self.args.mongo_url or os.environ["MONGO_URL"])
+        self.db = client[self.args.db_name or os.environ["DB_NAME"]]
+
+        now = datetime.utcnow()
+        donors, users = [], []
+        for index in range(self.args.donors):
+            donor_id = f"{self.run_id}-{index}"
+            user_id = f"{donor_id}-user"
+            email = f"{donor_id}@loadtest.bloodconnect.app"
+            self.donor_ids.append(donor_id)
+            # The donor user that owns donor_id, so the socket is verified and gets donor priority
+            users.append({"id": user_id, "email": email, "role": "donor", "donor_id": donor_id,
+                          "is_active": True, "load_test_run": self.run_id, "created_at": now})
+            self.tokens[donor_id] = create_access_token({"sub": email, "role": "donor", "user_id": user_id})
+            donors.append({
+                "id": donor_id,
+                "name": f"Load Donor {index}",
+                "phone": "+1-617-555-0100",
+                "email": email,
+                "blood_type": self.args.donor_blood_type,
+                "age": 30,
+                "city": "Boston",
+                "state": "Massachusetts",
+                "is_available": True,
+                "is_verified": False,
+                "is_online": False,
+                "donation_count": 0,
+                # Keep the harness from queueing real alert emails
+                "notification_preferences": {"email": False, "sms": False, "push": True, "critical_only": False},
+                "load_test_run": self.run_id,
+                "created_at": now,
+            })
+        for start in range(0, len(donors), 5000):
+            await self.db.donors.insert_many(donors[start:start + 5000], ordered=False)
+            await self.db.users.insert_many(users[start:start + 5000], ordered=False)
+        print(f"🩸 Seeded {len(donors)} {self.args.donor_blood_type} donors ({self.run_id})")
+
+    async def cleanup(self):
+        if self.db is None:
+            return
+        await self.db.donors.delete_many({"load_test_run": self.run_id})
+        await self.db.users.delete_many({"load_test_run": self.run_id})
+        if self.request_ids:
+            await self.db.blood_requests.delete_many({"id": {"$in": self.request_ids}})
+            await self.db.emergency_alerts.delete_many({"blood_request_id": {"$in": self.request_ids}})
+
+    # --- donor sockets ---------------------------------------------------------
+
+    def decode(self, frame):
+        if isinstance(frame, bytes):
+            # The welcome frame is a plain map carrying the schema table the later frames need
+            message = ws_protocol.unpack(frame, self.schemas)
+            if message.get("type") == "welcome":
+                self.schemas = message.get("schemas", self.schemas)
+            return message
+        return json.loads(frame)
+
+    def request_id_of(self, message):
+        blood_request = message.get("blood_request")
+        return blood_request.get("id") if isinstance(blood_request, dict) else None
+
+    async def open_donor_socket(self, donor_id, registered):
+        token = self.tokens.get(donor_id)
+        url = f"{self.ws_url}?donor_id={donor_id}&token={token}" if token else self.ws_url
+        for attempt in range(10):
+            try:
+                websocket = await websockets.connect(url, subprotocols=self.subprotocols,
+                                                     compression=None if self.args.no_deflate else "deflate",
+                                                     open_timeout=30, ping_interval=None, max_queue=None)
+                self.decode(await websocket.recv())  # welcome
+                break
+            except InvalidStatus as e:
+                # Admission control refused the handshake: 503 with Retry-After, or 403 from a server
+                # that cannot send denial responses
+                if e.response.status_code not in (403, 503):
+                    raise
+                self.rejected += 1
+                delay = float(e.response.headers.get("Retry-After", "1"))
+                await asyncio.sleep(min(delay, 2.0) * (attempt + 1) / 2)
+            except websockets.ConnectionClosed as e:
+                # Closed right after the handshake (e.g. shed), with a retry-after=<seconds> reason
+                self.rejected += 1
+                reason = getattr(e.rcvd, "reason", "") if e.rcvd else ""
+                delay = float(reason.split("=")[1]) if reason.startswith("retry-after=") else 1.0
+                await asyncio.sleep(min(delay, 2.0) * (attempt + 1) / 2)
+        else:
+            return
+
+        payload = {"type": "register_donor", "donor_id": donor_id, "token": token}
+        if self.subprotocols:
+            import msgpack
+            await websocket.send(msgpack.packb(payload))
+        else:
+            await websocket.send(json.dumps(payload))
+        self.sockets.append(websocket)
+        asyncio.create_task(self.read_alerts(websocket, registered))
+
+    async def read_alerts(self, websocket, registered):
+        try:
+            async for frame in websocket:
+                received = time.perf_counter()
+                message = self.decode(frame)
+                message_type = message.get("type")
+                if message_type == "registration_success":
+                    registered.release()
+                elif message_type == "emergency_alert":
+                    # Alerts can arrive before the POST response does, so match them up at report time
+                    request_id = self.request_id_of(message)
+                    self.received_at.setdefault(request_id, []).append(received)
+                elif message_type == "general_alert":
+                    self.general_alerts += 1
+        except websockets.ConnectionClosed:
+            pass
+
+    async def connect_donors(self):
+        registered = asyncio.Semaphore(0)
+        limiter = asyncio.Semaphore(self.args.connect_concurrency)
+
+        async def open_one(donor_id):
+            async with limiter:
+                await self.open_donor_socket(donor_id, registered)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(open_one(donor_id) for donor_id in self.donor_ids))
+        for _ in range(len(self.sockets)):
+            await asyncio.wait_for(registered.acquire(), timeout=60)
+        elapsed = time.perf_counter() - started
+        print(f"🔌 {len(self.sockets)} donor sockets registered in {elapsed:.1f}s "
+              f"({len(self.sockets) / max(elapsed, 1e-9):.0f}/s, {self.rejected} admission retries)")
+        await self.check_donor_priority()
+        return elapsed
+
+    async def check_donor_priority(self):
+        """Ask the server how many sockets it admitted as verified donors (tokens need a shared JWT secret)"""
+        from auth import create_demo_token
+        from models import UserRole
+
+        try:
+            response = await asyncio.to_thread(
+                requests.get, f"{self.base_url}/api/metrics", timeout=30,
+                headers={"Authorization": f"Bearer {create_demo_token(UserRole.ADMIN)}"}
+            )
+            self.donor_priority_sockets = response.json()["websocket_admission"]["donor_connections"]
+        except (requests.RequestException, ValueError, KeyError) as e:
+            print(f"⚠️  Could not read admission metrics: {e}")
+            return
+        if self.donor_priority_sockets < len(self.sockets):
+            print(f"⚠️  Only {self.donor_priority_sockets} of {len(self.sockets)} sockets have donor priority; "
+                  "the rest are anonymous viewers (does the server use backend/.env's JWT_SECRET_KEY?)")
+
+    # --- load ------------------------------------------------------------------
+
+    async def probe_loop_lag(self):
+        interval = 0.05
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.append(time.perf_counter() - started - interval)
+
+    async def fire_requests(self):
+        for index in range(self.args.requests):
+            body = {
+                "requester_name": "Load Harness",
+                "patient_name": f"Load Patient {index}",
+                "phone": "+1-617-555-0199",
+                "email": "harness@loadtest.bloodconnect.app",
+                "blood_type_needed": self.args.needed_blood_type,
+                "urgency": "Critical",
+                "units_needed": 2,
+                "hospital_name": "Load Test General",
+                "city": "Boston",
+                "state": "Massachusetts",
+                "description": f"Fan-out load test {self.run_id}",
+            }
+            sent_at = time.perf_counter()
+            response = await asyncio.to_thread(requests.post, f"{self.base_url}/api/blood-requests", json=body, timeout=30)
+            if response.status_code != 200:
+                print(f"❌ Blood request {index} failed: {response.status_code} {response.text[:200]}")
+                continue
+            request_id = response.json()["id"]
+            self.request_ids.append(request_id)
+            self.sent_at[request_id] = sent_at
+            await asyncio.sleep(self.args.interval)
+        await asyncio.sleep(self.args.settle)
+
+    # --- run -------------------------------------------------------------------
+
+    async def run(self):
+        raise_fd_limit(self.args.donors * (2 if not self.args.url else 1) + 256)
+        lag_task = None
+        try:
+            if not self.args.url:
+                await self.start_server()
+            await self.seed_donors()
+
+            rss_before = rss_bytes(self.args.server_pid or "self")
+            connect_seconds = await self.connect_donors()
+            rss_after = rss_bytes(self.args.server_pid or "self")
+
+            lag_task = asyncio.create_task(self.probe_loop_lag())
+            await self.fire_requests()
+            return self.report(connect_seconds, rss_before, rss_after)
+        finally:
+            if lag_task:
+                lag_task.cancel()
+            await asyncio.gather(*(websocket.close() for websocket in self.sockets), return_exceptions=True)
+            await self.cleanup()
+            if self.server:
+                self.server.should_exit = True
+                await self.server_task
+
+    def report(self, connect_seconds, rss_before, rss_after):
+        latencies = {
+            request_id: [received - self.sent_at[request_id] for received in self.received_at.get(request_id, [])]
+            for request_id in self.request_ids
+        }
+        all_latencies = [value for values in latencies.values() for value in values]
+        expected = len(self.sockets) * len(self.request_ids)
+        ms = lambda value: round(value * 1000, 2) if value is not None else None
+
+        memory_scope = f"pid {self.args.server_pid}" if self.args.server_pid else (
+            "harness process (server + clients)" if not self.args.url else "harness process (clients only)")
+        results = {
+            "run_id": self.run_id,
+            "donor_sockets": len(self.sockets),
+            "donor_priority_sockets": self.donor_priority_sockets,
+            "blood_requests": len(self.request_ids),
+            "connect_seconds": round(connect_seconds, 2),
+            "alerts_delivered": len(all_latencies),
+            "alerts_expected": expected,
+            "delivery_ratio": round(len(all_latencies) / expected, 4) if expected else None,
+            "general_alerts_received": self.general_alerts,
+            "fanout_latency_ms": {
+                "p50": ms(percentile(all_latencies, 50)),
+                "p95": ms(percentile(all_latencies, 95)),
+                "p99": ms(percentile(all_latencies, 99)),
+                "max": ms(max(all_latencies) if all_latencies else None),
+            },
+            "per_request_p99_ms": {request_id: ms(percentile(values, 99)) for request_id, values in latencies.items()},
+            "memory": {
+                "scope": memory_scope,
+                "rss_before_mb": round(rss_before / 2 ** 20, 1) if rss_before else None,
+                "rss_after_mb": round(rss_after / 2 ** 20, 1) if rss_after else None,
+                "bytes_per_connection": round((rss_after - rss_before) / len(self.sockets))
+                if rss_before and rss_after and self.sockets else None,
+            },
+            "event_loop_lag_ms": {
+                "scope": "shared server/harness loop" if not self.args.url else "harness loop",
+                "p50": ms(percentile(self.loop_lag, 50)),
+                "p99": ms(percentile(self.loop_lag, 99)),
+                "max": ms(max(self.loop_lag) if self.loop_lag else None),
+            },
+        }
+
+        print("\n" + "=" * 70)
+        print("📊 WEBSOCKET FAN-OUT LOAD TEST SUMMARY")
+        print("=" * 70)
+        print(f"Donor sockets:        {results['donor_sockets']}")
+        print(f"Alerts delivered:     {results['alerts_delivered']} / {expected}")
+        latency = results["fanout_latency_ms"]
+        print(f"Fan-out latency (ms): p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} max={latency['max']}")
+        memory = results["memory"]
+        print(f"Memory ({memory['scope']}): {memory['rss_before_mb']} MB -> {memory['rss_after_mb']} MB, "
+              f"{memory['bytes_per_connection']} bytes/connection")
+        lag = results["event_loop_lag_ms"]
+        print(f"Event-loop lag (ms, {lag['scope']}): p50={lag['p50']} p99={lag['p99']} max={lag['max']}")
+
+        if self.args.json:
+            with open(self.args.json, "w") as output:
+                json.dump(results, output, indent=2)
+            print(f"\nResults written to {self.args.json}")
+        return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="BloodConnect websocket fan-out load harness")
+    parser.add_argument("--url", help="Base URL of a running local backend (default: start the app in-process)")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind host for the in-process server")
+    parser.add_argument("--port", type=int, default=8765, help="Bind port for the in-process server")
+    parser.add_argument("--server-pid", help="PID of an external server, to measure its memory per connection")
+    parser.add_argument("--donors", type=int, default=1000, help="Number of simulated donor sockets")
+    parser.add_argument("--requests", type=int, default=3,
+                        help="Critical blood requests to fire (POST /blood-requests is limited to 10/minute)")
+    parser.add_argument("--interval", type=float, default=2.0, help="Seconds between blood requests")
+    parser.add_argument("--settle", type=float, default=5.0, help="Seconds to wait for stragglers after the last request")
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="Sockets opened in parallel")
+    parser.add_argument("--protocol", choices=["json", "msgpack"], default="json", help="Websocket wire protocol")
+    parser.add_argument("--no-deflate", action="store_true", help="Disable permessage-deflate")
+    parser.add_argument("--donor-blood-type", default="O-", help="Blood type of simulated donors")
+    parser.add_argument("--needed-blood-type", default="AB+", help="Blood type requested by the fired alerts")
+    parser.add_argument("--mongo-url", help="MongoDB URL for seeding (default: backend/.env MONGO_URL)")
+    parser.add_argument("--db-name", help="Database name for seeding (default: backend/.env DB_NAME)")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    harness = FanoutLoadHarness(parse_args())
+    asyncio.run(harness.run())
@@ -5,6 +5,7 @@ import LegalDisclaimer from "./components/LegalDisclaimer";
 import { AuthProvider, useAuth, LoginModal } from "./components/AuthContext";
 import AdminDashboard from "./components/AdminDashboard";
 import HospitalDashboard from "./components/HospitalDashboard";
+import { applyStatsMessage, publishLiveMessage } from "./liveStats";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -27,6 +28,8 @@ function BloodConnectApp() {
   const [activeTab, setActiveTab] = useState("home");
   const [donors, setDonors] = useState([]);
   const [bloodRequests, setBloodRequests] = useState([]);
+  const [donorsCursor, setDonorsCursor] = useState(null);
+  const [requestsCursor, setRequestsCursor] = useState(null);
   const [stats, setStats] = useState(null);
   const [matchedDonors, setMatchedDonors] = useState(null);
   const [selectedRequestId, setSelectedRequestId] = useState(null);
@@ -136,6 +139,8 @@ function BloodConnectApp() {
       ws.onopen = () => {
         console.log('WebSocket connected');
         setIsConnected(true);
+        // Stats arrive as a snapshot followed by pushed deltas instead of polling /api/stats
+        ws.send(JSON.stringify({ type: 'subscribe', channels: ['alerts', 'donors', 'stats'] }));
       };
 
       ws.onmessage = (event) => {
@@ -162,6 +167,8 @@ function BloodConnectApp() {
       ws.onerror = (error) => {
         console.error('WebSocket error:', error);
         setIsConnected(false);
+        // Without the live channel fall back to a one-off fetch
+        fetchStats();
       };
 
     } catch (error) {
@@ -171,6 +178,7 @@ function BloodConnectApp() {
 
   const handleWebSocketMessage = (data) => {
     console.log('WebSocket message received:', data);
+    publishLiveMessage(data);
     
     switch (data.type) {
       case 'welcome':
@@ -186,6 +194,7 @@ function BloodConnectApp() {
         break;
         
       case 'new_donor':
+      case 'donors_imported':
         handleNewDonorAlert(data);
         break;
         
@@ -193,18 +202,32 @@ function BloodConnectApp() {
         console.log('Registered for emergency alerts');
         break;
         
+      case 'stats_snapshot':
+      case 'stats_delta':
+        setStats(prev => applyStatsMessage(prev, data));
+        break;
+        
+      case 'requests_expired':
+        setBloodRequests(prev => prev.filter(request => !data.request_ids.includes(request.id)));
+        break;
+        
+      case 'subscribed':
+        break;
+        
       default:
         console.log('Unknown message type:', data.type);
     }
   };
 
   const handleEmergencyAlert = (data) => {
-    // Add alert to list
+    // Batch submissions arrive as one alert listing every request this donor can help with
+    const others = (data.blood_requests || []).length - 1;
     const newAlert = {
       id: data.alert_id,
       type: 'emergency',
       urgency: data.urgency,
-      message: `🚨 EMERGENCY: ${data.blood_request.blood_type_needed} blood needed at ${data.blood_request.hospital_name}`,
+      message: `🚨 EMERGENCY: ${data.blood_request.blood_type_needed} blood needed at ${data.blood_request.hospital_name}` +
+        (others > 0 ? ` (+${others} more request${others > 1 ? 's' : ''})` : ''),
       details: data.blood_request,
       timestamp: new Date().toLocaleTimeString()
     };
@@ -218,9 +241,6 @@ function BloodConnectApp() {
     
     // Show browser notification
     showNotification(newAlert);
-    
-    // Refresh stats to show updated data
-    fetchStats();
   };
 
   const handleGeneralAlert = (data) => {
@@ -253,9 +273,6 @@ function BloodConnectApp() {
     };
     
     setAlerts(prev => [newAlert, ...prev.slice(0, 9)]);
-    
-    // Refresh stats to show new donor count
-    fetchStats();
   };
 
   const showNotification = (alert) => {
@@ -279,7 +296,9 @@ function BloodConnectApp() {
     if (websocketRef.current && websocketRef.current.readyState === WebSocket.OPEN) {
       const message = {
         type: 'register_donor',
-        donor_id: donorId
+        donor_id: donorId,
+        // Proves ownership of the donor record; only verified donors get admission priority
+        token: localStorage.getItem('auth_token') || undefined
       };
       websocketRef.current.send(JSON.stringify(message));
       setOnlineDonorId(donorId);
@@ -287,7 +306,6 @@ function BloodConnectApp() {
   };
 
   useEffect(() => {
-    fetchStats();
     if (activeTab === "donors") fetchDonors();
     if (activeTab === "requests") fetchBloodRequests();
   }, [activeTab]);
@@ -296,24 +314,28 @@ function BloodConnectApp() {
     try {
       const response = await axios.get(`${API}/stats`);
       setStats(response.data);
+      publishLiveMessage({ type: 'stats_snapshot', stats: response.data });
     } catch (error) {
       console.error("Error fetching stats:", error);
     }
   };
 
-  const fetchDonors = async () => {
+  // List endpoints return one page; X-Next-Cursor points at the next one
+  const fetchDonors = async (cursor = null) => {
     try {
-      const response = await axios.get(`${API}/donors`);
-      setDonors(response.data);
+      const response = await axios.get(`${API}/donors`, { params: { view: 'summary', ...(cursor ? { cursor } : {}) } });
+      setDonors(prev => cursor ? [...prev, ...response.data] : response.data);
+      setDonorsCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       console.error("Error fetching donors:", error);
     }
   };
 
-  const fetchBloodRequests = async () => {
+  const fetchBloodRequests = async (cursor = null) => {
     try {
-      const response = await axios.get(`${API}/blood-requests`);
-      setBloodRequests(response.data);
+      const response = await axios.get(`${API}/blood-requests`, { params: { view: 'summary', ...(cursor ? { cursor } : {}) } });
+      setBloodRequests(prev => cursor ? [...prev, ...response.data] : response.data);
+      setRequestsCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       console.error("Error fetching blood requests:", error);
     }
@@ -385,7 +407,6 @@ function BloodConnectApp() {
         city: "",
         state: ""
       });
-      fetchStats();
     } catch (error) {
       const errorMessage = error.response?.data?.detail || "Error registering donor. Please check your information and try again.";
       alert(`❌ Registration Failed:\n\n${errorMessage}\n\n⚠️ Remember: This is a demo system only.`);
@@ -481,7 +502,6 @@ function BloodConnectApp() {
         state: "",
         description: ""
       });
-      fetchStats();
     } catch (error) {
       const errorMessage = error.response?.data?.detail || "Error creating blood request. Please check your information and try again.";
       alert(`❌ Request Failed:\n\n${errorMessage}\n\n⚠️ Remember: This is a demo system only.`);
@@ -1094,6 +1114,16 @@ function BloodConnectApp() {
             ))}
           </div>
         )}
+        {requestsCursor && (
+          <div className="text-center mt-6">
+            <button
+              onClick={() => fetchBloodRequests(requestsCursor)}
+              className="bg-gray-100 hover:bg-gray-200 text-gray-800 px-4 py-2 rounded-md text-sm font-medium"
+            >
+              Load more requests
+            </button>
+          </div>
+        )}
         
         {/* Enhanced Matched Donors Modal */}
         {matchedDonors && (
@@ -1201,6 +1231,16 @@ function BloodConnectApp() {
             ))}
           </div>
         )}
+        {donorsCursor && (
+          <div className="text-center mt-6">
+            <button
+              onClick={() => fetchDonors(donorsCursor)}
+              className="bg-gray-100 hover:bg-gray-200 text-gray-800 px-4 py-2 rounded-md text-sm font-medium"
+            >
+              Load more donors
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );
@@ -1327,7 +1367,6 @@ function BloodConnectApp() {
         onClose={() => setShowLoginModal(false)}
         onSuccess={(user) => {
           console.log('Login successful:', user);
-          fetchStats();
         }}
       />
 
@@ -1,11 +1,13 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { applyStatsMessage, getCurrentStats, subscribeLiveMessages } from '../liveStats';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
 const AdminDashboard = ({ user }) => {
   const [hospitals, setHospitals] = useState([]);
+  const [hospitalsCursor, setHospitalsCursor] = useState(null);
   const [pendingHospitals, setPendingHospitals] = useState([]);
   const [analytics, setAnalytics] = useState(null);
   const [loading, setLoading] = useState(false);
@@ -16,21 +18,28 @@ const AdminDashboard = ({ user }) => {
     }
   }, [user]);
 
+  // Keep the analytics cards live from the stats channel App's websocket already carries,
+  // instead of re-fetching /api/stats or opening a second stream
+  useEffect(() => {
+    if (user?.role !== 'admin') return undefined;
+    setAnalytics(getCurrentStats());
+    return subscribeLiveMessages((message) => {
+      setAnalytics(prev => applyStatsMessage(prev, message));
+    });
+  }, [user]);
+
   const fetchAdminData = async () => {
     setLoading(true);
     try {
-      // Fetch all hospitals
-      const hospitalsResponse = await axios.get(`${API}/hospitals`);
+      // Fetch the first page of all hospitals
+      const hospitalsResponse = await axios.get(`${API}/hospitals`, { params: { view: 'summary' } });
       setHospitals(hospitalsResponse.data);
+      setHospitalsCursor(hospitalsResponse.headers['x-next-cursor'] || null);
 
       // Fetch pending hospitals
-      const pendingResponse = await axios.get(`${API}/hospitals?status=pending`);
+      const pendingResponse = await axios.get(`${API}/hospitals`, { params: { status: 'pending', view: 'summary' } });
       setPendingHospitals(pendingResponse.data);
 
-      // Fetch analytics
-      const analyticsResponse = await axios.get(`${API}/stats`);
-      setAnalytics(analyticsResponse.data);
-      
     } catch (error) {
       console.error('Error fetching admin data:', error);
     } finally {
@@ -38,6 +47,16 @@ const AdminDashboard = ({ user }) => {
     }
   };
 
+  const loadMoreHospitals = async () => {
+    try {
+      const response = await axios.get(`${API}/hospitals`, { params: { view: 'summary', cursor: hospitalsCursor } });
+      setHospitals(prev => [...prev, ...response.data]);
+      setHospitalsCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      console.error('Error fetching hospitals:', error);
+    }
+  };
+
   const verifyHospital = async (hospitalId, status) => {
     try {
       await axios.put(`${API}/hospitals/${hospitalId}/verify?status=${status}`, {}, {
@@ -230,6 +249,16 @@ const AdminDashboard = ({ user }) => {
                     ))}
                   </tbody>
                 </table>
+                {hospitalsCursor && (
+                  <div className="text-center mt-4">
+                    <button
+                      onClick={loadMoreHospitals}
+                      className="bg-gray-100 hover:bg-gray-200 text-gray-800 px-4 py-2 rounded-md text-sm font-medium"
+                    >
+                      Load more hospitals
+                    </button>
+                  </div>
+                )}
               </div>
             )}
           </div>
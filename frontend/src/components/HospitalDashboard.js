@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { subscribeLiveMessages } from '../liveStats';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
@@ -33,6 +34,18 @@ const HospitalDashboard = ({ user }) => {
     }
   }, [user]);
 
+  // Live updates come from App's websocket; expiries are applied from the event itself
+  // rather than refetching every page of requests on each alert
+  useEffect(() => {
+    if (user?.role !== 'hospital') return;
+    return subscribeLiveMessages((message) => {
+      if (message.type !== 'requests_expired') return;
+      setHospitalRequests(prev => prev.map(request =>
+        message.request_ids.includes(request.id) ? { ...request, status: 'Expired' } : request
+      ));
+    });
+  }, [user]);
+
   const fetchHospitalData = async () => {
     setLoading(true);
     try {
@@ -41,9 +54,17 @@ const HospitalDashboard = ({ user }) => {
         const hospitalResponse = await axios.get(`${API}/hospitals/${user.hospital_id}`);
         setHospital(hospitalResponse.data);
         
-        // Fetch hospital's blood requests
-        const requestsResponse = await axios.get(`${API}/blood-requests`);
-        const userRequests = requestsResponse.data.filter(req => req.user_id === user.id);
+        // Fetch every page of the hospital's own requests (filtered server-side)
+        const userRequests = [];
+        let cursor = null;
+        do {
+          const requestsResponse = await axios.get(`${API}/blood-requests`, {
+            params: { mine: true, cursor: cursor || undefined },
+            headers: { Authorization: `Bearer ${localStorage.getItem('auth_token')}` }
+          });
+          userRequests.push(...requestsResponse.data);
+          cursor = requestsResponse.headers['x-next-cursor'] || null;
+        } while (cursor);
         setHospitalRequests(userRequests);
       }
     } catch (error) {
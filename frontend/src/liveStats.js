@@ -0,0 +1,34 @@
+// Applies a "stats" channel message (snapshot or delta) to the current stats object
+const mergeChanges = (current, changes) => {
+  const merged = { ...current };
+  Object.entries(changes).forEach(([key, value]) => {
+    merged[key] = value && typeof value === 'object' && !Array.isArray(value)
+      ? mergeChanges(current?.[key] || {}, value)
+      : value;
+  });
+  return merged;
+};
+
+export const applyStatsMessage = (current, message) => {
+  if (message.type === 'stats_snapshot') return message.stats;
+  if (message.type === 'stats_delta') return current ? mergeChanges(current, message.changes) : current;
+  return current;
+};
+
+// App's websocket is the page's one live connection: it publishes every message here and
+// components subscribe instead of opening their own streams
+const listeners = new Set();
+let currentStats = null;
+
+export const publishLiveMessage = (message) => {
+  currentStats = applyStatsMessage(currentStats, message);
+  listeners.forEach(listener => listener(message));
+};
+
+// The latest stats seen on the shared connection, for components mounted after the snapshot
+export const getCurrentStats = () => currentStats;
+
+export const subscribeLiveMessages = (listener) => {
+  listeners.add(listener);
+  return () => listeners.delete(listener);
+};
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+JSON Serialization Benchmark for BloodConnect
+Compares the standard JSONResponse (jsonable_encoder + json.dumps) with the
+orjson-backed FastJSONResponse in backend/fast_json.py for the payloads of
+/api/donors (summary and fields= views) and /api/match-donors at 1000 rows.
+
+Each payload is served from an in-process FastAPI app through both
+serializers, so the report shows the serialization time and its share of
+the request latency without needing a database:
+
+    python json_benchmark.py --rows 1000 --repeat 50
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import trusted  # noqa: E402
+from fast_json import FastJSONResponse, orjson  # noqa: E402
+from models import BloodRequest, Donor, DonorSummary  # noqa: E402
+
+BLOOD_TYPES = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+
+
+def donor_documents(count):
+    return [
+        Donor(
+            name=f"Donor Number {index}",
+            phone="+1 617 555 0100",
+            email=f"donor{index}@example.com",
+            blood_type=BLOOD_TYPES[index % 8],
+            age=20 + index % 40,
+            city="Boston",
+            state="Massachusetts",
+        ).model_dump()
+        for index in range(count)
+    ]
+
+
+def payloads(rows):
+    """The content each endpoint hands to its response class"""
+    donors = donor_documents(rows)
+    blood_request = BloodRequest(
+        requester_name="Requester", patient_name="Patient", phone="+1 617 555 0100",
+        email="requester@example.com", blood_type_needed="AB+", urgency="Critical", units_needed=2,
+        hospital_name="Boston General Hospital", city="Boston", state="Massachusetts",
+    ).model_dump()
+    matches = [
+        {
+            "donor": trusted.dump(trusted.construct(Donor, donor)),
+            "location_match": 2,
+            "compatibility": "Direct" if donor["blood_type"] == "AB+" else "Compatible",
+            "is_online": donor["is_online"],
+        }
+        for donor in donors
+    ]
+    return {
+        "/api/donors?view=summary": [DonorSummary(**donor) for donor in donors],
+        "/api/donors?fields=name,blood_type,city,created_at": [
+            {name: donor[name] for name in ("id", "name", "blood_type", "city", "created_at")} for donor in donors
+        ],
+        "/api/match-donors": {
+            "request": blood_request,
+            "compatible_donors": matches,
+            "total_matches": len(matches),
+            "online_donors": 0,
+        },
+    }
+
+
+def standard(content):
+    return JSONResponse(jsonable_encoder(content))
+
+
+def fast(content):
+    return FastJSONResponse(content)
+
+
+def median_ms(call, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON serialization of the hot endpoints")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows per response")
+    parser.add_argument("--repeat", type=int, default=50, help="Requests per measurement")
+    args = parser.parse_args()
+
+    if orjson is None:
+        sys.exit("orjson is not installed; pip install orjson")
+
+    content = payloads(args.rows)
+    serializers = (("standard", standard), ("orjson", fast))
+    app = FastAPI()
+    for index, payload in enumerate(content.values()):
+        for name, serializer in serializers:
+            app.add_api_route(f"/{name}/{index}", lambda payload=payload, serializer=serializer: serializer(payload))
+    client = TestClient(app)
+
+    print("=" * 70)
+    print(f"⚡ JSON SERIALIZATION BENCHMARK ({args.rows} rows, median of {args.repeat})")
+    print("=" * 70)
+    for index, (path, payload) in enumerate(content.items()):
+        standard_body = standard(payload).body
+        fast_body = fast(payload).body
+        print(f"\n{path}  ({len(fast_body) / 1024:.0f} KiB)")
+        for name, serializer in serializers:
+            serialize = median_ms(lambda: serializer(payload), args.repeat)
+            latency = median_ms(lambda: client.get(f"/{name}/{index}"), args.repeat)
+            print(f"  {name:<9} serialize {serialize:7.2f} ms   request {latency:7.2f} ms   "
+                  f"serialization share {serialize / latency:5.1%}")
+        same = json.loads(standard_body) == json.loads(fast_body)
+        print(f"  responses {'✅ identical' if same else '❌ DIFFER'}")
+
+
+if __name__ == "__main__":
+    main()
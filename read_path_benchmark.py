@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Read Path CPU Benchmark for BloodConnect
+Measures the CPU cost per returned row of turning stored documents into a
+JSON response, for the validated path and the trusted-read path.
+
+  validated: Model(**document) for every row, then FastAPI's response_model
+             validation and JSON rendering (what the list endpoints used to do)
+  trusted:   model_construct + pydantic-core JSON serialization (backend/trusted.py)
+
+Documents are generated in memory, so database time is excluded and the
+numbers isolate the Python work per row:
+
+    python read_path_benchmark.py --rows 1000 --repeat 20
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import APIRoute, serialize_response  # noqa: E402
+
+import trusted  # noqa: E402
+from models import BloodRequest, Donor, Hospital  # noqa: E402
+
+BLOOD_TYPES = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+
+
+def donor_documents(count):
+    return [
+        Donor(
+            name=f"Donor Number {index}",
+            phone="+1 617 555 0100",
+            email=f"donor{index}@example.com",
+            blood_type=BLOOD_TYPES[index % 8],
+            age=20 + index % 40,
+            city="Boston",
+            state="Massachusetts",
+        ).model_dump()
+        for index in range(count)
+    ]
+
+
+def blood_request_documents(count):
+    return [
+        BloodRequest(
+            requester_name=f"Requester {index}",
+            patient_name=f"Patient {index}",
+            phone="+1 617 555 0100",
+            email=f"requester{index}@example.com",
+            blood_type_needed=BLOOD_TYPES[index % 8],
+            urgency=["Critical", "Urgent", "Normal"][index % 3],
+            units_needed=1 + index % 5,
+            hospital_name="Boston General Hospital",
+            city="Boston",
+            state="Massachusetts",
+            description="Scheduled surgery, cross-matched units required before 6pm.",
+        ).model_dump(mode="json")
+        for index in range(count)
+    ]
+
+
+def hospital_documents(count):
+    return [
+        Hospital(
+            name=f"Hospital {index}",
+            license_number=f"LIC-{index:06d}",
+            phone="+1 617 555 0100",
+            email=f"hospital{index}@example.com",
+            address=f"{index} Longwood Avenue",
+            city="Boston",
+            state="Massachusetts",
+            zip_code="02115",
+            contact_person_name="Dr. Alex Chen",
+            contact_person_title="Blood Bank Director",
+            contact_person_phone="+1 617 555 0101",
+            contact_person_email=f"contact{index}@example.com",
+        ).model_dump(mode="json")
+        for index in range(count)
+    ]
+
+
+async def validated_path(model, route, documents) -> bytes:
+    content = await serialize_response(field=route.response_field, response_content=[model(**document) for document in documents])
+    return JSONResponse(content).body
+
+
+async def trusted_path(model, route, documents) -> bytes:
+    return trusted.dump_json(model, documents)
+
+
+async def cpu_per_row(path, model, route, documents, repeat) -> float:
+    await path(model, route, documents)  # warm up
+    started = time.process_time()
+    for _ in range(repeat):
+        await path(model, route, documents)
+    return (time.process_time() - started) / (repeat * len(documents)) * 1_000_000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark CPU per row of the read paths")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows per response")
+    parser.add_argument("--repeat", type=int, default=20, help="Responses rendered per measurement")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("⚡ READ PATH BENCHMARK: validated vs trusted reads (CPU µs per row)")
+    print("=" * 70)
+    for model, make_documents in [
+        (Donor, donor_documents),
+        (BloodRequest, blood_request_documents),
+        (Hospital, hospital_documents),
+    ]:
+        documents = make_documents(args.rows)
+        route = APIRoute("/", endpoint=lambda: None, response_model=List[model])
+        validated_body = await validated_path(model, route, documents)
+        trusted_body = await trusted_path(model, route, documents)
+        same = json.loads(validated_body) == json.loads(trusted_body)
+
+        validated = await cpu_per_row(validated_path, model, route, documents, args.repeat)
+        fast = await cpu_per_row(trusted_path, model, route, documents, args.repeat)
+        print(f"\n{model.__name__} ({args.rows} rows)")
+        print(f"  validated  {validated:8.1f} µs/row")
+        print(f"  trusted    {fast:8.1f} µs/row   {validated / fast:.1f}x less CPU")
+        print(f"  responses {'✅ identical' if same else '❌ DIFFER'}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+/api/stats Query Benchmark for BloodConnect
+Compares the legacy 27 sequential count_documents calls with the two-aggregation
+implementation in backend/stats.py at several collection sizes.
+
+Seeds a throwaway database (dropped afterwards unless --keep) on the MongoDB
+configured in backend/.env:
+
+    python stats_benchmark.py --sizes 100000 1000000 --repeat 20
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+load_dotenv(BACKEND_DIR / ".env")
+
+from indexes import ensure_indexes  # noqa: E402
+from stats import aggregate_stats, BLOOD_TYPES  # noqa: E402
+
+
+async def legacy_stats(db):
+    """The original get_stats query pattern: 3 + 3 * 8 sequential round trips"""
+    total_donors = await db.donors.count_documents({"is_available": True})
+    online_donors = await db.donors.count_documents({"is_available": True, "is_online": True})
+    total_requests = await db.blood_requests.count_documents({"status": "Active"})
+    breakdown = {}
+    for blood_type in BLOOD_TYPES:
+        breakdown[blood_type] = {
+            "donors": await db.donors.count_documents({"blood_type": blood_type, "is_available": True}),
+            "online_donors": await db.donors.count_documents({"blood_type": blood_type, "is_available": True, "is_online": True}),
+            "requests": await db.blood_requests.count_documents({"blood_type_needed": blood_type, "status": "Active"}),
+        }
+    return {
+        "total_donors": total_donors,
+        "online_donors": online_donors,
+        "total_active_requests": total_requests,
+        "blood_type_breakdown": breakdown,
+    }
+
+
+async def seed(db, size, request_ratio):
+    await db.donors.drop()
+    await db.blood_requests.drop()
+    now = datetime.utcnow()
+    batch = 10000
+    for start in range(0, size, batch):
+        await db.donors.insert_many([
+            {
+                "id": f"bench-donor-{index}",
+                "blood_type": random.choice(BLOOD_TYPES),
+                "is_available": random.random() < 0.85,
+                "is_online": random.random() < 0.1,
+                "city": "Boston",
+                "state": "Massachusetts",
+                "created_at": now,
+            }
+            for index in range(start, min(start + batch, size))
+        ], ordered=False)
+    request_count = int(size * request_ratio)
+    for start in range(0, request_count, batch):
+        await db.blood_requests.insert_many([
+            {
+                "id": f"bench-request-{index}",
+                "blood_type_needed": random.choice(BLOOD_TYPES),
+                "status": random.choice(["Active", "Active", "Fulfilled", "Cancelled", "Expired"]),
+                "urgency": random.choice(["Critical", "Urgent", "Normal"]),
+                "created_at": now,
+            }
+            for index in range(start, min(start + batch, request_count))
+        ], ordered=False)
+    await ensure_indexes(db, collections=["donors", "blood_requests"])
+
+
+async def time_it(func, db, repeat):
+    await func(db)  # warm the cache
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await func(db)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return result, {
+        "median_ms": round(samples[len(samples) // 2], 2),
+        # Nearest rank: ceil(0.95 * N), 1-based
+        "p95_ms": round(samples[max(1, math.ceil(len(samples) * 0.95)) - 1], 2),
+        "min_ms": round(samples[0], 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark /api/stats query strategies")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000], help="Donor collection sizes")
+    parser.add_argument("--request-ratio", type=float, default=0.1, help="Blood requests seeded per donor")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per strategy")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL"))
+    parser.add_argument("--db-name", default="bloodconnect_stats_benchmark")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark database afterwards")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[args.db_name]
+
+    print("=" * 70)
+    print("📊 /api/stats BENCHMARK: 27 x count_documents vs 2 x $group")
+    print("=" * 70)
+    try:
+        for size in args.sizes:
+            print(f"\nSeeding {size} donors and {int(size * args.request_ratio)} blood requests...")
+            await seed(db, size, args.request_ratio)
+
+            legacy_result, legacy_timing = await time_it(legacy_stats, db, args.repeat)
+            aggregate_result, aggregate_timing = await time_it(aggregate_stats, db, args.repeat)
+
+            match = "✅ identical" if legacy_result == aggregate_result else "❌ MISMATCH"
+            speedup = legacy_timing["median_ms"] / max(aggregate_timing["median_ms"], 1e-9)
+            print(f"  legacy     median={legacy_timing['median_ms']}ms p95={legacy_timing['p95_ms']}ms")
+            print(f"  aggregate  median={aggregate_timing['median_ms']}ms p95={aggregate_timing['p95_ms']}ms")
+            print(f"  results {match}, {speedup:.1f}x faster")
+    finally:
+        if not args.keep:
+            await client.drop_database(args.db_name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
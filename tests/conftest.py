@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# The backend is a flat module layout (``from models import ...``), run from backend/
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
@@ -0,0 +1,83 @@
+import admission
+from admission import AdmissionController
+
+
+def controller(**kwargs):
+    options = {"max_connections": 10, "max_per_ip": 3, "donor_reserve": 2, "accept_rate": 1000.0, "accept_burst": 1000}
+    options.update(kwargs)
+    return AdmissionController(**options)
+
+
+def admit(controller, ip, is_donor=False):
+    reason = controller.check(ip, is_donor)
+    if reason is None:
+        controller.admit(ip, is_donor)
+    return reason
+
+
+def test_per_ip_cap_counts_only_that_address():
+    gate = controller()
+    assert [admit(gate, "1.1.1.1") for _ in range(4)] == [None, None, None, "per_ip"]
+    assert admit(gate, "2.2.2.2") is None
+    gate.release("1.1.1.1", False)
+    assert admit(gate, "1.1.1.1") is None
+
+
+def test_token_bucket_limits_the_accept_rate_and_refills(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    gate = controller(accept_rate=2.0, accept_burst=2, max_per_ip=100)
+
+    assert [admit(gate, f"10.0.0.{i}") for i in range(3)] == [None, None, "accept_rate"]
+    now[0] += 0.5  # one token back
+    assert admit(gate, "10.0.0.9") is None
+    assert admit(gate, "10.0.0.10") == "accept_rate"
+    assert gate.metrics()["rejected"] == {"accept_rate": 2}
+
+
+def test_donor_reserve_keeps_room_for_donors():
+    gate = controller(max_per_ip=100)
+    assert all(admit(gate, f"10.0.0.{i}") is None for i in range(8))
+    assert admit(gate, "10.0.1.1") == "capacity"
+    assert admit(gate, "10.0.1.2", is_donor=True) is None
+    assert admit(gate, "10.0.1.3", is_donor=True) is None
+    assert gate.metrics()["donor_connections"] == 2
+
+
+def test_donor_at_the_hard_cap_requires_shedding_a_viewer():
+    gate = controller(max_connections=3, donor_reserve=1, max_per_ip=100)
+    admit(gate, "10.0.0.1")
+    admit(gate, "10.0.0.2")
+    admit(gate, "10.0.0.3", is_donor=True)
+
+    assert gate.check("10.0.0.4", True) == "shed_required"
+    gate.shed()
+    gate.release("10.0.0.1", False)
+    assert admit(gate, "10.0.0.4", is_donor=True) is None
+
+    # With only donors connected there is nobody to shed
+    gate.release("10.0.0.2", False)
+    admit(gate, "10.0.0.5", is_donor=True)
+    assert gate.check("10.0.0.6", True) == "capacity"
+    assert gate.metrics()["shed_total"] == 1
+
+
+def test_rejected_and_released_addresses_leave_no_entries():
+    gate = controller(max_connections=2, donor_reserve=0, max_per_ip=100)
+    admit(gate, "10.0.0.1")
+    admit(gate, "10.0.0.1", is_donor=True)
+    assert all(admit(gate, f"10.0.1.{i}") == "capacity" for i in range(50))
+    assert gate.metrics()["distinct_ips"] == 1
+
+    gate.release("10.0.0.1", False)
+    gate.release("10.0.0.1", True)
+    metrics = gate.metrics()
+    assert (metrics["distinct_ips"], metrics["connections"]) == (0, 0)
+
+
+def test_promote_moves_an_anonymous_connection_to_donor():
+    gate = controller()
+    admit(gate, "10.0.0.1")
+    gate.promote()
+    metrics = gate.metrics()
+    assert (metrics["donor_connections"], metrics["anonymous_connections"]) == (1, 0)
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from cache import DocumentCache, SingleFlight
+
+
+class SlowCollection:
+    def __init__(self, documents, delay=0.05):
+        self.documents = documents
+        self.delay = delay
+        self.reads = 0
+
+    async def find_one(self, query, projection=None):
+        self.reads += 1
+        await asyncio.sleep(self.delay)
+        document = self.documents.get(query["id"])
+        return dict(document) if document is not None else None
+
+
+def make_cache(documents, delay=0.05, **kwargs):
+    collection = SlowCollection(documents, delay)
+    return DocumentCache({"donors": collection}, **kwargs), collection
+
+
+def test_concurrent_misses_read_mongo_once():
+    async def run():
+        cache, collection = make_cache({"d1": {"id": "d1", "name": "Ann"}})
+        results = await asyncio.gather(*[cache.get("donors", "d1") for _ in range(50)])
+        return cache, collection, results
+
+    cache, collection, results = asyncio.run(run())
+
+    assert collection.reads == 1
+    assert all(result == {"id": "d1", "name": "Ann"} for result in results)
+    assert cache.metrics()["loads"] == 1
+
+
+def test_hits_return_copies_and_missing_documents_are_not_cached():
+    async def run():
+        cache, collection = make_cache({"d1": {"id": "d1", "name": "Ann"}})
+        first = await cache.get("donors", "d1")
+        first["name"] = "changed by a caller"
+        second = await cache.get("donors", "d1")
+        await cache.get("donors", "missing")
+        await cache.get("donors", "missing")
+        return cache, collection, second
+
+    cache, collection, second = asyncio.run(run())
+
+    assert second["name"] == "Ann"
+    assert collection.reads == 3
+    assert cache.metrics()["hits"] == 1
+
+
+def test_ttl_expiry_and_lru_eviction():
+    async def run():
+        cache, collection = make_cache({f"d{i}": {"id": f"d{i}"} for i in range(3)}, delay=0, max_entries=2, ttl=0.1)
+        await cache.get("donors", "d0")
+        await cache.get("donors", "d1")
+        await cache.get("donors", "d0")  # d0 is now the most recently used
+        await cache.get("donors", "d2")  # evicts d1
+        reads_before = collection.reads
+        await cache.get("donors", "d0")
+        assert collection.reads == reads_before
+        await cache.get("donors", "d1")
+        assert collection.reads == reads_before + 1
+        await asyncio.sleep(0.15)
+        await cache.get("donors", "d0")
+        assert collection.reads == reads_before + 2
+        return cache
+
+    cache = asyncio.run(run())
+
+    assert cache.metrics()["evictions"] >= 1
+
+
+def test_invalidation_during_a_load_is_not_overwritten_by_the_old_read():
+    async def run():
+        documents = {"d1": {"id": "d1", "is_online": False}}
+        cache, collection = make_cache(documents)
+        load = asyncio.ensure_future(cache.get("donors", "d1"))
+        await asyncio.sleep(0.01)
+        documents["d1"] = {"id": "d1", "is_online": True}
+        cache.invalidate("donors", "d1")
+        await load
+        return await cache.get("donors", "d1")
+
+    assert asyncio.run(run())["is_online"] is True
+
+
+def test_cancelled_leader_does_not_fail_the_other_callers():
+    async def run():
+        cache, collection = make_cache({"d1": {"id": "d1"}})
+        leader = asyncio.ensure_future(cache.get("donors", "d1"))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(cache.get("donors", "d1")) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return collection, results
+
+    collection, results = asyncio.run(run())
+
+    assert results == [{"id": "d1"}] * 5
+    assert collection.reads == 1
+
+
+def test_single_flight_shares_exceptions_and_forgets_finished_calls():
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("k", failing) for _ in range(3)], return_exceptions=True)
+        assert not flight.in_flight("k")
+        await asyncio.gather(flight.do("k", failing), return_exceptions=True)
+        return results
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert calls == 2
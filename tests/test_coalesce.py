@@ -0,0 +1,107 @@
+import asyncio
+from enum import Enum
+
+import pytest
+from fastapi.responses import JSONResponse
+
+from coalesce import Coalescer
+
+
+class Status(Enum):
+    ACTIVE = "Active"
+
+
+class Handler:
+    """Counts executions; each one takes ``delay`` seconds"""
+
+    def __init__(self, delay=0.05, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.executions = 0
+
+    async def __call__(self, request=None, status=None, limit=None):
+        self.executions += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        return JSONResponse({"status": getattr(status, "value", status), "limit": limit, "run": self.executions})
+
+
+def call(coalescer, handler, **kwargs):
+    return asyncio.ensure_future(coalescer.call(handler, {"request": object(), **kwargs}))
+
+
+def test_identical_concurrent_calls_share_one_execution():
+    async def run():
+        coalescer, handler = Coalescer("list"), Handler()
+        shared = [call(coalescer, handler, status=Status.ACTIVE, limit=20) for _ in range(20)]
+        # The same query spelled differently (enum vs value) is the same key
+        shared.append(call(coalescer, handler, status="Active", limit=20))
+        other = call(coalescer, handler, status=Status.ACTIVE, limit=50)
+        responses = await asyncio.gather(*shared, other)
+        return coalescer, handler, responses
+
+    coalescer, handler, responses = asyncio.run(run())
+
+    assert handler.executions == 2
+    shared_bodies = {response.body for response in responses[:-1]}
+    assert len(shared_bodies) == 1 and b'"limit":20' in shared_bodies.pop()
+    assert coalescer.metrics() == {"calls": 22, "executions": 2, "reused": 20, "results_held": 0}
+
+
+def test_each_caller_gets_its_own_header_list():
+    async def run():
+        coalescer, handler = Coalescer("list"), Handler()
+        first, second = await asyncio.gather(call(coalescer, handler), call(coalescer, handler))
+        first.raw_headers.append((b"access-control-allow-origin", b"*"))
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first.body is second.body
+    assert len(first.raw_headers) == len(second.raw_headers) + 1
+
+
+def test_results_are_reused_until_the_ttl_expires():
+    async def run():
+        coalescer, handler = Coalescer("stats", ttl=0.1), Handler(delay=0)
+        await call(coalescer, handler)
+        await call(coalescer, handler)
+        assert handler.executions == 1
+        await asyncio.sleep(0.15)
+        await call(coalescer, handler)
+        return handler
+
+    assert asyncio.run(run()).executions == 2
+
+
+def test_exceptions_are_shared_but_never_held():
+    async def run():
+        coalescer, handler = Coalescer("stats", ttl=10), Handler(fail=True)
+        results = await asyncio.gather(*[call(coalescer, handler) for _ in range(5)], return_exceptions=True)
+        await asyncio.gather(call(coalescer, handler), return_exceptions=True)
+        return handler, results
+
+    handler, results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert handler.executions == 2
+
+
+def test_cancelled_leader_does_not_fail_the_coalesced_callers():
+    async def run():
+        coalescer, handler = Coalescer("stats"), Handler()
+        leader = call(coalescer, handler)
+        await asyncio.sleep(0)
+        followers = [call(coalescer, handler) for _ in range(10)]
+        await asyncio.sleep(0.01)
+        leader.cancel()  # the leader's client disconnected
+        responses = await asyncio.gather(*followers)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return handler, responses
+
+    handler, responses = asyncio.run(run())
+
+    assert handler.executions == 1
+    assert all(response.status_code == 200 for response in responses)
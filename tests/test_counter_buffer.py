@@ -0,0 +1,74 @@
+import asyncio
+
+from counter_buffer import CounterBuffer
+
+
+class RecordingCollection:
+    """bulk_write stand-in: records applied $inc updates; can be made to hang until cancelled"""
+
+    def __init__(self):
+        self.counts = {}
+        self.hang = False
+        self.entered = asyncio.Event()
+
+    async def bulk_write(self, operations, ordered=True):
+        self.entered.set()
+        if self.hang:
+            self.hang = False
+            await asyncio.Event().wait()
+        for operation in operations:
+            document_id = operation._filter["id"]
+            for field, amount in operation._doc["$inc"].items():
+                key = (document_id, field)
+                self.counts[key] = self.counts.get(key, 0) + amount
+
+
+class FakeDB(dict):
+    def __missing__(self, name):
+        self[name] = RecordingCollection()
+        return self[name]
+
+
+def test_stop_during_a_flush_still_writes_every_increment():
+    async def run():
+        db = FakeDB()
+        buffer = CounterBuffer(db, flush_interval=60, max_pending=2)
+        db["blood_requests"].hang = True
+        buffer.start()
+
+        buffer.increment("blood_requests", "req1", "views_count")
+        buffer.increment("blood_requests", "req2", "views_count", 3)  # reaches max_pending: wakes the loop
+        await asyncio.wait_for(db["blood_requests"].entered.wait(), timeout=1)
+        # The loop has swapped the batch out of _pending and is blocked inside bulk_write
+        buffer.increment("blood_requests", "req1", "views_count")
+
+        await buffer.stop()
+        return db, buffer
+
+    db, buffer = asyncio.run(run())
+
+    assert db["blood_requests"].counts == {("req1", "views_count"): 2, ("req2", "views_count"): 3}
+    assert buffer.metrics()["pending_documents"] == 0
+
+
+def test_failed_flush_is_merged_back_and_retried():
+    async def run():
+        db = FakeDB()
+        buffer = CounterBuffer(db)
+        buffer.increment("blood_requests", "req1", "alerts_sent")
+
+        async def unavailable(operations, ordered=True):
+            raise ConnectionError("primary unavailable")
+
+        original, db["blood_requests"].bulk_write = db["blood_requests"].bulk_write, unavailable
+        await buffer.flush()
+        assert buffer.pending("blood_requests", "req1", "alerts_sent") == 1
+
+        db["blood_requests"].bulk_write = original
+        await buffer.flush()
+        return db, buffer
+
+    db, buffer = asyncio.run(run())
+
+    assert db["blood_requests"].counts == {("req1", "alerts_sent"): 1}
+    assert buffer.metrics()["failed_flushes"] == 1
@@ -0,0 +1,84 @@
+import asyncio
+import json
+
+from donor_import import DonorImporter
+
+HEADER = b"name,phone,email,blood_type,age,city,state\n"
+
+
+class RecordingDonors:
+    def __init__(self):
+        self.inserted = []
+
+    async def insert_many(self, documents, ordered=True):
+        self.inserted.extend(documents)
+
+
+class FakeDB:
+    def __init__(self):
+        self.donors = RecordingDonors()
+
+
+def csv_row(number: int) -> bytes:
+    return f"Donor {number},555000{number:04d},donor{number}@example.com,O-,30,Boston,MA\n".encode()
+
+
+def ndjson_row(number: int) -> bytes:
+    return json.dumps({
+        "name": f"Donor {number}", "phone": f"555000{number:04d}", "email": f"donor{number}@example.com",
+        "blood_type": "O-", "age": 30, "city": "Boston", "state": "MA",
+    }).encode() + b"\n"
+
+
+def run_import(chunks, fmt, **kwargs):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    async def on_inserted(documents):
+        pass
+
+    async def run():
+        db = FakeDB()
+        report = await DonorImporter(db, **kwargs).run(stream(), fmt, on_inserted)
+        return db, report.dict()
+
+    return asyncio.run(run())
+
+
+def test_upload_over_max_rows_is_reported_as_a_partial_import():
+    chunks = [HEADER] + [csv_row(number) for number in range(7)]
+
+    db, report = run_import(chunks, "csv", chunk_size=2, max_rows=5)
+
+    assert report["truncated"] is True
+    assert (report["received"], report["imported"], report["failed"]) == (5, 5, 0)
+    assert [donor["email"] for donor in db.donors.inserted] == [f"donor{number}@example.com" for number in range(5)]
+
+
+def test_upload_at_max_rows_is_not_truncated():
+    db, report = run_import([ndjson_row(number) for number in range(3)], "ndjson", max_rows=3)
+
+    assert report["truncated"] is False
+    assert report["imported"] == 3
+
+
+def test_overlong_ndjson_line_fails_only_its_row():
+    # The long line arrives in pieces with no newline for longer than the cap
+    long_line = [b'{"name": "' + b"x" * 100] * 5 + [b'"}\n']
+    chunks = [ndjson_row(1)] + long_line + [ndjson_row(2)]
+
+    db, report = run_import(chunks, "ndjson", max_line_length=200)
+
+    assert report["imported"] == 2
+    assert report["errors"] == [{"row": 2, "error": "Row is longer than 200 characters"}]
+
+
+def test_overlong_csv_record_fails_only_its_row():
+    chunks = [HEADER, csv_row(1), b"x" * 500 + b"\n", csv_row(2), b'"unterminated' + b"y" * 500]
+
+    db, report = run_import(chunks, "csv", max_line_length=200)
+
+    assert report["imported"] == 2
+    assert [error["row"] for error in report["errors"]] == [2, 4]
+    assert {error["error"] for error in report["errors"]} == {"Row is longer than 200 characters"}
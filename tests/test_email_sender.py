@@ -0,0 +1,260 @@
+import asyncio
+import logging
+import socket
+
+from email_sender import EmailSender, SMTPConnectionPool
+
+ALERT_CONTEXT = {
+    "urgency": "Critical",
+    "units_needed": 2,
+    "blood_type_needed": "O-",
+    "hospital_name": "General",
+    "city": "Boston",
+    "state": "MA",
+}
+
+
+class SMTPSink:
+    """In-process SMTP server that records every delivered message"""
+
+    def __init__(self, pipelining: bool = True, refuse=(), close_after_message: bool = False):
+        self.pipelining = pipelining
+        self.refuse = set(refuse)
+        self.close_after_message = close_after_message
+        self.messages = []
+        self.connections = 0
+        self.commands = []
+        self._server = None
+        self._sessions = set()
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._session, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._server.close()
+        for task in list(self._sessions):
+            task.cancel()
+        await asyncio.gather(*self._sessions, return_exceptions=True)
+        await self._server.wait_closed()
+
+    async def _session(self, reader, writer):
+        self.connections += 1
+        task = asyncio.current_task()
+        self._sessions.add(task)
+        task.add_done_callback(self._sessions.discard)
+
+        held = []
+
+        def reply(line):
+            writer.write(f"{line}\r\n".encode())
+
+        def envelope_reply(line):
+            # With PIPELINING advertised, envelope replies only go out once DATA has arrived: a client
+            # that waits for each reply before sending the next command would stall here
+            if self.pipelining:
+                held.append(line)
+            else:
+                reply(line)
+
+        reply("220 sink ready")
+        await writer.drain()
+        sender, recipients = None, []
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    return
+                command = raw.decode().rstrip("\r\n")
+                self.commands.append(command)
+                verb = command.split(" ", 1)[0].upper()
+                if verb == "EHLO":
+                    reply("250-sink")
+                    reply("250-PIPELINING" if self.pipelining else "250-8BITMIME")
+                    reply("250 SIZE 10485760")
+                elif verb == "MAIL":
+                    sender, recipients = command[10:].strip("<>"), []
+                    envelope_reply("250 OK")
+                    continue
+                elif verb == "RCPT":
+                    address = command[8:].strip("<>")
+                    if address in self.refuse:
+                        envelope_reply("550 No such user")
+                    else:
+                        recipients.append(address)
+                        envelope_reply("250 OK")
+                    continue
+                elif verb == "DATA":
+                    for line in held:
+                        reply(line)
+                    held.clear()
+                    if not recipients:
+                        reply("554 No valid recipients")
+                    else:
+                        reply("354 Go ahead")
+                        await writer.drain()
+                        lines = []
+                        while True:
+                            line = await reader.readline()
+                            if line == b".\r\n":
+                                break
+                            lines.append(line)
+                        self.messages.append((sender, recipients, b"".join(lines)))
+                        reply("250 Queued")
+                        if self.close_after_message:
+                            await writer.drain()
+                            writer.close()
+                            return
+                elif verb == "RSET":
+                    sender, recipients = None, []
+                    reply("250 OK")
+                elif verb == "QUIT":
+                    reply("221 Bye")
+                    await writer.drain()
+                    writer.close()
+                    return
+                else:
+                    reply("502 Not implemented")
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            writer.close()
+
+
+def make_sender(port: int, **kwargs) -> EmailSender:
+    return EmailSender(SMTPConnectionPool(size=2, host="127.0.0.1", port=port, timeout=2.0), **kwargs)
+
+
+def deliver(sink_kwargs: dict, batches, sender_kwargs=None):
+    """Enqueue each batch of (batch_key, recipients) and flush it; returns (sink, sender)"""
+
+    async def run():
+        async with SMTPSink(**sink_kwargs) as sink:
+            sender = make_sender(sink.port, **(sender_kwargs or {}))
+            for batch_key, recipients in batches:
+                sender.enqueue("emergency_alert", batch_key, ALERT_CONTEXT, recipients)
+                await sender.flush()
+            await sender.stop()
+            return sink, sender
+
+    return asyncio.run(run())
+
+
+def test_pipelined_batch_is_one_message_with_many_recipients():
+    recipients = [f"donor{i}@example.com" for i in range(5)]
+    sink, sender = deliver({"pipelining": True}, [("req1", recipients)])
+
+    assert len(sink.messages) == 1
+    assert sink.messages[0][1] == recipients
+    assert b"Subject: Critical blood request: O- needed at General" in sink.messages[0][2]
+    assert sender.metrics()["recipients_accepted"] == 5
+    assert sender.metrics()["send_failures"] == 0
+
+
+def test_non_pipelined_server_gets_one_command_at_a_time():
+    recipients = ["a@example.com", "b@example.com"]
+    sink, sender = deliver({"pipelining": False}, [("req1", recipients)])
+
+    assert sink.messages[0][1] == recipients
+    assert sender.metrics()["recipients_accepted"] == 2
+
+
+def test_refused_recipient_does_not_fail_the_batch():
+    sink, sender = deliver({"refuse": {"gone@example.com"}}, [("req1", ["ok@example.com", "gone@example.com"])])
+
+    assert sink.messages[0][1] == ["ok@example.com"]
+    metrics = sender.metrics()
+    assert (metrics["recipients_accepted"], metrics["recipients_refused"], metrics["send_failures"]) == (1, 1, 0)
+
+
+def test_all_recipients_refused_resets_and_keeps_the_connection():
+    refused = ["x@example.com", "y@example.com"]
+    sink, sender = deliver(
+        {"refuse": set(refused)}, [("req1", refused), ("req2", ["ok@example.com"])]
+    )
+
+    assert "RSET" in sink.commands
+    assert [message[1] for message in sink.messages] == [["ok@example.com"]]
+    assert sink.connections == 1
+    metrics = sender.metrics()
+    assert (metrics["recipients_refused"], metrics["recipients_accepted"], metrics["send_failures"]) == (2, 1, 0)
+
+
+def test_connection_is_reused_across_batches():
+    sink, sender = deliver({}, [("req1", ["a@example.com"]), ("req2", ["b@example.com"]), ("req3", ["c@example.com"])])
+
+    assert len(sink.messages) == 3
+    assert sink.connections == 1
+    assert sender.metrics()["connections_opened"] == 1
+    assert sender.metrics()["connections_reused"] == 2
+
+
+def test_dropped_idle_connection_is_retried_on_a_fresh_one():
+    sink, sender = deliver({"close_after_message": True}, [("req1", ["a@example.com"]), ("req2", ["b@example.com"])])
+
+    assert len(sink.messages) == 2
+    assert sink.connections == 2
+    assert sender.metrics()["send_failures"] == 0
+
+
+def test_unreachable_server_counts_and_logs_the_failure(caplog):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        closed_port = probe.getsockname()[1]
+
+    async def run():
+        sender = make_sender(closed_port)
+        sender.enqueue("emergency_alert", "req1", ALERT_CONTEXT, ["a@example.com", "b@example.com"])
+        await sender.flush()
+        return sender
+
+    with caplog.at_level(logging.ERROR, logger="email_sender"):
+        sender = asyncio.run(run())
+
+    assert sender.metrics()["send_failures"] == 1
+    assert sender.metrics()["messages_sent"] == 0
+    assert "Email batch of 2 recipients failed" in caplog.text
+
+
+def test_header_injection_is_flattened_and_bad_batches_do_not_drop_others():
+    async def run():
+        async with SMTPSink() as sink:
+            sender = make_sender(sink.port)
+            sender.enqueue("emergency_alert", "req1", {**ALERT_CONTEXT, "hospital_name": "Evil\r\nBcc: x@evil.com"},
+                           ["a@example.com"])
+            # Missing template fields cannot render; only this batch is dropped
+            sender.enqueue("emergency_alert", "req2", {"urgency": "Critical"}, ["b@example.com"])
+            sender.enqueue("emergency_alert", "req3", ALERT_CONTEXT, ["c@example.com"])
+            await sender.flush()
+            await sender.stop()
+            return sink, sender
+
+    sink, sender = asyncio.run(run())
+
+    delivered = {message[1][0]: message[2] for message in sink.messages}
+    assert set(delivered) == {"a@example.com", "c@example.com"}
+    headers = delivered["a@example.com"].split(b"\r\n\r\n", 1)[0]
+    assert b"\r\nBcc:" not in headers
+    assert b"Subject: Critical blood request: O- needed at Evil Bcc: x@evil.com" in headers
+    assert sender.metrics()["send_failures"] == 1
+
+
+def test_unexpected_error_still_returns_the_pool_slot():
+    async def run():
+        async with SMTPSink() as sink:
+            sender = EmailSender(SMTPConnectionPool(size=1, host="127.0.0.1", port=sink.port, timeout=2.0))
+            # A lone surrogate cannot be encoded for the wire: a UnicodeEncodeError, not an SMTP error
+            sender.enqueue("emergency_alert", "req1", ALERT_CONTEXT, ["bad\udcff@example.com"])
+            await sender.flush()
+            sender.enqueue("emergency_alert", "req2", ALERT_CONTEXT, ["ok@example.com"])
+            await asyncio.wait_for(sender.flush(), timeout=5)
+            await sender.stop()
+            return sink, sender
+
+    sink, sender = asyncio.run(run())
+
+    assert [message[1] for message in sink.messages] == [["ok@example.com"]]
+    assert sender.metrics()["send_failures"] == 1
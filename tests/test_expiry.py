@@ -0,0 +1,157 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from expiry import ExpiryScheduler
+
+NOW = datetime(2024, 1, 1, 12, 0, 0)
+
+
+def matches(document, query):
+    for field, condition in query.items():
+        value = document.get(field)
+        if isinstance(condition, dict):
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$lte" in condition and not (value is not None and value <= condition["$lte"]):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, field, direction):
+        self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+    async def to_list(self, length):
+        return self.documents[:length]
+
+
+class UpdateResult:
+    def __init__(self, modified_count):
+        self.modified_count = modified_count
+
+
+class FakeRequests:
+    def __init__(self, documents):
+        self.documents = {document["id"]: document for document in documents}
+        self.update_calls = []
+        self.fail_updates = 0
+
+    def find(self, query, projection=None):
+        return FakeCursor([
+            {field: document.get(field) for field in projection if field != "_id" and projection[field]}
+            for document in self.documents.values() if matches(document, query)
+        ])
+
+    async def update_many(self, query, update):
+        self.update_calls.append(query["id"]["$in"])
+        if self.fail_updates:
+            self.fail_updates -= 1
+            raise ConnectionError("primary stepped down")
+        modified = 0
+        for document in self.documents.values():
+            if matches(document, query):
+                document.update(update["$set"])
+                modified += 1
+        return UpdateResult(modified)
+
+
+class FakeDB:
+    def __init__(self, documents):
+        self.blood_requests = FakeRequests(documents)
+
+
+def request(number, minutes, status="Active"):
+    return {"id": f"r{number}", "status": status, "expires_at": NOW + timedelta(minutes=minutes),
+            "blood_type_needed": "O-", "urgency": "Critical", "state": "MA"}
+
+
+def make_scheduler(documents, batch_size=500):
+    db = FakeDB(documents)
+    scheduler = ExpiryScheduler(db, batch_size=batch_size)
+    expired = []
+
+    async def listener(batch):
+        expired.extend(document["id"] for document in batch)
+
+    scheduler.listeners.append(listener)
+    return db, scheduler, expired
+
+
+def test_due_requests_expire_in_batches_and_later_ones_stay_scheduled():
+    documents = [request(number, -number) for number in range(1, 6)] + [request(9, 30)]
+    db, scheduler, expired = make_scheduler(documents, batch_size=2)
+
+    async def run():
+        await scheduler.load(NOW)
+        return await scheduler.expire_due(NOW)
+
+    assert asyncio.run(run()) == 5
+    assert sorted(expired) == ["r1", "r2", "r3", "r4", "r5"]
+    assert [len(ids) for ids in db.blood_requests.update_calls] == [2, 2, 1]
+    assert db.blood_requests.documents["r9"]["status"] == "Active"
+    assert scheduler.metrics()["scheduled"] == 1
+
+
+def test_only_requests_still_active_are_flipped():
+    documents = [request(1, -5), request(2, -5), request(3, -5)]
+    db, scheduler, expired = make_scheduler(documents)
+
+    async def run():
+        await scheduler.load(NOW)
+        # Fulfilled after it was scheduled, and one already pushed back to the future
+        db.blood_requests.documents["r2"]["status"] = "Fulfilled"
+        db.blood_requests.documents["r3"]["expires_at"] = NOW + timedelta(hours=1)
+        return await scheduler.expire_due(NOW)
+
+    assert asyncio.run(run()) == 1
+    assert expired == ["r1"]
+    assert db.blood_requests.documents["r2"]["status"] == "Fulfilled"
+    assert db.blood_requests.documents["r3"]["status"] == "Active"
+
+
+def test_failed_batch_is_rescheduled_and_retried():
+    documents = [request(1, -5), request(2, -1)]
+    db, scheduler, expired = make_scheduler(documents)
+
+    async def run():
+        await scheduler.load(NOW)
+        db.blood_requests.fail_updates = 1
+        with pytest.raises(ConnectionError):
+            await scheduler.expire_due(NOW)
+        assert scheduler.metrics()["scheduled"] == 2
+        return await scheduler.expire_due(NOW)
+
+    assert asyncio.run(run()) == 2
+    assert sorted(expired) == ["r1", "r2"]
+    assert scheduler.metrics()["loads"] == 1
+
+
+def test_schedule_wakes_the_loop_only_for_an_earlier_expiry():
+    db, scheduler, expired = make_scheduler([])
+
+    async def run():
+        await scheduler.load(NOW)
+        scheduler.schedule("a", NOW + timedelta(minutes=10))
+        first = scheduler._wakeup.is_set()
+        scheduler._wakeup.clear()
+        scheduler.schedule("b", NOW + timedelta(minutes=20))
+        scheduler.schedule("c", NOW + timedelta(days=3))  # beyond the loaded horizon
+        return first, scheduler._wakeup.is_set()
+
+    assert asyncio.run(run()) == (True, False)
+    assert scheduler.metrics()["scheduled"] == 2
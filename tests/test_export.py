@@ -0,0 +1,100 @@
+import asyncio
+import csv
+import gzip
+import io
+import json
+import zlib
+
+from export import EXPORTS, Exporter
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield dict(document)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+        self.cursors = []
+
+    def find(self, query, projection=None, batch_size=None):
+        cursor = FakeCursor([document for document in self.documents
+                             if all(document.get(field) == value for field, value in query.items())])
+        self.cursors.append(cursor)
+        return cursor
+
+
+def donor(number, **fields):
+    return {
+        "id": f"d{number}", "name": f"Donor {number}", "phone": "5550000000", "email": f"d{number}@example.com",
+        "blood_type": "O-", "age": 30, "city": "Boston", "state": "MA",
+        "created_at": "2024-01-01T00:00:00", "updated_at": "2024-01-01T00:00:00", **fields,
+    }
+
+
+DONORS = [
+    donor(1),
+    donor(2, name="=HYPERLINK(\"http://evil.example\",\"click\")", city="@SUM(A1:A9)"),
+    donor(3, city="-2+3", phone="+15550000000"),
+]
+
+
+def export(fmt, compress=False, batch_size=2, documents=DONORS):
+    async def run():
+        db = {"donors": FakeCollection(documents)}
+        exporter = Exporter(db, batch_size=batch_size)
+        chunks = [chunk async for chunk in exporter.stream(EXPORTS["donors"], {}, fmt, compress)]
+        return db["donors"], chunks
+
+    return asyncio.run(run())
+
+
+def test_ndjson_export_has_one_line_per_document_and_closes_the_cursor():
+    collection, chunks = export("ndjson")
+
+    lines = b"".join(chunks).decode().splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["d1", "d2", "d3"]
+    assert len(chunks) == 2  # batches of two
+    assert collection.cursors[0].closed
+
+
+def test_csv_export_quotes_cells_that_a_spreadsheet_would_run_as_formulas():
+    _, chunks = export("csv")
+
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+    assert [row["id"] for row in rows] == ["d1", "d2", "d3"]
+    assert rows[0]["name"] == "Donor 1"
+    assert rows[1]["name"] == "'=HYPERLINK(\"http://evil.example\",\"click\")"
+    assert rows[1]["city"] == "'@SUM(A1:A9)"
+    assert rows[2]["city"] == "'-2+3"
+    assert rows[2]["phone"] == "'+15550000000"
+    assert rows[2]["age"] == "30"
+
+
+def test_gzip_export_is_one_member_flushed_after_every_batch():
+    _, chunks = export("csv", compress=True)
+
+    # Header, two batches and the gzip trailer
+    assert len(chunks) == 4
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    received = b""
+    for chunk in chunks[:-1]:
+        # Each batch is decodable as soon as it arrives, before the stream ends
+        received += decompressor.decompress(chunk)
+        assert received.endswith(b"\r\n")
+    received += decompressor.decompress(chunks[-1])
+    assert decompressor.eof
+    assert received == b"".join(export("csv")[1])
+    assert gzip.decompress(b"".join(chunks)) == received
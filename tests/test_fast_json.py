@@ -0,0 +1,30 @@
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from fast_json import FastJSONResponse
+from models import BloodRequestStatus, Donor
+
+orjson = pytest.importorskip("orjson")
+
+
+def test_fast_response_renders_like_the_stock_encoder():
+    donor = Donor(name="Ann Lee", phone="5550001111", email="ann@example.com", blood_type="O-", age=30,
+                  city="Boston", state="MA")
+    content = {
+        "when": datetime(2024, 1, 2, 3, 4, 5, 678000),
+        "status": BloodRequestStatus.ACTIVE,
+        "token": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+        "by_units": {1: "one", 2: "two"},
+        "donor": donor,
+        "nested": [{"at": datetime(2024, 1, 1)}],
+    }
+
+    fast = json.loads(FastJSONResponse(content).body)
+    stock = json.loads(JSONResponse(jsonable_encoder(content)).body)
+
+    assert fast == stock
@@ -0,0 +1,142 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from pagination import InvalidCursor, after, decode_cursor, encode_cursor, paginate, paginate_union, with_tiebreaker
+
+SORT = [("priority_score", -1), ("created_at", -1)]
+START = datetime(2024, 1, 1)
+
+
+def matches(document, query):
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+        elif field == "$and":
+            if not all(matches(document, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = document.get(field)
+            if "$lt" in condition and not value < condition["$lt"]:
+                return False
+            if "$gt" in condition and not value > condition["$gt"]:
+                return False
+        elif document.get(field) != condition:
+            return False
+    return True
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def sort(self, sort):
+        for field, direction in reversed(sort):
+            self.documents.sort(key=lambda document: document[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.documents[:length]
+
+
+class FakeCollection:
+    def __init__(self, documents):
+        self.documents = documents
+        self.queries = []
+
+    def find(self, query, projection=None):
+        self.queries.append(query)
+        return FakeCursor([dict(document) for document in self.documents if matches(document, query)])
+
+
+def request(number, priority, minutes=0):
+    return {"id": f"r{number:03d}", "priority_score": priority, "created_at": START + timedelta(minutes=minutes)}
+
+
+def walk(fetch, limit):
+    """Every page in order, following cursors until there is none"""
+    async def run():
+        pages, cursor = [], None
+        while True:
+            documents, cursor = await fetch(cursor, limit)
+            pages.append([document["id"] for document in documents])
+            if cursor is None:
+                return pages
+
+    return asyncio.run(run())
+
+
+def test_cursor_round_trips_datetimes_and_is_url_safe():
+    sort = with_tiebreaker(SORT)
+    document = request(7, 42.5, minutes=3)
+    cursor = encode_cursor(document, sort)
+
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor, sort) == [42.5, document["created_at"], "r007"]
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bm90IGpzb24", encode_cursor({"a": 1}, [("a", 1)])])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, with_tiebreaker(SORT))
+
+
+def test_keyset_filter_is_strictly_after_the_cursor_row():
+    sort = with_tiebreaker(SORT)
+    filter_ = after(sort, [10, START, "r005"])
+
+    assert filter_ == {"$or": [
+        {"priority_score": {"$lt": 10}},
+        {"priority_score": 10, "created_at": {"$lt": START}},
+        {"priority_score": 10, "created_at": START, "id": {"$lt": "r005"}},
+    ]}
+
+
+def test_pages_break_ties_on_id_without_skipping_or_repeating():
+    # Many rows share both sort values, so only id orders them
+    documents = [request(number, priority=number % 2) for number in range(11)]
+    collection = FakeCollection(documents)
+
+    pages = walk(lambda cursor, limit: paginate(collection, {}, SORT, cursor, limit), limit=3)
+
+    expected = sorted((document for document in documents),
+                      key=lambda document: (document["priority_score"], document["id"]), reverse=True)
+    assert [len(page) for page in pages] == [3, 3, 3, 2]
+    assert [row for page in pages for row in page] == [document["id"] for document in expected]
+
+
+def test_paginate_keeps_the_base_query_alongside_the_keyset():
+    collection = FakeCollection([request(number, 1, minutes=number) for number in range(4)])
+    first, cursor = asyncio.run(paginate(collection, {"priority_score": 1}, SORT, None, 2))
+    asyncio.run(paginate(collection, {"priority_score": 1}, SORT, cursor, 2))
+
+    assert collection.queries[1]["$and"][0] == {"priority_score": 1}
+
+
+def test_union_merges_hot_and_archive_in_sort_order():
+    hot = FakeCollection([request(number, priority=number % 3, minutes=number) for number in range(0, 20, 2)])
+    archive = FakeCollection([request(number, priority=number % 3, minutes=number) for number in range(1, 20, 2)])
+
+    pages = walk(lambda cursor, limit: paginate_union([hot, archive], {}, SORT, cursor, limit), limit=4)
+
+    everything = hot.documents + archive.documents
+    expected = sorted(everything, key=lambda document: (document["priority_score"], document["created_at"],
+                                                        document["id"]), reverse=True)
+    assert [row for page in pages for row in page] == [document["id"] for document in expected]
+    assert all(len(page) == 4 for page in pages[:-1])
+
+
+def test_union_with_one_empty_collection_matches_plain_pagination():
+    documents = [request(number, priority=1, minutes=number % 3) for number in range(7)]
+
+    union = walk(lambda cursor, limit: paginate_union([FakeCollection(documents), FakeCollection([])], {}, SORT,
+                                                      cursor, limit), limit=3)
+    single = walk(lambda cursor, limit: paginate(FakeCollection(documents), {}, SORT, cursor, limit), limit=3)
+
+    assert union == single
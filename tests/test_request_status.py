@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import server
+from auth import User
+from models import REQUEST_TRANSITIONS, BloodRequestStatus, UserRole, statuses_leading_to
+
+HOSPITAL = User(id="hospital-user", email="h@example.com", role=UserRole.HOSPITAL)
+OTHER_HOSPITAL = User(id="other-hospital-user", email="o@example.com", role=UserRole.HOSPITAL)
+ADMIN = User(id="admin-user", email="a@example.com", role=UserRole.ADMIN)
+
+
+class FakeRequests:
+    """find_one_and_update applies the filter the way Mongo would for these fields"""
+
+    def __init__(self, documents):
+        self.documents = {document["id"]: document for document in documents}
+        self.filters = []
+
+    async def find_one_and_update(self, conditions, update, projection=None, return_document=None):
+        self.filters.append(conditions)
+        document = self.documents.get(conditions["id"])
+        if document is None or document["status"] not in conditions["status"]["$in"]:
+            return None
+        if "user_id" in conditions and document["user_id"] != conditions["user_id"]:
+            return None
+        return dict(document)
+
+    async def find_one(self, query, projection=None):
+        document = self.documents.get(query["id"])
+        return dict(document) if document else None
+
+
+class FakeDB(dict):
+    def __init__(self, hot, archived=()):
+        super().__init__(blood_requests=FakeRequests(hot), blood_requests_archive=FakeRequests(archived))
+        self.blood_requests = self["blood_requests"]
+
+
+def update(monkeypatch, db, request_id, status, user):
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server.limiter, "enabled", False)
+    request = Request({"type": "http", "method": "PUT", "path": "/", "query_string": b"", "headers": []})
+    return asyncio.run(server.update_request_status(
+        request=request, request_id=request_id, status=status, current_user=user
+    ))
+
+
+def test_only_active_requests_can_change_status():
+    assert statuses_leading_to(BloodRequestStatus.FULFILLED) == ["Active"]
+    assert statuses_leading_to(BloodRequestStatus.ACTIVE) == []
+    terminal = [status for status, targets in REQUEST_TRANSITIONS.items() if not targets]
+    assert set(terminal) == {BloodRequestStatus.FULFILLED, BloodRequestStatus.CANCELLED, BloodRequestStatus.EXPIRED}
+
+
+def test_update_filter_carries_the_legal_sources_and_the_owner(monkeypatch):
+    db = FakeDB([{"id": "r1", "status": "Fulfilled", "user_id": HOSPITAL.id}])
+
+    with pytest.raises(HTTPException):
+        update(monkeypatch, db, "r1", BloodRequestStatus.CANCELLED, HOSPITAL)
+
+    assert db.blood_requests.filters == [{"id": "r1", "status": {"$in": ["Active"]}, "user_id": HOSPITAL.id}]
+
+
+@pytest.mark.parametrize("stored", ["Fulfilled", "Cancelled", "Expired"])
+def test_leaving_a_terminal_status_is_a_conflict(monkeypatch, stored):
+    db = FakeDB([{"id": "r1", "status": stored, "user_id": HOSPITAL.id}])
+
+    with pytest.raises(HTTPException) as raised:
+        update(monkeypatch, db, "r1", BloodRequestStatus.CANCELLED, HOSPITAL)
+
+    assert raised.value.status_code == 409
+    assert raised.value.detail == f"Cannot change request status from {stored} to Cancelled"
+
+
+def test_archived_request_is_a_conflict_not_missing(monkeypatch):
+    db = FakeDB([], archived=[{"id": "r1", "status": "Fulfilled", "user_id": HOSPITAL.id}])
+
+    with pytest.raises(HTTPException) as raised:
+        update(monkeypatch, db, "r1", BloodRequestStatus.CANCELLED, ADMIN)
+
+    assert raised.value.status_code == 409
+
+
+def test_another_hospitals_request_is_forbidden_and_unknown_ids_are_missing(monkeypatch):
+    db = FakeDB([{"id": "r1", "status": "Active", "user_id": HOSPITAL.id}])
+
+    with pytest.raises(HTTPException) as forbidden:
+        update(monkeypatch, db, "r1", BloodRequestStatus.FULFILLED, OTHER_HOSPITAL)
+    with pytest.raises(HTTPException) as missing:
+        update(monkeypatch, db, "nope", BloodRequestStatus.FULFILLED, ADMIN)
+
+    assert (forbidden.value.status_code, missing.value.status_code) == (403, 404)
+
+
+def test_malformed_cursor_on_the_list_route_is_a_400(monkeypatch):
+    monkeypatch.setattr(server.limiter, "enabled", False)
+    request = Request({"type": "http", "method": "GET", "path": "/", "query_string": b"", "headers": []})
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(server.get_blood_requests(
+            request=request, status=None, urgency=None, mine=False, cursor="not-a-cursor", limit=None,
+            fields=None, view=server.ListView.FULL, current_user=None
+        ))
+
+    assert (raised.value.status_code, raised.value.detail) == (400, "Invalid pagination cursor")
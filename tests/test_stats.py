@@ -0,0 +1,54 @@
+import asyncio
+
+from stats import StatsMaterializer
+
+
+class RecordingStats:
+    def __init__(self):
+        self.increments = []
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        self.increments.append(update["$inc"])
+        return {"_id": query["_id"]}
+
+
+class FakeDB:
+    def __init__(self):
+        self.stats = RecordingStats()
+
+
+def test_a_batch_of_requests_is_one_combined_increment():
+    db = FakeDB()
+    requests = [
+        {"blood_type_needed": "O-", "status": "Active"},
+        {"blood_type_needed": "O-", "status": "Active"},
+        {"blood_type_needed": "A+", "status": "Active"},
+        {"blood_type_needed": "A+", "status": "Fulfilled"},
+    ]
+
+    asyncio.run(StatsMaterializer(db).requests_added(requests))
+
+    assert db.stats.increments == [{
+        "total_active_requests": 3,
+        "blood_type_breakdown.O-.requests": 2,
+        "blood_type_breakdown.A+.requests": 1,
+    }]
+
+
+def test_donor_batches_and_empty_deltas():
+    db = FakeDB()
+    materializer = StatsMaterializer(db)
+
+    asyncio.run(materializer.donors_added([
+        {"blood_type": "B-", "is_available": True, "is_online": True},
+        {"blood_type": "B-", "is_available": True},
+        {"blood_type": "B-", "is_available": False},
+    ]))
+    asyncio.run(materializer.requests_added([{"blood_type_needed": "O-", "status": "Cancelled"}]))
+
+    assert db.stats.increments == [{
+        "total_donors": 2,
+        "blood_type_breakdown.B-.donors": 2,
+        "online_donors": 1,
+        "blood_type_breakdown.B-.online_donors": 1,
+    }]
@@ -0,0 +1,81 @@
+import json
+from datetime import datetime
+
+import msgpack
+
+import ws_protocol
+from models import BloodRequest, BloodRequestStatus, BloodRequestUrgency
+
+WELCOME = {
+    "type": "welcome",
+    "message": "Connected",
+    "channels": ["alerts", "donors", "stats"],
+    "last_event_id": "abc-3",
+    "schemas": ws_protocol.schema_table(),
+    "timestamp": "2024-01-01T00:00:00",
+}
+
+
+def blood_request() -> dict:
+    return BloodRequest(
+        requester_name="Dr Ann", patient_name="Bob", phone="5550001111", email="ann@example.com",
+        blood_type_needed="O-", urgency=BloodRequestUrgency.CRITICAL, units_needed=2, hospital_name="General",
+        city="Boston", state="MA", description="Surgery",
+    ).dict()
+
+
+def as_json(payload: dict) -> dict:
+    """The payload as any client sees it: datetimes and enums as strings"""
+    return json.loads(ws_protocol.encode(payload, None))
+
+
+def test_welcome_frame_is_readable_without_a_schema_table():
+    frame = ws_protocol.encode(WELCOME, ws_protocol.MSGPACK_PROTOCOL)
+
+    assert msgpack.unpackb(frame)[0] == ws_protocol.RAW_SCHEMA_ID
+    assert ws_protocol.unpack(frame) == WELCOME
+
+
+def test_compact_frames_round_trip_through_the_welcome_table():
+    schemas = ws_protocol.unpack(ws_protocol.encode(WELCOME, ws_protocol.MSGPACK_PROTOCOL))["schemas"]
+    messages = [
+        {
+            "type": "emergency_alert", "urgency": "Critical", "message": "rendered by the client",
+            "blood_request": blood_request(), "total_compatible_donors": 4, "timestamp": datetime(2024, 1, 1),
+            "alert_id": "a1", "location_priority": "same_city", "compatibility": "exact", "blood_requests": [],
+        },
+        {
+            "type": "general_alert", "urgency": "Urgent", "blood_type_needed": "A+", "hospital_name": "General",
+            "city": "Boston", "compatible_donors_alerted": 3, "total_compatible_donors": 9,
+            "timestamp": "2024-01-01T00:00:00", "event_id": "abc-4", "channel": "alerts",
+        },
+        {"type": "new_donor", "donor_blood_type": "B-", "location": "Boston, MA", "timestamp": "2024-01-01T00:00:00"},
+        {"type": "stats_delta", "changes": {"online_donors": 5}},
+    ]
+
+    for message in messages:
+        frame = ws_protocol.encode(message, ws_protocol.MSGPACK_PROTOCOL)
+        decoded = ws_protocol.unpack(frame, schemas)
+        expected = {key: value for key, value in as_json(message).items() if key not in ws_protocol.OMITTED_FIELDS}
+        # Schema fields the message did not carry come back as None
+        assert {key: value for key, value in decoded.items() if value is not None} == \
+            {key: value for key, value in expected.items() if value is not None}
+
+
+def test_nested_blood_request_keeps_its_fields():
+    schemas = ws_protocol.schema_table()
+    request = blood_request()
+    frame = ws_protocol.encode({"type": "emergency_alert", "blood_request": request}, ws_protocol.MSGPACK_PROTOCOL)
+
+    decoded = ws_protocol.unpack(frame, schemas)["blood_request"]
+
+    assert decoded["id"] == request["id"]
+    assert decoded["status"] == BloodRequestStatus.ACTIVE.value
+    assert decoded["created_at"] == request["created_at"].isoformat()
+
+
+def test_client_messages_decode_from_either_protocol():
+    payload = {"type": "register_donor", "donor_id": "d1"}
+
+    assert ws_protocol.decode({"text": json.dumps(payload)}) == payload
+    assert ws_protocol.decode({"bytes": msgpack.packb(payload)}) == payload